@@ -0,0 +1 @@
+# bench — офлайн-бенчмарки и фейковый Google Sheets (без сети и credentials).
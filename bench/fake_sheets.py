@@ -0,0 +1,284 @@
+# bench/fake_sheets.py
+# Google Sheets без Google: подменяем HTTP-сессию gspread, а не сами Worksheet.
+# Настоящий gspread, QuotaHTTPClient (повторы, вёдра квоты), sheet_cache и проверка
+# ревизий через Drive работают как в бою — только ответы приходят из снимков листов
+# (JSON-дампы get_all_values(), см. bench/fixtures.py).
+#
+# Поддерживается то, чем пользуется бот: метаданные таблицы, values.get / batchGet /
+# update / batchUpdate, Drive files.get (ревизия) и files.list (openall).
+# Задержка, 429 и 5xx — настраиваются (FakeSheetsBackend(latency=..., error_rate=...)).
+
+import copy
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+
+import gspread
+from gspread.utils import a1_range_to_grid_range
+
+from pligrim_bot.core.sheets_quota import QuotaHTTPClient, api_op
+
+_SPREADSHEET_RX = re.compile(r"/v4/spreadsheets/([^/:?]+)(.*)$")
+_DRIVE_FILE_RX = re.compile(r"/drive/v3/files(?:/([^/?]+))?$")
+
+
+class FakeResponse:
+    """То, что gspread читает у requests.Response."""
+
+    def __init__(self, status_code: int, body: dict):
+        self.status_code = status_code
+        self._body = body
+        self.text = json.dumps(body, ensure_ascii=False)
+        self.content = self.text.encode("utf-8")
+        self.headers = {"Content-Type": "application/json"}
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> dict:
+        return self._body
+
+
+def _error(code: int, status: str, message: str) -> FakeResponse:
+    return FakeResponse(code, {"error": {"code": code, "message": message, "status": status}})
+
+
+def _split_range(a1: str):
+    """"'Лист'!A1:O55" -> ("Лист", "A1:O55"); просто "Лист" -> ("Лист", None)."""
+    a1 = unquote(a1)
+    if "!" in a1:
+        title, rng = a1.rsplit("!", 1)
+    else:
+        title, rng = a1, None
+    if len(title) >= 2 and title[0] == title[-1] == "'":
+        title = title[1:-1].replace("''", "'")
+    return title, rng
+
+
+def _trim(rows: List[List[str]]) -> List[List[str]]:
+    """Как Google: без пустых хвостов в строках и пустых строк в конце."""
+    out = []
+    for row in rows:
+        row = list(row)
+        while row and row[-1] == "":
+            row.pop()
+        out.append(row)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+class FakeSpreadsheet:
+    def __init__(self, spreadsheet_id: str, title: str, sheets: Dict[str, List[List[str]]]):
+        self.id = spreadsheet_id
+        self.title = title
+        # title -> значения листа (как get_all_values())
+        self.sheets: Dict[str, List[List[str]]] = {t: [list(r) for r in v] for t, v in sheets.items()}
+        self.sheet_ids = {t: 1000 + i for i, t in enumerate(self.sheets)}
+        self.version = 1
+        self.modified = datetime.now(timezone.utc)
+
+    def touch(self) -> None:
+        self.version += 1
+        self.modified = datetime.now(timezone.utc)
+
+    def metadata(self) -> dict:
+        return {
+            "spreadsheetId": self.id,
+            "properties": {"title": self.title, "locale": "ru_RU", "timeZone": "Asia/Almaty"},
+            "sheets": [
+                {"properties": {
+                    "sheetId": self.sheet_ids[t], "title": t, "index": i, "sheetType": "GRID",
+                    "gridProperties": {
+                        "rowCount": max(len(v), 1000),
+                        "columnCount": max((len(r) for r in v), default=26),
+                    },
+                }}
+                for i, (t, v) in enumerate(self.sheets.items())
+            ],
+        }
+
+    def read(self, a1: str) -> dict:
+        title, rng = _split_range(a1)
+        values = self.sheets[title]
+        r0, r1, c0, c1 = 0, len(values), 0, None
+        if rng:
+            grid = a1_range_to_grid_range(rng)
+            r0 = grid.get("startRowIndex", 0)
+            r1 = grid.get("endRowIndex", len(values))
+            c0 = grid.get("startColumnIndex", 0)
+            c1 = grid.get("endColumnIndex")
+        rows = [row[c0:c1] for row in values[r0:r1]]
+        return {"range": a1, "majorDimension": "ROWS", "values": _trim(rows)}
+
+    def write(self, a1: str, rows: List[List]) -> int:
+        title, rng = _split_range(a1)
+        values = self.sheets[title]
+        grid = a1_range_to_grid_range(rng) if rng else {}
+        r0, c0 = grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0)
+        cells = 0
+        for dr, row in enumerate(rows):
+            r = r0 + dr
+            while len(values) <= r:
+                values.append([])
+            target = values[r]
+            for dc, v in enumerate(row):
+                c = c0 + dc
+                while len(target) <= c:
+                    target.append("")
+                target[c] = "" if v is None else str(v)
+                cells += 1
+        return cells
+
+
+class FakeSheetsBackend:
+    """
+    Хранилище таблиц + поведение «Google»: задержка, случайные 429/5xx и
+    поминутный лимит чтений на таблицу (как настоящая квота).
+    """
+
+    def __init__(self, *, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 server_error_rate: float = 0.0, reads_per_min: int = 0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.reads_per_min = reads_per_min
+        self.spreadsheets: Dict[str, FakeSpreadsheet] = {}
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._reads: Dict[str, deque] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # ---------- данные ----------
+
+    def add_spreadsheet(self, spreadsheet_id: str, title: str, sheets: Dict[str, List[List[str]]]) -> FakeSpreadsheet:
+        ss = self.spreadsheets[spreadsheet_id] = FakeSpreadsheet(spreadsheet_id, title, sheets)
+        return ss
+
+    def values(self, spreadsheet_id: str, title: str) -> List[List[str]]:
+        """Текущее содержимое листа (копия) — для проверок после записи."""
+        with self._lock:
+            return copy.deepcopy(self.spreadsheets[spreadsheet_id].sheets[title])
+
+    def edit(self, spreadsheet_id: str, title: str, row_idx: int, row: List[str]) -> None:
+        """Правка «из браузера» мимо бота: меняет ревизию файла."""
+        with self._lock:
+            ss = self.spreadsheets[spreadsheet_id]
+            ss.write(f"'{title}'!A{row_idx + 1}", [row])
+            ss.touch()
+
+    # ---------- HTTP ----------
+
+    def _throttled(self, sid: Optional[str], kind: str) -> Optional[FakeResponse]:
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return _error(429, "RESOURCE_EXHAUSTED", "Quota exceeded (injected)")
+        if self.server_error_rate and self._rng.random() < self.server_error_rate:
+            return _error(503, "UNAVAILABLE", "The service is currently unavailable (injected)")
+        if self.reads_per_min and sid and kind == "read":
+            window = self._reads.setdefault(sid, deque())
+            now = time.monotonic()
+            while window and now - window[0] >= 60:
+                window.popleft()
+            if len(window) >= self.reads_per_min:
+                return _error(429, "RESOURCE_EXHAUSTED", "Quota exceeded for 'Read requests per minute per user'")
+            window.append(now)
+        return None
+
+    def handle(self, method: str, url: str, params=None, body=None) -> FakeResponse:
+        method = method.upper()
+        op = api_op(method, url)
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            self.calls[op] += 1
+            m = _SPREADSHEET_RX.search(url)
+            sid = m.group(1) if m else None
+            kind = "read" if method == "GET" or url.endswith(":batchGet") else "write"
+            failure = self._throttled(sid, kind)
+            if failure is not None:
+                self.errors[failure.status_code] += 1
+                return failure
+
+            if m:
+                return self._sheets(method, sid, m.group(2), params or {}, body or {})
+            d = _DRIVE_FILE_RX.search(url)
+            if d:
+                return self._drive(d.group(1))
+        return _error(404, "NOT_FOUND", f"fake: нет обработчика для {method} {url}")
+
+    def _sheets(self, method: str, sid: str, rest: str, params: dict, body: dict) -> FakeResponse:
+        ss = self.spreadsheets.get(sid)
+        if ss is None:
+            return _error(404, "NOT_FOUND", f"Requested entity was not found: {sid}")
+        try:
+            if rest == "" and method == "GET":
+                return FakeResponse(200, ss.metadata())
+            if rest == "/values:batchGet":
+                ranges = params.get("ranges") or []
+                if isinstance(ranges, str):
+                    ranges = [ranges]
+                return FakeResponse(200, {"spreadsheetId": sid, "valueRanges": [ss.read(a1) for a1 in ranges]})
+            if rest == "/values:batchUpdate":
+                cells = sum(ss.write(d["range"], d["values"]) for d in body.get("data", []))
+                ss.touch()
+                return FakeResponse(200, {"spreadsheetId": sid, "totalUpdatedCells": cells})
+            if rest.startswith("/values/") and method == "GET":
+                return FakeResponse(200, ss.read(rest[len("/values/"):]))
+            if rest.startswith("/values/") and method == "PUT":
+                a1 = rest[len("/values/"):]
+                cells = ss.write(a1, body.get("values", []))
+                ss.touch()
+                return FakeResponse(200, {"spreadsheetId": sid, "updatedRange": unquote(a1), "updatedCells": cells})
+        except KeyError as e:
+            return _error(400, "INVALID_ARGUMENT", f"Unable to parse range: {e}")
+        return _error(404, "NOT_FOUND", f"fake: нет обработчика для {method} {rest}")
+
+    def _drive(self, file_id: Optional[str]) -> FakeResponse:
+        if file_id is None:
+            files = [
+                {"id": ss.id, "name": ss.title, "createdTime": "2025-01-01T00:00:00.000Z",
+                 "modifiedTime": ss.modified.isoformat(timespec="milliseconds").replace("+00:00", "Z")}
+                for ss in self.spreadsheets.values()
+            ]
+            return FakeResponse(200, {"files": files})
+        ss = self.spreadsheets.get(file_id)
+        if ss is None:
+            return _error(404, "NOT_FOUND", f"File not found: {file_id}")
+        return FakeResponse(200, {
+            "version": str(ss.version),
+            "modifiedTime": ss.modified.isoformat(timespec="microseconds").replace("+00:00", "Z"),
+        })
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors)}
+
+
+class FakeSession:
+    """Вместо google.auth AuthorizedSession: request(...) уходит в FakeSheetsBackend."""
+
+    def __init__(self, backend: FakeSheetsBackend):
+        self.backend = backend
+        self.headers: dict = {}
+
+    def request(self, method, url, json=None, params=None, data=None, files=None, headers=None, timeout=None):
+        return self.backend.handle(method, url, params=params, body=json)
+
+    def close(self) -> None:
+        pass
+
+
+def make_client(backend: FakeSheetsBackend, *, http_client=QuotaHTTPClient) -> gspread.Client:
+    """gspread.Client поверх фейка — тот же http_client, что и в settings.get_google_client()."""
+    return gspread.Client(None, session=FakeSession(backend), http_client=http_client)
@@ -0,0 +1,228 @@
+# bench/fixtures.py
+# Снимки листов для бенчмарков: записанные (bench/fixtures/*.json — дампы get_all_values(),
+# см. bench/record.py) или синтетические в той же раскладке, что и боевые листы паломников:
+#
+#   «12.10-19.10 NIYET/7d»          — шапка пакета
+#   №, Visa, Avia, Type of room ... — заголовок таблицы людей
+#   комнаты DBL/TRPL/QUAD/SGL       — частично заселены, тип в первой строке комнаты
+#   TRANSFER / BUS                  — служебные строки в конце пакета
+#   ...
+#   NIYET 7d / Madinah / Makkah     — конфиги отелей внизу листа
+
+import glob
+import json
+import os
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+HEADER = ["№", "Visa", "Avia", "Type of room", "Meal a day", "Last Name", "First Name", "Gender",
+          "Date of Birth", "Document Number", "Document Expiration", "Price", "Comment", "Manager", "Train"]
+WIDTH = len(HEADER)
+
+# Размеры синтетических листов (число пакетов): x10 — «сезон» в 10 раз больше среднего листа
+SIZES = {"small": 3, "medium": 12, "x10": 120}
+
+# (надпись в шапке, строка конфига, ключ отеля в Мекке)
+_KINDS = [
+    ("NIYET/7d", "NIYET 7d", "Makkah Hotel"),
+    ("NIYET/10d", "NIYET 10d", "Makkah Hotel"),
+    ("HIKMA", "HIKMA", "Hilton Suites"),
+    ("4U SHOHADA", "4U SHOHADA", "Shohada"),
+    ("AROYA", "AROYA", "Aroya Makkah"),
+]
+_ROOMS = [("DBL", 2), ("TRPL", 3), ("QUAD", 4), ("SGL", 1), ("TWIN", 2)]
+_LAST = ["IVANOV", "PETROV", "AKHMETOV", "NURLANOV", "SERIKBAYEV", "ABDRAKHMANOV", "KASYMOV",
+         "ZHUMABEKOV", "ISMAILOV", "OMAROV", "TOKTAROV", "BAIMUKHAMEDOV"]
+_FIRST_M = ["ASKAR", "DAUREN", "YERLAN", "MARAT", "NURSULTAN", "TIMUR", "ARMAN", "BAUYRZHAN"]
+_FIRST_F = ["AIGERIM", "DANA", "ZHANAR", "MADINA", "ASEL", "GULNARA", "SAULE", "AINUR"]
+_MANAGERS = ["Айгерим", "Данияр", "Салтанат", "Ержан"]
+_MEDINA_HOTELS = ["Dar Al Taqwa", "Saja Al Madinah", "Pullman Zamzam Madinah", "Anwar Al Madinah"]
+
+
+def _row(**cells) -> List[str]:
+    row = [""] * WIDTH
+    for name, value in cells.items():
+        row[HEADER.index(name.replace("_", " "))] = value
+    return row
+
+
+def _guest(rng: random.Random, gender: str, num: int, room: str = "", manager: str = "") -> List[str]:
+    first = rng.choice(_FIRST_M if gender == "M" else _FIRST_F)
+    return [
+        str(num), "yes", "KC 263", room, "HB", rng.choice(_LAST), first, gender,
+        f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1950, 2005)}",
+        f"N{rng.randint(10_000_000, 99_999_999)}", f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2030",
+        f"{rng.choice([1650, 1850, 1950, 2250])}$", rng.choice(["", "", "", "рядом с мамой", "инвалидное кресло"]),
+        manager or rng.choice(_MANAGERS), rng.choice(["", "", "yes"]),
+    ]
+
+
+def _package(rng: random.Random, start: date, kind: str, fill: float) -> List[List[str]]:
+    end = start + timedelta(days=10 if "10d" in kind else 7)
+    rows = [[f"{start:%d.%m}-{end:%d.%m} {kind}"] + [""] * (WIDTH - 1), list(HEADER)]
+    num = 1
+    for _ in range(rng.randint(8, 14)):
+        room, cap = rng.choice(_ROOMS)
+        taken = cap if rng.random() < fill else rng.randint(0, cap - 1)
+        gender = rng.choice("MF")
+        for slot in range(cap):
+            label = room if slot == 0 else ""
+            if slot < taken:
+                rows.append(_guest(rng, gender, num, label))
+                num += 1
+            else:
+                rows.append(_row(**{"Type of room": label, "Meal a day": "HB"}))
+        if rng.random() < 0.08:
+            # младенец без места — строка без типа комнаты
+            rows.append(_row(Last_Name=rng.choice(_LAST), First_Name="INF", Comment="INF"))
+    rows.append(_row(**{"Type of room": "TRANSFER", "Comment": "JED-MED bus"}))
+    rows.append([""] * WIDTH)
+    return rows
+
+
+def _config(rng: random.Random, start: date, kind: str, cfg_label: str, makkah_hotel: str) -> List[List[str]]:
+    split = start + timedelta(days=3)
+    end = start + timedelta(days=10 if "10d" in kind else 7)
+    return [
+        [cfg_label] + [""] * (WIDTH - 1),
+        ["", "Madinah", rng.choice(_MEDINA_HOTELS), f"{start:%d/%m/%Y}", f"{split:%d/%m/%Y}"] + [""] * (WIDTH - 5),
+        ["", "Makkah", makkah_hotel, f"{split:%d/%m/%Y}", f"{end:%d/%m/%Y}"] + [""] * (WIDTH - 5),
+    ]
+
+
+def synthetic_sheet(packages: int, *, seed: int = 1, start: date = date(2025, 10, 10),
+                    fill: float = 0.6) -> List[List[str]]:
+    """Лист паломников из packages пакетов (с конфигами отелей внизу) — как get_all_values()."""
+    rng = random.Random(seed)
+    body, configs = [], []
+    for i in range(packages):
+        kind, cfg_label, makkah = _KINDS[i % len(_KINDS)]
+        # x10 — больше месяца: вылеты каждые 1–2 дня, год при переполнении не важен
+        day = start + timedelta(days=i + i // 2)
+        body += _package(rng, day, kind, fill)
+        configs += _config(rng, day, kind, cfg_label, makkah)
+    return body + [[""] * WIDTH] + configs
+
+
+def synthetic_card(seed: int = 1, *, package: str = "NIYET 7d", room: str = "DBL") -> str:
+    """Карточка клиента из WhatsApp в формате, который присылают менеджеры."""
+    rng = random.Random(seed)
+    gender = rng.choice("MF")
+    first = rng.choice(_FIRST_M if gender == "M" else _FIRST_F).title()
+    return (
+        f"ФИО: {rng.choice(_LAST).title()} {first}\n"
+        f"Дата договора: {rng.randint(1, 28):02d}.09.2025\n"
+        f"Дата вылета: 12.10.2025\n"
+        f"Пакет название: {package}\n"
+        f"Сумма: {rng.choice([1650, 1850, 1950])}$\n"
+        f"Сумма оплаты: {rng.choice([500, 1000])}$\n"
+        f"Размещение: {room}\n"
+        f"Питание: HB\n"
+        f"Курс $: 530\n"
+        f"Виза: есть\n"
+        f"Регион: Алматы\n"
+        f"Вылет: ALA\n"
+        f"Авиа: KC 263\n"
+        f"Поезд: да\n"
+        f"Контактные номера: +7 701 {rng.randint(100, 999)} {rng.randint(10, 99)} {rng.randint(10, 99)}\n"
+        f"Менеджер: {rng.choice(_MANAGERS)}\n"
+        f"Договор: {rng.randint(1, 999)}\n"
+        f"Комментарии:\nрядом с мамой, нужен нижний этаж\n"
+    )
+
+
+def synthetic_chat_export(seed: int = 1, *, cards: int = 5, package: str = "NIYET 7d",
+                          rooms: Tuple[str, ...] = ("DBL",)) -> str:
+    """
+    Экспорт чата WhatsApp (.txt): карточки клиентов вперемешку с обычными сообщениями,
+    первая строка карточки — после «дата, время - автор: ».
+    """
+    rng = random.Random(seed)
+    lines = []
+    for i in range(cards):
+        stamp = f"{rng.randint(1, 28):02d}.09.2025, {rng.randint(9, 20):02d}:{rng.randint(0, 59):02d}"
+        author = rng.choice(_MANAGERS)
+        if rng.random() < 0.3:
+            lines.append(f"{stamp} - {author}: оплату получили, спасибо")
+        card = synthetic_card(seed * 1_000 + i, package=package, room=rng.choice(rooms))
+        lines.append(f"{stamp} - {author}: {card}")
+    return "\n".join(lines) + "\n"
+
+
+def scale(values: List[List[str]], factor: int) -> List[List[str]]:
+    """
+    Лист в factor раз больше: область пакетов повторяется, у копий к названию пакета
+    добавляется « #k» (иначе scan_palm_packages схлопнет одинаковые шапки).
+    Конфиги отелей (всё после последней пустой строки перед ними) — один раз, внизу.
+    """
+    from pligrim_bot.core.parsers.package_parser import scan_palm_packages
+
+    if factor <= 1:
+        return [list(r) for r in values]
+    packages = scan_palm_packages(values)
+    if not packages:
+        return [list(r) for r in values] * factor
+
+    body_end = max(p["row"] for p in packages)
+    # конец последнего пакета — первая полностью пустая строка после его шапки
+    while body_end < len(values) and any(str(c).strip() for c in values[body_end]):
+        body_end += 1
+    body, tail = values[:body_end], values[body_end:]
+    title_cells = {(p["row"], p["col"]) for p in packages}
+
+    out = []
+    for k in range(factor):
+        for r, row in enumerate(body):
+            row = list(row)
+            if k:
+                for c in range(len(row)):
+                    if (r, c) in title_cells:
+                        row[c] = f"{row[c]} #{k}"
+            out.append(row)
+    return out + [list(r) for r in tail]
+
+
+def load_fixture(path: str) -> List[List[str]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_fixture(path: str, values: List[List[str]]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(values, f, ensure_ascii=False)
+
+
+def fixture_name(spreadsheet_title: str, ws_title: str) -> str:
+    """Имя файла записанного листа: «<таблица>__<лист>.json» (/ заменяем на _)."""
+    safe = lambda s: s.replace("/", "_").replace(os.sep, "_")
+    return f"{safe(spreadsheet_title)}__{safe(ws_title)}.json"
+
+
+def recorded_fixtures(directory: str = FIXTURES_DIR) -> Dict[str, Dict[str, List[List[str]]]]:
+    """{название таблицы: {название листа: значения}} из записанных файлов."""
+    found: Dict[str, Dict[str, List[List[str]]]] = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        ss_title, _, ws_title = name.partition("__")
+        if not ws_title:
+            ss_title, ws_title = "Recorded", ss_title
+        found.setdefault(ss_title, {})[ws_title] = load_fixture(path)
+    return found
+
+
+def sheet_sets(directory: str = FIXTURES_DIR) -> List[Tuple[str, List[List[str]]]]:
+    """
+    Листы для прогона: [(размер, значения)].
+    Есть записанные листы — берём самый большой из них как «medium» и его 10× копию,
+    иначе — синтетические small / medium / x10.
+    """
+    recorded = [v for sheets in recorded_fixtures(directory).values() for v in sheets.values()]
+    if recorded:
+        medium = max(recorded, key=len)
+        small = min(recorded, key=len)
+        return [("small", small), ("medium", medium), ("x10", scale(medium, 10))]
+    return [(size, synthetic_sheet(n, seed=7)) for size, n in SIZES.items()]
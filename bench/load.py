@@ -0,0 +1,428 @@
+# bench/load.py
+# Нагрузочный прогон диалога бронирования без Telegram и без Google:
+#
+#   python -m bench.load                                  # 20 менеджеров по 3 бронирования
+#   python -m bench.load --users 100 --flows 5 --latency 0.15 --jitter 0.1
+#   python -m bench.load --users 50 --think 2 --real-quota   # с паузами «на подумать» и боевой квотой
+#   python -m bench.load --chat-share 0.3                 # треть проходов — импорт экспорта чата
+#
+# Каждый виртуальный менеджер проходит весь путь через dp.feed_update():
+#   /start → start_flow → palm_month → palm_sheet → palm_pkg → gender → карточка → booking_place_auto
+# кнопки выбирает из клавиатуры, которую бот прислал последней (как человек).
+# Доля --chat-share проходов вместо одной карточки шлёт экспорт чата WhatsApp (.txt)
+# и размещает всю пачку: … → gender → документ → booking_place_bulk.
+# Telegram — FakeTelegramSession (ответы без сети), Google — FakeSheetsBackend (bench/fake_sheets.py).
+# В отчёте: p50/p95/p99 по хэндлерам, время бронирования целиком и пропускная способность процесса.
+
+import os
+import sys
+import tempfile
+
+# Окружение — до импорта pligrim_bot (константы читаются при импорте), как в bench/run.py.
+# --real-quota оставляет боевые лимиты Google: видно, во что упрётся процесс на самом деле.
+os.environ.setdefault("BOT_STATE_DIR", tempfile.mkdtemp(prefix="load-state-"))
+os.environ.setdefault("FSM_STORAGE", "memory")
+os.environ.setdefault("PREFETCH_DEPARTURES", "0")
+if "--real-quota" not in sys.argv:
+    for _name in ("SHEETS_READS_PER_MIN", "SHEETS_WRITES_PER_MIN", "SHEETS_SHEET_READS_PER_MIN",
+                  "SHEETS_SHEET_WRITES_PER_MIN"):
+        os.environ.setdefault(_name, "1000000")
+    os.environ.setdefault("SHEETS_QUOTA_BURST", "1000000")
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import math
+import random
+import time
+import typing
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import GetFile, GetMe
+from aiogram.types import InlineKeyboardMarkup, Message, Update
+
+from bench.fake_sheets import FakeSheetsBackend, make_client
+from bench.fixtures import synthetic_card, synthetic_chat_export, synthetic_sheet
+
+from pligrim_bot.app import setup_dispatcher
+from pligrim_bot.config.constants import dp
+from pligrim_bot.config.settings import use_google_client
+from pligrim_bot.core import metrics
+from pligrim_bot.core.sheets_gateway import gateway_stats
+from pligrim_bot.core.sheets_quota import quota_stats
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "Load", "username": "load_test_bot"}
+_ROOMS = ["DBL", "TRPL", "QUAD", "SGL"]
+
+
+# ---------- Telegram без сети ----------
+
+class FakeTelegramSession(BaseSession):
+    """
+    Сессия aiogram, которая никуда не ходит: запоминает, что бот отправил в какой чат
+    (последний текст, клавиатуру и message_id), и отвечает как Bot API.
+    Файлы, выложенные через upload(), отдаёт getFile и скачивание — как сервер Telegram.
+    latency — задержка «сети» на каждый вызов, сек.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.texts: Dict[int, str] = {}
+        self.keyboards: Dict[int, Optional[InlineKeyboardMarkup]] = {}
+        self.message_ids: Dict[int, int] = {}
+        self.files: Dict[str, bytes] = {}       # file_id -> содержимое
+        self._ids = itertools.count(1)
+
+    def upload(self, content: bytes) -> str:
+        """Кладёт файл «на сервер Telegram»; возвращает file_id."""
+        file_id = f"file-{next(self._ids)}"
+        self.files[file_id] = content
+        return file_id
+
+    @staticmethod
+    def _file_path(file_id: str) -> str:
+        return f"documents/{file_id}.txt"
+
+    async def close(self) -> None:
+        pass
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None):
+        name = type(method).__name__
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if isinstance(method, GetMe):
+            result = BOT_USER
+        elif isinstance(method, GetFile):
+            content = self.files.get(method.file_id)
+            if content is None:
+                raise TelegramBadRequest(method=method, message="Bad Request: invalid file_id")
+            result = {
+                "file_id": method.file_id,
+                "file_unique_id": method.file_id,
+                "file_size": len(content),
+                "file_path": self._file_path(method.file_id),
+            }
+        elif _returns_message(method):
+            chat_id = int(getattr(method, "chat_id", 0) or 0)
+            message_id = getattr(method, "message_id", None) or next(self._ids)
+            text = getattr(method, "text", None) or ""
+            markup = getattr(method, "reply_markup", None)
+            self.texts[chat_id] = text
+            self.keyboards[chat_id] = markup if isinstance(markup, InlineKeyboardMarkup) else None
+            self.message_ids[chat_id] = message_id
+            result = {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": text,
+            }
+        else:
+            result = True
+
+        content = json.dumps({"ok": True, "result": result}, ensure_ascii=False)
+        return self.check_response(bot, method, 200, content).result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        self.calls["download"] += 1
+        file_id = url.rsplit("/", 1)[-1].removesuffix(".txt")
+        content = self.files.get(file_id)
+        if content is None:
+            raise TelegramBadRequest(method=GetFile(file_id=file_id), message="Not Found: file is missing")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+
+
+def _returns_message(method) -> bool:
+    returning = method.__returning__
+    return returning is Message or Message in typing.get_args(returning)
+
+
+# ---------- виртуальный менеджер ----------
+
+class Manager:
+    """Один менеджер: свой чат, свои апдейты, свой FSM."""
+
+    _update_ids = itertools.count(1)
+
+    def __init__(self, uid: int, bot: Bot, session: FakeTelegramSession, rng: random.Random):
+        self.uid = uid
+        self.bot = bot
+        self.session = session
+        self.rng = rng
+        self.user = {"id": uid, "is_bot": False, "first_name": f"Manager {uid}"}
+        self.chat = {"id": uid, "type": "private"}
+
+    def _message(self, text: str) -> Update:
+        update_id = next(self._update_ids)
+        return Update.model_validate({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": self.chat,
+                "from": self.user,
+                "text": text,
+            },
+        }, context={"bot": self.bot})
+
+    def _document(self, file_name: str, content: bytes) -> Update:
+        update_id = next(self._update_ids)
+        file_id = self.session.upload(content)
+        return Update.model_validate({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": self.chat,
+                "from": self.user,
+                "document": {
+                    "file_id": file_id,
+                    "file_unique_id": file_id,
+                    "file_name": file_name,
+                    "file_size": len(content),
+                },
+            },
+        }, context={"bot": self.bot})
+
+    def _callback(self, data: str) -> Update:
+        update_id = next(self._update_ids)
+        return Update.model_validate({
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self.user,
+                "chat_instance": str(self.uid),
+                "data": data,
+                "message": {
+                    "message_id": self.session.message_ids.get(self.uid, 1),
+                    "date": int(time.time()),
+                    "chat": self.chat,
+                    "from": BOT_USER,
+                    "text": self.session.texts.get(self.uid, ""),
+                },
+            },
+        }, context={"bot": self.bot})
+
+    def pick(self, prefix: str) -> Optional[tuple]:
+        """Случайная кнопка последней клавиатуры с callback_data на prefix: (data, text)."""
+        kb = self.session.keyboards.get(self.uid)
+        if kb is None:
+            return None
+        buttons = [(b.callback_data, b.text) for row in kb.inline_keyboard for b in row
+                   if b.callback_data and b.callback_data.startswith(prefix)]
+        return self.rng.choice(buttons) if buttons else None
+
+    async def send(self, step: str, update: Update, samples: Dict[str, List[float]]) -> None:
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(self.bot, update)
+        finally:
+            samples[step].append(time.perf_counter() - started)
+
+    async def think(self, seconds: float) -> float:
+        pause = self.rng.uniform(0, seconds) if seconds else 0.0
+        if pause:
+            await asyncio.sleep(pause)
+        return pause
+
+    async def book(self, samples: Dict[str, List[float]], think: float, chat_share: float = 0.0) -> tuple:
+        """Один проход диалога. (исход, время без пауз «на подумать»)."""
+        started = time.perf_counter()
+        paused = 0.0
+
+        await self.send("cmd_start", self._message("/start"), samples)
+        steps = [
+            ("cb_start_flow", "start_flow"),
+            ("cb_palm_month", "palm_month:"),
+            ("cb_palm_sheet", "palm_sheet:"),
+            ("cb_palm_package", "palm_pkg:"),
+        ]
+        pkg_title = ""
+        for step, prefix in steps:
+            button = self.pick(prefix)
+            if button is None:
+                return f"stuck:{step}", time.perf_counter() - started - paused
+            if step == "cb_palm_package":
+                pkg_title = button[1]
+            paused += await self.think(think)
+            await self.send(step, self._callback(button[0]), samples)
+
+        if self.pick("gender:") is None:
+            return "stuck:cb_choose_gender", time.perf_counter() - started - paused
+        paused += await self.think(think)
+        await self.send("cb_choose_gender", self._callback(f"gender:{self.rng.choice('MF')}"), samples)
+
+        paused += await self.think(think)
+        if self.rng.random() < chat_share:
+            export = synthetic_chat_export(self.rng.randrange(1 << 30), cards=self.rng.randint(2, 8),
+                                           package=pkg_title, rooms=tuple(_ROOMS))
+            await self.send("process_chat_export", self._document("WhatsApp Chat.txt", export.encode("utf-8")), samples)
+            if self.pick("booking_place_bulk") is None:
+                return "stuck:process_chat_export", time.perf_counter() - started - paused
+            paused += await self.think(think)
+            await self.send("on_booking_place_bulk", self._callback("booking_place_bulk"), samples)
+        else:
+            card = synthetic_card(self.rng.randrange(1 << 30), package=pkg_title, room=self.rng.choice(_ROOMS))
+            await self.send("process_card", self._message(card), samples)
+            if self.pick("booking_place_auto") is None:
+                return "stuck:process_card", time.perf_counter() - started - paused
+
+            paused += await self.think(think)
+            await self.send("on_booking_place_auto", self._callback("booking_place_auto"), samples)
+
+        elapsed = time.perf_counter() - started - paused
+        reply = self.session.texts.get(self.uid, "")
+        if reply.startswith("✅ Размещено 0 "):
+            return "no_slot", elapsed
+        if reply.startswith("✅"):
+            return "placed", elapsed
+        if reply.startswith("Не нашёл"):
+            return "no_slot", elapsed
+        return f"other:{reply.splitlines()[0][:40] if reply else '—'}", elapsed
+
+
+# ---------- таблицы ----------
+
+def build_backend(args) -> tuple:
+    """Фейковый Google с одной таблицей на следующий месяц: вылеты должны быть в будущем."""
+    month_start = (date.today().replace(day=1) + timedelta(days=32)).replace(day=1)
+    month_key = f"{month_start:%B %Y}"
+
+    sheets = {}
+    for k in range(args.sheets):
+        day = month_start + timedelta(days=2 + 3 * k)
+        sheets[f"{day:%d.%m} NIYET"] = synthetic_sheet(args.packages, seed=k + 1, start=day, fill=args.fill)
+
+    backend = FakeSheetsBackend(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    backend.add_spreadsheet("load-test", f"{month_key} LOAD", sheets)
+    return backend, month_key
+
+
+# ---------- отчёт ----------
+
+def percentile(samples: List[float], q: float) -> float:
+    """Точный перцентиль (nearest-rank) по сырым замерам."""
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1e3:.1f}"
+
+
+def report(samples: Dict[str, List[float]], flows: List[float], outcomes: Counter,
+           wall: float, session: FakeTelegramSession, backend: FakeSheetsBackend) -> None:
+    print(f"\n{'шаг':<24} {'n':>6} {'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9} {'max, ms':>9}")
+    rows = list(samples.items()) + ([("— бронирование целиком", flows)] if flows else [])
+    for step, values in rows:
+        if not values:
+            continue
+        print(f"{step:<24} {len(values):>6} {_ms(percentile(values, .50)):>9} {_ms(percentile(values, .95)):>9} "
+              f"{_ms(percentile(values, .99)):>9} {_ms(max(values)):>9}")
+
+    updates = sum(len(v) for v in samples.values())
+    print(f"\n⏱ {wall:.2f} s: {len(flows) / wall:.2f} бронирований/с, {updates / wall:.1f} апдейтов/с")
+    print("📊 Исходы: " + ", ".join(f"{k}={v}" for k, v in outcomes.most_common()))
+
+    fake = backend.stats()
+    print(f"🌐 Google: {sum(fake['calls'].values())} запросов {fake['calls']}"
+          + (f", ошибки: {fake['errors']}" if fake["errors"] else ""))
+    print(f"💬 Telegram: {dict(session.calls)}")
+    print(f"🧵 Пул Sheets: {gateway_stats()}")
+    quota = quota_stats()
+    waited = sum(b["wait_seconds"] for b in quota.get("buckets", {}).values())
+    print(f"🚦 Квота: { {k: v for k, v in quota.items() if k != 'buckets'} }, ожидание в корзинах {waited:.2f} s")
+    api = metrics.summary("sheets_api_seconds", "op")
+    if api:
+        print("🔌 Google API по операциям (по корзинам гистограммы):")
+        for op, s in sorted(api.items()):
+            print(f"   {op:<22} n={s['count']:<6} p50={_ms(s['p50'])} ms  p95={_ms(s['p95'])} ms")
+
+
+# ---------- прогон ----------
+
+async def run(args) -> int:
+    backend, month_key = build_backend(args)
+    use_google_client(make_client(backend), {month_key: "load-test"})
+    setup_dispatcher()
+    metrics.reset()
+
+    session = FakeTelegramSession(latency=args.tg_latency)
+    bot = Bot(token="42:LOAD-TEST", session=session)
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    flows: List[float] = []
+    outcomes: Counter = Counter()
+
+    async def manager_loop(i: int) -> None:
+        manager = Manager(10_000 + i, bot, session, random.Random(args.seed * 100_003 + i))
+        await asyncio.sleep(manager.rng.uniform(0, args.ramp))
+        for _ in range(args.flows):
+            try:
+                outcome, elapsed = await manager.book(samples, args.think, args.chat_share)
+            except Exception as e:
+                outcome, elapsed = f"error:{type(e).__name__}", None
+            outcomes[outcome.split(":")[0] if outcome.startswith("other") else outcome] += 1
+            if elapsed is not None and outcome in ("placed", "no_slot"):
+                flows.append(elapsed)
+
+    print(f"🚀 {args.users} менеджеров × {args.flows} бронирований, «{month_key}»: "
+          f"{args.sheets} листов × {args.packages} пакетов, Google +{args.latency}s, Telegram +{args.tg_latency}s")
+
+    started = time.perf_counter()
+    quiet = contextlib.nullcontext() if args.verbose else _quiet()
+    with quiet:
+        await asyncio.gather(*(manager_loop(i) for i in range(args.users)))
+    wall = time.perf_counter() - started
+
+    report(samples, flows, outcomes, wall, session, backend)
+    await bot.session.close()
+    return 0 if flows else 1
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Хэндлеры и парсеры печатают на каждый шаг — на время прогона вывод в /dev/null."""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон диалога бронирования")
+    parser.add_argument("--users", type=int, default=20, help="одновременных менеджеров")
+    parser.add_argument("--flows", type=int, default=3, help="бронирований на менеджера подряд")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза между шагами, до N сек (случайно)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="разнести старт менеджеров на N сек")
+    parser.add_argument("--sheets", type=int, default=4, help="листов (вылетов) в таблице")
+    parser.add_argument("--packages", type=int, default=12, help="пакетов на листе")
+    parser.add_argument("--fill", type=float, default=0.3, help="доля полностью занятых комнат")
+    parser.add_argument("--latency", type=float, default=0.1, help="задержка фейкового Google, сек")
+    parser.add_argument("--jitter", type=float, default=0.05, help="случайная добавка к задержке Google, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429 от Google")
+    parser.add_argument("--tg-latency", type=float, default=0.03, help="задержка Bot API, сек")
+    parser.add_argument("--chat-share", type=float, default=0.0,
+                        help="доля проходов с экспортом чата WhatsApp вместо одной карточки")
+    parser.add_argument("--real-quota", action="store_true", help="боевые лимиты квоты Sheets (см. начало файла)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-v", "--verbose", action="store_true", help="не глушить вывод бота")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
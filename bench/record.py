@@ -0,0 +1,46 @@
+# bench/record.py
+# Записать боевые листы в bench/fixtures/ (дампы get_all_values()), чтобы гонять бенчмарки
+# и нагрузку на настоящей раскладке, но без Google:
+#
+#   python -m bench.record                       # все листы всех таблиц паломников
+#   python -m bench.record --month "November 2025 TEST" --sheet "12.10 NIYET"
+#
+# Нужны credentials сервисного аккаунта, как и самому боту.
+# В дампах — персональные данные паломников: в git их не коммитим.
+
+import argparse
+import os
+
+from bench.fixtures import FIXTURES_DIR, fixture_name, save_fixture
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Дамп листов паломников в JSON-фикстуры")
+    parser.add_argument("--month", action="append", help="month_key из PALM_SHEETS (можно несколько)")
+    parser.add_argument("--sheet", action="append", help="название листа (можно несколько)")
+    parser.add_argument("--out", default=FIXTURES_DIR, help="куда писать (по умолчанию bench/fixtures)")
+    args = parser.parse_args()
+
+    from pligrim_bot.config.settings import PALM_SHEETS, list_worksheets, open_spreadsheet
+
+    months = args.month or list(PALM_SHEETS)
+    saved = 0
+    for month_key in months:
+        spreadsheet_id = PALM_SHEETS.get(month_key)
+        if not spreadsheet_id:
+            print(f"❌ Нет таблицы для {month_key!r}; есть: {list(PALM_SHEETS)}")
+            continue
+        ss = open_spreadsheet(spreadsheet_id)
+        for ws in list_worksheets(spreadsheet_id):
+            if args.sheet and ws.title not in args.sheet:
+                continue
+            values = ws.get_all_values()
+            path = os.path.join(args.out, fixture_name(ss.title, ws.title))
+            save_fixture(path, values)
+            saved += 1
+            print(f"💾 {ss.title} / {ws.title}: {len(values)} строк → {path}")
+    print(f"✅ Записано листов: {saved}")
+
+
+if __name__ == "__main__":
+    main()
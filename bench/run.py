@@ -0,0 +1,281 @@
+# bench/run.py
+# Офлайн-бенчмарки горячего пути на фейковом Google Sheets (bench/fake_sheets.py):
+#
+#   python -m bench.run                         # прогон и сравнение с bench/baseline.json
+#   python -m bench.run --save-baseline         # записать новую базу
+#   python -m bench.run -k config --sizes x10   # только кейсы с «config» в имени, только x10
+#   python -m bench.run --latency 0.2 --error-rate 0.1   # холодные кейсы с задержкой и 429
+#
+# Листы: записанные (bench/record.py) или синтетические small / medium / x10.
+# Время сравнивается с базой с поправкой на скорость машины (калибровочный цикл);
+# медленнее базы больше чем на --threshold — регресс, код выхода 1.
+
+import os
+import sys
+import tempfile
+
+# Бенчмарк не должен трогать состояние бота и упираться в настоящую квоту —
+# окружение выставляем до импорта pligrim_bot (константы читаются при импорте).
+os.environ.setdefault("BOT_STATE_DIR", tempfile.mkdtemp(prefix="bench-state-"))
+os.environ.setdefault("FSM_STORAGE", "memory")
+os.environ.setdefault("PREFETCH_DEPARTURES", "0")
+for _name in ("SHEETS_READS_PER_MIN", "SHEETS_WRITES_PER_MIN", "SHEETS_SHEET_READS_PER_MIN", "SHEETS_SHEET_WRITES_PER_MIN"):
+    os.environ.setdefault(_name, "1000000")
+os.environ.setdefault("SHEETS_QUOTA_BURST", "1000000")
+os.environ.setdefault("SHEETS_BACKOFF_BASE", "0.05")
+os.environ.setdefault("SHEETS_BACKOFF_MAX", "0.5")
+
+import argparse
+import contextlib
+import json
+import platform
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bench.fake_sheets import FakeSheetsBackend, make_client
+from bench.fixtures import sheet_sets, synthetic_card
+
+from pligrim_bot.core.config_table import build_config_table
+from pligrim_bot.core.package_index import forget_index
+from pligrim_bot.core.parsers.booking_parser import build_sheet_row_payload, parse_booking_card
+from pligrim_bot.core.parsers.package_parser import (
+    find_config_block,
+    find_config_block_4u,
+    find_config_block_by_package_name,
+    find_palm_packages,
+    is_4u_title,
+    kind_from_title,
+    package_bounds,
+    scan_palm_packages,
+)
+from pligrim_bot.core.parsers.people_parser import collect_people_groups, detect_people_header
+from pligrim_bot.core.room_allocator import find_free_slot_auto, find_free_slot_in
+from pligrim_bot.data import sheet_cache
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+WS_TITLE = "12.10 NIYET"
+
+# (имя кейса, функция, setup перед КАЖДЫМ вызовом или None)
+Case = Tuple[str, Callable[[], object], Optional[Callable[[], None]]]
+
+
+# ---------- замер ----------
+
+def _run(fn: Callable, setup: Optional[Callable], number: int) -> float:
+    total = 0.0
+    for _ in range(number):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        total += time.perf_counter() - started
+    return total
+
+
+def measure(fn: Callable, setup: Optional[Callable] = None, *, rounds: int = 5,
+            min_time: float = 0.05) -> Tuple[float, float]:
+    """(медиана, минимум) секунд на вызов: rounds раундов по number вызовов, раунд ≥ min_time."""
+    number = 1
+    while True:
+        spent = _run(fn, setup, number)
+        if spent >= min_time or number >= 100_000:
+            break
+        number = min(100_000, max(number * 2, int(number * min_time / max(spent, 1e-9)) + 1))
+    samples = [_run(fn, setup, number) / number for _ in range(rounds)]
+    return statistics.median(samples), min(samples)
+
+
+def calibrate() -> float:
+    """Фиксированная чисто питоновская нагрузка: поправка на скорость машины при сравнении с базой."""
+    def work():
+        words = [f"{i % 97}.{i % 12}-{i % 31} NIYET/{i}" for i in range(3000)]
+        index = {}
+        for w in words:
+            index.setdefault(w.split()[0], []).append(w.lower())
+        return sorted(index, key=len)
+    return measure(work, rounds=7)[1]
+
+
+# ---------- кейсы ----------
+
+def _pick(packages: List[dict], want: Callable[[dict], bool]) -> Optional[dict]:
+    """Последний подходящий пакет: конфиги 4U/fallback ищутся в нижних 40 строках листа."""
+    for pkg in reversed(packages):
+        if want(pkg):
+            return pkg
+    return None
+
+
+def sheet_cases(size: str, values: List[List[str]], backend: FakeSheetsBackend) -> List[Case]:
+    sid = f"bench-{size}"
+    backend.add_spreadsheet(sid, f"Bench {size}", {WS_TITLE: values})
+    ws = make_client(backend).open_by_key(sid).worksheet(WS_TITLE)
+
+    packages = scan_palm_packages(values)
+    if not packages:
+        print(f"⚠️ {size}: на листе не нашлось пакетов — пропускаем")
+        return []
+    for i, pkg in enumerate(packages):
+        pkg["end"] = packages[i + 1]["row"] if i + 1 < len(packages) else len(values)
+    booking = parse_booking_card(synthetic_card(1))
+    booking["gender"] = "M"
+    payload = build_sheet_row_payload(booking)
+
+    # пакет из середины листа, где для карточки есть место (иначе замеряли бы промах)
+    order = packages[len(packages) // 2:] + packages[:len(packages) // 2]
+    middle = next((p for p in order if find_free_slot_in(values, p["row"], p["end"], payload)), order[0])
+    plain = _pick(packages, lambda p: not is_4u_title(p["title"])) or middle
+    four_u = _pick(packages, lambda p: is_4u_title(p["title"]))
+
+    hdr_row = middle["header_row"]
+    with _quiet():
+        cols = detect_people_header(values[hdr_row])
+
+    def cold() -> None:
+        sheet_cache.invalidate(ws)
+        forget_index(ws)
+
+    cases: List[Case] = [
+        ("scan_palm_packages", lambda: scan_palm_packages(values), None),
+        ("find_palm_packages[cold]", lambda: find_palm_packages(ws), cold),
+        ("find_palm_packages[warm]", lambda: find_palm_packages(ws), None),
+        ("package_bounds[warm]", lambda: package_bounds(ws, middle["row"]), None),
+        ("find_free_slot_auto[cold]", lambda: find_free_slot_auto(ws, middle["row"], payload), cold),
+        ("find_free_slot_auto[warm]", lambda: find_free_slot_auto(ws, middle["row"], payload), None),
+        ("build_config_table", lambda: build_config_table(values), None),
+        ("find_config_block", lambda: find_config_block(values, plain["row"], plain["end"], kind_from_title(plain["title"])), None),
+        ("find_config_block_by_package_name",
+         lambda: find_config_block_by_package_name(values, plain["row"], plain["end"], plain["title"]), None),
+        ("collect_people_groups", lambda: collect_people_groups(values, hdr_row, cols, middle["end"], middle["row"]), None),
+    ]
+    if four_u is not None:
+        cases.append(("find_config_block_4u", lambda: find_config_block_4u(values, four_u["title"]), None))
+    return cases
+
+
+def card_cases() -> List[Case]:
+    cards = [synthetic_card(seed) for seed in range(20)]
+    return [("parse_booking_card", lambda: [parse_booking_card(c) for c in cards], None)]
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Парсеры печатают отладку на каждый вызов — в замере она уходит в /dev/null (но форматируется)."""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+# ---------- база и отчёт ----------
+
+def load_baseline(path: str) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path: str, calibration: float, results: Dict[str, float]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "calibration": calibration,
+            "results": results,
+        }, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарки горячего пути бота")
+    parser.add_argument("-k", dest="keyword", help="только кейсы, в имени которых есть подстрока")
+    parser.add_argument("--sizes", nargs="+", default=None, help="размеры листов: small medium x10")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка фейкового Google, сек")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты как новую базу")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допуск замедления (0.25 = +25%%)")
+    args = parser.parse_args(argv)
+
+    backend = FakeSheetsBackend(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    if args.save_baseline and (args.latency or args.jitter or args.error_rate):
+        print("❌ Базу пишем только без задержек и ошибок фейка")
+        return 2
+
+    suites: List[Tuple[str, List[Case]]] = [("card", card_cases())]
+    for size, values in sheet_sets():
+        if args.sizes and size not in args.sizes:
+            continue
+        with _quiet():
+            suites.append((size, sheet_cases(size, values, backend)))
+
+    calibration = calibrate()
+    baseline = load_baseline(args.baseline)
+    scale = calibration / baseline["calibration"] if baseline else 1.0
+    print(f"⚙️ Калибровка: {_fmt(calibration)}" + (f" (база ×{scale:.2f})" if baseline else " (базы нет)"))
+    print(f"{'кейс':<50} {'медиана':>11} {'мин':>11} {'база':>11} {'Δ':>8}")
+
+    results: Dict[str, float] = {}
+    regressions: List[str] = []
+    for size, cases in suites:
+        for name, fn, setup in cases:
+            key = f"{size}/{name}"
+            if args.keyword and args.keyword not in key:
+                continue
+            with _quiet():
+                median, best = measure(fn, setup, rounds=args.rounds)
+            # сравниваем минимум: он меньше всего шумит от соседних процессов (как в timeit)
+            results[key] = best
+
+            base = (baseline or {}).get("results", {}).get(key)
+            expected = base * scale if base else None
+            delta, mark = "", ""
+            if expected:
+                ratio = best / expected
+                delta = f"{(ratio - 1) * 100:+.0f}%"
+                if ratio > 1 + args.threshold:
+                    mark = " 🔴"
+                    regressions.append(f"{key}: {_fmt(best)} против {_fmt(expected)} ({delta})")
+                elif ratio < 1 - args.threshold:
+                    mark = " 🟢"
+            print(f"{key:<50} {_fmt(median):>11} {_fmt(best):>11} {_fmt(expected):>11} {delta:>8}{mark}")
+
+    fake = backend.stats()
+    print(f"🌐 Запросы к фейковому Google: {fake['calls']}" + (f", ошибки: {fake['errors']}" if fake["errors"] else ""))
+
+    if args.save_baseline:
+        if baseline and (args.keyword or args.sizes):
+            # частичный прогон: дописываем в старую базу, приведя время к её калибровке
+            merged = dict(baseline["results"])
+            merged.update({key: t / scale for key, t in results.items()})
+            save_baseline(args.baseline, baseline["calibration"], merged)
+        else:
+            save_baseline(args.baseline, calibration, results)
+        print(f"💾 База записана: {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n🔴 Регрессии (допуск +{args.threshold:.0%}):")
+        for line in regressions:
+            print(f"   {line}")
+        return 1
+    if baseline:
+        print("✅ Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
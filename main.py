@@ -8,12 +8,8 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
 try:
-    from pligrim_bot.config.settings import get_google_client, refresh_sheets
-    from pligrim_bot.config.constants import bot, dp
-
-    # Подключаем оба роутера
-    from pligrim_bot.handlers.palm_booking_flow import router as booking_router
-    from pligrim_bot.handlers.edit_handlers import router as edit_router
+    from pligrim_bot.app import run_polling, run_webhook
+    from pligrim_bot.config.constants import BOT_MODE
 
     print("✅ Все модули успешно импортированы")
 except ImportError as e:
@@ -22,20 +18,16 @@ except ImportError as e:
 
 
 async def main():
-    print("✅ Бот запускается…")
-    await bot.delete_webhook(drop_pending_updates=True)
-
-    # Регистрируем роутеры
-    dp.include_router(booking_router)
-    dp.include_router(edit_router)
-
     # Временные папки (если нужны)
     os.makedirs("tmp", exist_ok=True)
     os.makedirs("assets/fonts", exist_ok=True)
     os.makedirs("assets/images", exist_ok=True)
 
-    print("🚀 Polling started…")
-    await dp.start_polling(bot)
+    # webhook — несколько процессов-воркеров (BOT_WORKERS), polling — один процесс
+    if BOT_MODE == "webhook":
+        await run_webhook()
+    else:
+        await run_polling()
 
 
 if __name__ == "__main__":
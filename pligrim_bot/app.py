@@ -0,0 +1,364 @@
+# pligrim_bot/app.py
+# Запуск бота: polling одним процессом или webhook с несколькими процессами-воркерами.
+#
+# Webhook: aiohttp-фронт принимает апдейты от Telegram и раскладывает их по воркерам
+# по user_id (user_id % BOT_WORKERS) — все апдейты одного человека идут в один процесс
+# и обрабатываются там строго по очереди. FSM — общий SQLite/Redis (FSM_STORAGE),
+# кэш листов и замки записи — shared_cache.
+
+import asyncio
+import contextlib
+import hmac
+import multiprocessing as mp
+import queue as queue_mod
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from pligrim_bot.config.constants import (
+    BOT_WORKERS,
+    FSM_STORAGE,
+    METRICS_PORT,
+    WEBHOOK_BASE_URL,
+    WEBHOOK_HOST,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_SECRET,
+    bot,
+    dp,
+)
+from pligrim_bot.config.settings import discover_sheets_in_background, follow_saved_sheets
+from pligrim_bot.core import metrics
+from pligrim_bot.core.config_table import config_table_stats
+from pligrim_bot.core.package_index import index_stats
+from pligrim_bot.core.placement_writer import writer_stats
+from pligrim_bot.core.prefetch import prefetch_in_background, prefetch_stats
+from pligrim_bot.core.sheets_gateway import gateway_stats
+from pligrim_bot.core.sheets_quota import quota_stats
+from pligrim_bot.core.utils.date_utils import date_cache_stats
+from pligrim_bot.data.sheet_cache import cache_stats
+from pligrim_bot.data.sheet_revisions import notify_changed, revision_stats
+
+_ROUTERS_READY = False
+
+SHEETS_CHANGED_PATH = "/sheets/changed"
+_DRIVE_FILE_RX = re.compile(r"/files/([^/?]+)")
+
+
+def setup_dispatcher() -> None:
+    """Подключает роутеры к dp (один раз на процесс)."""
+    global _ROUTERS_READY
+    if _ROUTERS_READY:
+        return
+    from pligrim_bot.handlers.palm_booking_flow import router as booking_router
+    from pligrim_bot.handlers.edit_handlers import router as edit_router
+
+    dp.include_router(booking_router)
+    dp.include_router(edit_router)
+    _setup_metrics()
+    _ROUTERS_READY = True
+
+
+def _setup_metrics() -> None:
+    """Время хэндлеров и счётчики модулей — в /metrics."""
+    metrics.install(dp)
+    metrics.register_stats("sheet_cache", cache_stats)
+    metrics.register_stats("package_index", index_stats)
+    metrics.register_stats("config_table", config_table_stats)
+    metrics.register_stats("date_cache", date_cache_stats)
+    metrics.register_stats("sheets_gateway", gateway_stats)
+    metrics.register_stats("sheets_quota", quota_stats)
+    metrics.register_stats("placement_writer", writer_stats)
+    metrics.register_stats("prefetch", prefetch_stats)
+    metrics.register_stats("sheet_revisions", revision_stats)
+
+
+def update_user_id(update: dict) -> int:
+    """Кто прислал апдейт (from / user / chat внутри message, callback_query и т.п.); 0 — не нашли."""
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        for field in ("from", "user", "chat"):
+            who = value.get(field)
+            if isinstance(who, dict) and "id" in who:
+                return int(who["id"])
+    return 0
+
+
+class UserQueue:
+    """
+    Апдейты одного пользователя — строго по очереди, разных пользователей — параллельно.
+    limit — сколько апдейтов может быть в работе разом (None — без предела).
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self._tails: Dict[int, asyncio.Task] = {}
+        self.limit = limit
+        self.in_flight = 0
+        self._freed = asyncio.Event()
+
+    def submit(self, user_id: int, update: dict) -> bool:
+        """В очередь пользователя; False — в работе уже limit апдейтов, апдейт не принят."""
+        if self.limit is not None and self.in_flight >= self.limit:
+            return False
+        prev = self._tails.get(user_id)
+        task = asyncio.create_task(self._run(prev, update))
+        self._tails[user_id] = task
+        self.in_flight += 1
+        task.add_done_callback(lambda t: self._done(user_id, t))
+        return True
+
+    async def wait_slot(self) -> None:
+        """Ждёт, пока в работе станет меньше limit апдейтов."""
+        while self.limit is not None and self.in_flight >= self.limit:
+            self._freed.clear()
+            await self._freed.wait()
+
+    def _done(self, user_id: int, task: asyncio.Task) -> None:
+        self.in_flight -= 1
+        self._freed.set()
+        if self._tails.get(user_id) is task:
+            self._tails.pop(user_id)
+
+    @staticmethod
+    async def _run(prev: Optional[asyncio.Task], update: dict) -> None:
+        if prev is not None:
+            await asyncio.wait([prev])
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            print(f"❌ Ошибка обработки апдейта {update.get('update_id')}: {e}")
+
+    async def drain(self) -> None:
+        if self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+
+def _start_background(leader: bool = True) -> List[asyncio.Task]:
+    """
+    Фоновые задачи процесса: поиск таблиц и прогрев ближайших вылетов.
+    Их ведёт один процесс (leader), иначе запросы в Google множатся на число воркеров;
+    остальные только подхватывают найденную карту таблиц, а снимки листов — из shared_cache.
+    """
+    if not leader:
+        return [asyncio.create_task(follow_saved_sheets())]
+    return [
+        asyncio.create_task(discover_sheets_in_background()),
+        asyncio.create_task(prefetch_in_background()),
+    ]
+
+
+# ---------- polling ----------
+
+async def run_polling() -> None:
+    print("✅ Бот запускается (polling)…")
+    setup_dispatcher()
+    await bot.delete_webhook(drop_pending_updates=True)
+
+    # Таблицы ищем в фоне: polling стартует сразу, даже если Google тормозит
+    background = _start_background()
+    metrics_runner = await metrics.start_metrics_server(METRICS_PORT)
+
+    print("🚀 Polling started…")
+    try:
+        await dp.start_polling(bot)
+    finally:
+        for task in background:
+            task.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+
+# ---------- webhook: воркер ----------
+
+def _worker_main(index: int, updates: "mp.Queue") -> None:
+    """Точка входа процесса-воркера (spawn — свой Bot, свои кэши в памяти)."""
+    try:
+        asyncio.run(_worker_loop(index, updates))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_loop(index: int, updates: "mp.Queue") -> None:
+    setup_dispatcher()
+    print(f"👷 Воркер #{index} запущен")
+    background = _start_background(leader=index == 0)
+    # у каждого воркера свои счётчики — и своя страница метрик
+    metrics_runner = await metrics.start_metrics_server(METRICS_PORT + 1 + index if METRICS_PORT > 0 else 0)
+
+    loop = asyncio.get_running_loop()
+    reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"updates-{index}")
+    # не больше WEBHOOK_QUEUE_SIZE апдейтов в работе: остальные ждут в очереди фронта,
+    # а когда заполнится и она — фронт отвечает Telegram 503
+    users = UserQueue(WEBHOOK_QUEUE_SIZE)
+    try:
+        while True:
+            await users.wait_slot()
+            update = await loop.run_in_executor(reader, updates.get)
+            if update is None:      # фронт останавливается
+                break
+            users.submit(update_user_id(update), update)
+        await users.drain()
+    finally:
+        for task in background:
+            task.cancel()
+        reader.shutdown(wait=False)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await dp.storage.close()
+        await bot.session.close()
+        print(f"🛑 Воркер #{index} остановлен")
+
+
+# ---------- webhook: фронт ----------
+
+class _Workers:
+    """Процессы-воркеры и их очереди; упавший воркер перезапускается с той же очередью."""
+
+    def __init__(self, count: int):
+        self.ctx = mp.get_context("spawn")
+        self.queues: List["mp.Queue"] = [self.ctx.Queue(WEBHOOK_QUEUE_SIZE) for _ in range(count)]
+        self.procs: List[Optional[mp.Process]] = [None] * count
+
+    def _spawn(self, index: int) -> None:
+        proc = self.ctx.Process(
+            target=_worker_main, args=(index, self.queues[index]),
+            name=f"bot-worker-{index}", daemon=True,
+        )
+        proc.start()
+        self.procs[index] = proc
+
+    def start(self) -> None:
+        for index in range(len(self.queues)):
+            self._spawn(index)
+
+    def route(self, update: dict) -> bool:
+        """В очередь воркера этого пользователя; False — очередь полна."""
+        index = update_user_id(update) % len(self.queues)
+        try:
+            self.queues[index].put_nowait(update)
+        except queue_mod.Full:
+            return False
+        return True
+
+    async def watch(self, interval: float = 5.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for index, proc in enumerate(self.procs):
+                if proc is not None and not proc.is_alive():
+                    print(f"⚠️ Воркер #{index} упал (код {proc.exitcode}) — перезапускаем")
+                    self._spawn(index)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        for q in self.queues:
+            with contextlib.suppress(Exception):
+                q.put(None, timeout=1)
+        for proc in self.procs:
+            if proc is not None:
+                proc.join(timeout)
+                if proc.is_alive():
+                    proc.terminate()
+
+
+async def run_webhook(workers: int = BOT_WORKERS) -> None:
+    if not WEBHOOK_BASE_URL:
+        raise RuntimeError("❌ BOT_MODE=webhook, но не задан WEBHOOK_BASE_URL")
+
+    setup_dispatcher()      # нужен фронту для allowed_updates (и для обработки при одном воркере)
+    workers = max(1, workers)
+    if workers > 1 and FSM_STORAGE == "memory":
+        print("⚠️ FSM_STORAGE=memory при нескольких воркерах: состояние не переживёт рестарт воркера")
+
+    pool: Optional[_Workers] = None
+    users: Optional[UserQueue] = None
+    background: List[asyncio.Task] = []
+
+    if workers > 1:
+        pool = _Workers(workers)
+        pool.start()
+        background.append(asyncio.create_task(pool.watch()))
+        route = pool.route
+    else:
+        # один воркер — обрабатываем прямо во фронте
+        # тот же предел, что у очереди воркера: сверх него — 503, Telegram повторит позже
+        users = UserQueue(WEBHOOK_QUEUE_SIZE)
+        background += _start_background()
+
+        def route(update: dict) -> bool:
+            return users.submit(update_user_id(update), update)
+
+    async def handle(request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        # очередь воркера полна — отвечаем ошибкой, Telegram повторит апдейт позже
+        if route(update):
+            metrics.inc("webhook_updates_total", status="accepted")
+            return web.Response()
+        metrics.inc("webhook_updates_total", status="queue_full")
+        return web.Response(status=503)
+
+    async def sheets_changed(request: web.Request) -> web.Response:
+        """
+        Push «таблица изменилась»: ?spreadsheet_id=...&sheet=... с WEBHOOK_SECRET в заголовке
+        X-Sheets-Token (onEdit из Apps Script) или Drive push-канал (token в X-Goog-Channel-Token,
+        id файла — в X-Goog-Resource-Uri). Секрет — только в заголовке, не в URL: URL пишут в логи.
+        """
+        token = request.headers.get("X-Sheets-Token") or request.headers.get("X-Goog-Channel-Token") or ""
+        if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+            return web.Response(status=401)
+        spreadsheet_id = request.query.get("spreadsheet_id")
+        if not spreadsheet_id:
+            m = _DRIVE_FILE_RX.search(request.headers.get("X-Goog-Resource-Uri", ""))
+            spreadsheet_id = m.group(1) if m else None
+        if not spreadsheet_id:
+            return web.Response(status=400)
+        notify_changed(spreadsheet_id, request.query.get("sheet") or None)
+        return web.Response()
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle)
+    # без секрета кто угодно мог бы сбрасывать кэш и выжигать квоту Sheets перекачками
+    if WEBHOOK_SECRET:
+        app.router.add_post(SHEETS_CHANGED_PATH, sheets_changed)
+    else:
+        print(f"⚠️ WEBHOOK_SECRET не задан — {SHEETS_CHANGED_PATH} выключен")
+    app.router.add_get("/healthz", healthz)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+
+    await bot.set_webhook(
+        url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET or None,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    print(f"🚀 Webhook {WEBHOOK_PATH} на {WEBHOOK_HOST}:{WEBHOOK_PORT}, воркеров: {workers}")
+    # метрики фронта (и всего бота, если воркер один) — на METRICS_PORT, не на публичном порту
+    metrics_runner = await metrics.start_metrics_server(METRICS_PORT)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for task in background:
+            task.cancel()
+        await runner.cleanup()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if users is not None:
+            await users.drain()
+        if pool is not None:
+            await asyncio.to_thread(pool.stop)
+        await dp.storage.close()
+        await bot.session.close()
@@ -1,10 +1,11 @@
 from aiogram import Bot, Dispatcher, F
-import gspread
 from google.oauth2.service_account import Credentials
 import json
 import os
 import re
 
+from pligrim_bot.data.state_storage import TTLMap, make_fsm_storage
+
 # Базовые пути
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # папка config
 PROJECT_ROOT = os.path.dirname(BASE_DIR)  # папка pligrim_bot
@@ -27,28 +28,110 @@ SCOPES = [
 ]
 SHEET_ID = "1sUo_1riAue-l0H-tKAn1EHy8XEHy3SBxc7jmZQqGwx4"
 
-# 1. Пробуем получить ключи из переменной окружения (для сервера Koyeb)
-json_config = os.getenv("GOOGLE_CREDS_JSON")
+# Кэш снимков листов (get_all_values): сколько секунд живёт снимок и сколько листов держим
+SHEET_CACHE_TTL = float(os.getenv("SHEET_CACHE_TTL", "120"))
+SHEET_CACHE_MAX_SHEETS = int(os.getenv("SHEET_CACHE_MAX_SHEETS", "32"))
+SHEET_CACHE_MAX_BLOCKS = int(os.getenv("SHEET_CACHE_MAX_BLOCKS", "256"))  # куски листов (диапазоны пакетов)
+# Снимки в памяти — компактно (таблица строк листа + номера по колонкам, см. data/compact_sheet.py)
+SHEET_CACHE_COMPACT = os.getenv("SHEET_CACHE_COMPACT", "1") == "1"
+# Протухший по TTL снимок сверяем с ревизией таблицы в Drive: не менялась — продлеваем без скачивания.
+# Ревизию одной таблицы спрашиваем не чаще раза в SHEET_REVISION_CHECK_TTL сек; снимок старше
+# SHEET_CACHE_MAX_AGE перекачиваем в любом случае (Drive может отставать от правок в Sheets,
+# поэтому по умолчанию это всего несколько SHEET_CACHE_TTL — меню не отстают от ручных правок надолго).
+SHEET_CHANGE_DETECTION = os.getenv("SHEET_CHANGE_DETECTION", "1") == "1"
+SHEET_REVISION_CHECK_TTL = float(os.getenv("SHEET_REVISION_CHECK_TTL", "5"))
+SHEET_CACHE_MAX_AGE = float(os.getenv("SHEET_CACHE_MAX_AGE", str(3 * SHEET_CACHE_TTL)))
+# Кэш метаданных таблиц (open_by_key + список листов), сек
+SPREADSHEET_META_TTL = float(os.getenv("SPREADSHEET_META_TTL", "600"))
+
+# Пул потоков для синхронного gspread: сколько запросов к Google идёт параллельно
+# и сколько секунд ждём один вызов (HTTP-таймаут чуть меньше, чтобы поток не висел дольше)
+SHEETS_WORKERS = int(os.getenv("SHEETS_WORKERS", "8"))
+SHEETS_CALL_TIMEOUT = float(os.getenv("SHEETS_CALL_TIMEOUT", "30"))
+SHEETS_HTTP_TIMEOUT = float(os.getenv("SHEETS_HTTP_TIMEOUT", "25"))
+
+# Квота Sheets API (запросов в минуту): на сервисный аккаунт и на одну таблицу.
+# При нескольких воркерах делится между ними поровну (см. sheets_quota).
+SHEETS_READS_PER_MIN = float(os.getenv("SHEETS_READS_PER_MIN", "60"))
+SHEETS_WRITES_PER_MIN = float(os.getenv("SHEETS_WRITES_PER_MIN", "60"))
+SHEETS_SHEET_READS_PER_MIN = float(os.getenv("SHEETS_SHEET_READS_PER_MIN", "40"))
+SHEETS_SHEET_WRITES_PER_MIN = float(os.getenv("SHEETS_SHEET_WRITES_PER_MIN", "40"))
+SHEETS_QUOTA_BURST = int(os.getenv("SHEETS_QUOTA_BURST", "10"))
+# Повторы при 429/5xx: сколько раз и пауза base * 2^n (не больше max), с разбросом
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "4"))
+SHEETS_BACKOFF_BASE = float(os.getenv("SHEETS_BACKOFF_BASE", "1"))
+SHEETS_BACKOFF_MAX = float(os.getenv("SHEETS_BACKOFF_MAX", "16"))
+
+# Фоновый прогрев снимков и индексов пакетов ближайших вылетов (0 — выключен).
+# Интервал держим меньше SHEET_CACHE_TTL, чтобы снимок не успевал протухнуть между проходами.
+PREFETCH_DEPARTURES = int(os.getenv("PREFETCH_DEPARTURES", "5"))
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "90"))
+PREFETCH_STAGGER = float(os.getenv("PREFETCH_STAGGER", "3"))          # пауза между листами, сек
+PREFETCH_MIN_HEADROOM = float(os.getenv("PREFETCH_MIN_HEADROOM", "5"))  # меньше запаса квоты — пропускаем проход
+
+# Метрики (гистограммы хэндлеров, запросов к Sheets, парсеров) в формате Prometheus.
+# METRICS_PORT=0 — страницу не поднимаем; воркеры webhook занимают METRICS_PORT+1+номер.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Локальное состояние бота (карта таблиц и т.п.), переживает рестарт контейнера
+STATE_DIR = os.getenv("BOT_STATE_DIR", os.path.join(PROJECT_ROOT, "state"))
+PALM_SHEETS_FILE = os.path.join(STATE_DIR, "palm_sheets.json")
+PACKAGE_INDEX_FILE = os.path.join(STATE_DIR, "package_index.json")
+
+# Как часто фоновая задача заново ищет таблицы паломников (сек)
+SHEETS_DISCOVERY_INTERVAL = float(os.getenv("SHEETS_DISCOVERY_INTERVAL", "1800"))
+
+# Состояния диалогов (FSM): memory | sqlite | redis. SQLite-файл переживает рестарт,
+# Redis нужен, если воркеры бота на разных машинах.
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_STATE_FILE = os.path.join(STATE_DIR, "fsm.sqlite3")
+FSM_REDIS_URL = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+FSM_TTL = float(os.getenv("FSM_TTL", str(3 * 24 * 3600)))   # брошенный диалог живёт 3 дня
+FSM_MAX_KEYS = int(os.getenv("FSM_MAX_KEYS", "20000"))
+# Превью ваучеров и режим правки (PREVIEW_CACHE / EDIT_STATE): сек и штук
+PREVIEW_CACHE_TTL = float(os.getenv("PREVIEW_CACHE_TTL", "3600"))
+PREVIEW_CACHE_MAX = int(os.getenv("PREVIEW_CACHE_MAX", "500"))
+# Импорт экспорта чата WhatsApp: больше карточек в одну пачку не берём (пачка лежит в FSM)
+CHAT_IMPORT_MAX_CARDS = int(os.getenv("CHAT_IMPORT_MAX_CARDS", "60"))
+
+# Режим запуска: polling (один процесс) или webhook (aiohttp + BOT_WORKERS процессов-воркеров)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")          # https://bot.example.com — без пути
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", os.getenv("WEBHOOK_PORT", "8080")))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))   # апдейтов в очереди одного воркера
+# Общий для воркеров кэш листов (снимки + поколения) и замки записи; включается сам при BOT_WORKERS > 1
+SHEET_CACHE_SHARED = os.getenv("SHEET_CACHE_SHARED", "1" if BOT_WORKERS > 1 else "0") == "1"
+SHEET_CACHE_SHARED_FILE = os.path.join(STATE_DIR, "sheet_cache.sqlite3")
+
+
+def load_google_credentials():
+    """
+    Ключи сервисного аккаунта. Читаются лениво — при первом обращении к Google,
+    а не при импорте модуля.
+    """
+    # 1. Пробуем получить ключи из переменной окружения (для сервера Koyeb)
+    json_config = os.getenv("GOOGLE_CREDS_JSON")
+
+    if json_config:
+        print("✅ (Koyeb) Найдены ключи в переменной окружения")
+        # Превращаем текст из переменной обратно в словарь
+        creds_dict = json.loads(json_config)
+        # Создаем объект доступов из словаря
+        return Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
 
-if json_config:
-    print("✅ (Koyeb) Найдены ключи в переменной окружения")
-    # Превращаем текст из переменной обратно в словарь
-    creds_dict = json.loads(json_config)
-    # Создаем объект доступов из словаря
-    creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-else:
     # 2. Если переменной нет, ищем файл на диске (для локального запуска)
-    CREDENTIALS_FILE = os.path.join(PROJECT_ROOT, "credentials", "hickmet-premium-bot-601501356d30.json")
     print(f"📍 (Local) Ищем файл ключей: {CREDENTIALS_FILE}")
-
     if os.path.exists(CREDENTIALS_FILE):
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPES)
-    else:
-        # Если нет ни переменной, ни файла — останавливаем программу, чтобы не мучиться
-        raise FileNotFoundError("❌ ОШИБКА: Не найдены ключи Google! Добавьте файл локально или переменную GOOGLE_CREDS_JSON на сервер.")
+        return Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPES)
+
+    raise FileNotFoundError("❌ ОШИБКА: Не найдены ключи Google! Добавьте файл локально или переменную GOOGLE_CREDS_JSON на сервер.")
 
-# Авторизуемся в gspread прямо здесь
-gc = gspread.authorize(creds)
 
 FONTS_DIR = os.path.join(PROJECT_ROOT, "assets", "fonts", "Montserrat", "static")
 TTF_REGULAR = os.path.join(FONTS_DIR, "Montserrat-Regular.ttf")
@@ -60,7 +143,10 @@ print(f"🖋 REGULAR exists: {os.path.exists(TTF_REGULAR)}   → {TTF_REGULAR}")
 # Инициализация бота
 # (Совет: Токен бота тоже лучше брать из переменных, но пока оставим так)
 bot = Bot(token=API_TOKEN)
-dp = Dispatcher()
+
+dp = Dispatcher(storage=make_fsm_storage(
+    FSM_STORAGE, path=FSM_STATE_FILE, redis_url=FSM_REDIS_URL, ttl=FSM_TTL, max_keys=FSM_MAX_KEYS,
+))
 
 # --- Исключения ---
 EXCLUDE_SHEETS = [
@@ -137,10 +223,9 @@ NEXT_PACKAGE_HINT = re.compile(
 
 
 # === PREVIEW / EDIT STATE ===
-from typing import Dict
-
-PREVIEW_CACHE: Dict[str, dict] = {}  # cache_id -> {"voucher":..., "pkg_title":..., "page2_png":...}
-EDIT_STATE: Dict[int, dict] = {}     # user_id -> {"cache_id":..., "field":...}
+# ограничены по размеру и времени жизни — иначе растут, пока бот не перезапустят
+PREVIEW_CACHE = TTLMap(PREVIEW_CACHE_TTL, PREVIEW_CACHE_MAX)  # cache_id -> {"voucher":..., "pkg_title":..., "page2_png":...}
+EDIT_STATE = TTLMap(PREVIEW_CACHE_TTL, PREVIEW_CACHE_MAX)     # user_id -> {"cache_id":..., "field":...}
 
 
 # === 2. ОТРИСОВКА СТР.1 =========================================
@@ -1,18 +1,40 @@
+import asyncio
 import gspread
-from google.oauth2.service_account import Credentials
+import json
 import os
 import re
+import threading
+import time
 from datetime import datetime
 
-from .constants import SCOPES, CREDENTIALS_FILE, SHEET_ID
+from .constants import (
+    SHEET_ID,
+    SHEETS_HTTP_TIMEOUT,
+    PALM_SHEETS_FILE,
+    SHEETS_DISCOVERY_INTERVAL,
+    SPREADSHEET_META_TTL,
+    load_google_credentials,
+)
+
+from pligrim_bot.core.sheets_quota import QuotaHTTPClient, SheetsBusyError
 
 print("🔄 Инициализация Google Sheets...")
 
 # Глобальные переменные
+# ВАЖНО: ALL_SHEETS / PALM_SHEETS импортируют другие модули, поэтому словари
+# только обновляем на месте (clear/update), а не переприсваиваем.
 _client = None
+client = None
 ALL_SHEETS = {}
 PALM_SHEETS = {}
 
+# Кэш метаданных: spreadsheet_id -> {"ss": Spreadsheet, "worksheets": list | None, "fetched_at": float}
+# Чтобы навигация месяц → лист → пакет не дёргала open_by_key/worksheets() на каждую кнопку.
+_SPREADSHEETS = {}
+_SS_LOCK = threading.Lock()
+# spreadsheet_id -> замок скачивания метаданных: при промахе в Google идёт один поток, остальные ждут его
+_FETCH_LOCKS = {}
+
 # В ЭТОМ ПРОТОТИПЕ ВСЕГДА ИСПОЛЬЗУЕМ ТЕСТОВЫЕ ТАБЛИЦЫ
 USE_TEST_SHEETS = True
 
@@ -30,11 +52,11 @@ def get_google_client():
         return _client
 
     try:
-        if not os.path.exists(CREDENTIALS_FILE):
-            raise FileNotFoundError(f"Credentials file not found: {CREDENTIALS_FILE}")
-
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPES)
-        _client = gspread.authorize(creds)
+        creds = load_google_credentials()
+        # каждый запрос к Sheets — через квоту и повторы при 429/5xx
+        _client = gspread.authorize(creds, http_client=QuotaHTTPClient)
+        # без таймаута зависший запрос навсегда занимает поток из пула sheets_gateway
+        _client.set_timeout(SHEETS_HTTP_TIMEOUT)
         print("✅ Google Sheets клиент инициализирован")
         return _client
     except Exception as e:
@@ -42,8 +64,18 @@ def get_google_client():
         return None
 
 
-# Создаем глобальный клиент
-client = get_google_client()
+def use_google_client(new_client, palm_sheets: dict | None = None) -> None:
+    """
+    Подменяет клиент Google Sheets (фейковый бэкенд в bench/, другой сервисный аккаунт).
+    palm_sheets — заодно карта месяц → таблица; без неё остаётся текущая.
+    """
+    global _client, client
+    _client = client = new_client
+    clear_spreadsheet_cache()
+    if palm_sheets is not None:
+        _apply_sheets(dict(palm_sheets), {})
+        PALM_SHEETS.clear()
+        PALM_SHEETS.update(palm_sheets)
 
 
 def get_all_accessible_sheets():
@@ -102,43 +134,210 @@ def detect_pilgrim_months(sheets):
     return pilgrim_sheets
 
 
+def _apply_sheets(all_sheets: dict, auto_palm: dict) -> None:
+    """Обновляет ALL_SHEETS / PALM_SHEETS на месте (учитывая режим теста)."""
+    ALL_SHEETS.clear()
+    ALL_SHEETS.update(all_sheets)
+
+    PALM_SHEETS.clear()
+    if USE_TEST_SHEETS and TEST_PALM_SHEETS:
+        PALM_SHEETS.update(TEST_PALM_SHEETS)
+    else:
+        PALM_SHEETS.update(auto_palm)
+
+
+def load_saved_sheets() -> bool:
+    """
+    Поднимает карту месяц → таблица, сохранённую прошлым запуском.
+    Тёплый рестарт обходится без единого запроса в Google.
+    """
+    try:
+        with open(PALM_SHEETS_FILE, encoding="utf-8") as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"⚠️ Не смогли прочитать {PALM_SHEETS_FILE}: {e}")
+        return False
+
+    _apply_sheets(saved.get("all_sheets") or {}, saved.get("palm_sheets") or {})
+    print(f"💾 Карта таблиц из файла ({saved.get('saved_at')}): {len(PALM_SHEETS)} таблиц паломников")
+    return True
+
+
+def save_sheets(all_sheets: dict, auto_palm: dict) -> None:
+    """Атомарно сохраняет найденную карту таблиц на диск."""
+    try:
+        os.makedirs(os.path.dirname(PALM_SHEETS_FILE), exist_ok=True)
+        tmp_path = f"{PALM_SHEETS_FILE}.{os.getpid()}.tmp"  # свой tmp у каждого воркера
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "saved_at": datetime.now().isoformat(timespec="seconds"),
+                    "all_sheets": all_sheets,
+                    "palm_sheets": auto_palm,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        os.replace(tmp_path, PALM_SHEETS_FILE)
+    except Exception as e:
+        print(f"⚠️ Не смогли сохранить {PALM_SHEETS_FILE}: {e}")
+
+
 # ====== ИНИЦИАЛИЗАЦИЯ ПРИ ИМПОРТЕ МОДУЛЯ ======
+# Только локальный файл — никаких сетевых вызовов. Сами таблицы ищет
+# discover_sheets_in_background() уже после старта polling.
 
-print("🔄 Получаем доступные таблицы...")
-ALL_SHEETS = get_all_accessible_sheets()
-AUTO_PALM_SHEETS = detect_pilgrim_months(ALL_SHEETS)
+if not load_saved_sheets():
+    _apply_sheets({}, {})
 
 if USE_TEST_SHEETS and TEST_PALM_SHEETS:
-    PALM_SHEETS = TEST_PALM_SHEETS
     print(f"🎯 РЕЖИМ ТЕСТА: используем TEST_PALM_SHEETS ({len(PALM_SHEETS)} таблиц)")
-else:
-    PALM_SHEETS = AUTO_PALM_SHEETS
-    print(f"🎯 Итог: найдено {len(PALM_SHEETS)} таблиц паломников")
 
 
-def refresh_sheets():
-    """Обновляет список таблиц (в прототипе — всё равно остаёмся на тестовых)"""
-    global ALL_SHEETS, PALM_SHEETS, client
-    ALL_SHEETS = get_all_accessible_sheets()
-    auto = detect_pilgrim_months(ALL_SHEETS)
+def refresh_sheets() -> bool:
+    """
+    Заново ищет таблицы (в прототипе — всё равно остаёмся на тестовых).
+    Если Google ничего не вернул (ошибка/таймаут), оставляем прежнюю карту.
+    Заодно сбрасывает кэш метаданных таблиц — новые листы появятся в меню сразу.
+    """
+    clear_spreadsheet_cache()
+    all_sheets = get_all_accessible_sheets()
+    if not all_sheets:
+        print("⚠️ Обновление таблиц не удалось, оставляем прежнюю карту")
+        return False
+
+    auto = detect_pilgrim_months(all_sheets)
+    _apply_sheets(all_sheets, auto)
+    save_sheets(all_sheets, auto)
 
     if USE_TEST_SHEETS and TEST_PALM_SHEETS:
-        PALM_SHEETS = TEST_PALM_SHEETS
         print(f"🔄 Обновлено! РЕЖИМ ТЕСТА: используем TEST_PALM_SHEETS ({len(PALM_SHEETS)} таблиц)")
     else:
-        PALM_SHEETS = auto
         print(f"🔄 Обновлено! Доступно таблиц паломников: {len(PALM_SHEETS)}")
+    return True
 
 
-def get_worksheet(month_key: str, sheet_name: str):
-    """Получает конкретный лист из таблицы по месяцу и названию листа"""
-    global client
-    if not client:
-        client = get_google_client()
+async def discover_sheets_in_background(interval: float = SHEETS_DISCOVERY_INTERVAL) -> None:
+    """
+    Фоновая задача: ищет таблицы, пока бот уже принимает апдейты.
+    При ошибке повторяет с нарастающей паузой, дальше обновляет раз в interval секунд.
+    """
+    # импорт здесь: sheets_gateway лежит в core, а core сам импортирует settings
+    from pligrim_bot.core.sheets_gateway import run_sheets
+    from pligrim_bot.core.sheets_quota import PRI_BACKGROUND
 
-    if not client:
-        return None
+    retry_delay = 5.0
+    while True:
+        try:
+            ok = await run_sheets(refresh_sheets, timeout=120, priority=PRI_BACKGROUND)
+        except Exception as e:
+            print(f"❌ Фоновый поиск таблиц: {e}")
+            ok = False
+
+        if ok:
+            retry_delay = 5.0
+            await asyncio.sleep(interval)
+        else:
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, interval)
+
+
+async def follow_saved_sheets(interval: float = 60.0) -> None:
+    """
+    Для воркеров, которые сами таблицы не ищут: перечитывает карту из PALM_SHEETS_FILE,
+    когда её переписал процесс, ведущий поиск. Запросов в Google не делает.
+    """
+    def mtime():
+        try:
+            return os.path.getmtime(PALM_SHEETS_FILE)
+        except OSError:
+            return None
+
+    seen = mtime()      # то, что есть сейчас, уже поднято при импорте
+    while True:
+        await asyncio.sleep(interval)
+        current = mtime()
+        if current is not None and current != seen and load_saved_sheets():
+            seen = current
+            clear_spreadsheet_cache()
+
+
+def _ss_entry(spreadsheet_id: str, ttl: float):
+    with _SS_LOCK:
+        entry = _SPREADSHEETS.get(spreadsheet_id)
+    if entry and time.monotonic() - entry["fetched_at"] < ttl:
+        return entry
+    return None
+
+
+def _fetch_lock(spreadsheet_id: str) -> threading.Lock:
+    with _SS_LOCK:
+        lock = _FETCH_LOCKS.get(spreadsheet_id)
+        if lock is None:
+            lock = _FETCH_LOCKS[spreadsheet_id] = threading.Lock()
+        return lock
+
+
+def open_spreadsheet(spreadsheet_id: str, *, ttl: float = SPREADSHEET_META_TTL):
+    """client.open_by_key() с кэшем на ttl секунд. Кидает исключение gspread при ошибке."""
+    entry = _ss_entry(spreadsheet_id, ttl)
+    if entry:
+        return entry["ss"]
+
+    with _fetch_lock(spreadsheet_id):
+        # пока ждали замок, таблицу мог открыть соседний поток
+        entry = _ss_entry(spreadsheet_id, ttl)
+        if entry:
+            return entry["ss"]
+
+        global client
+        if not client:
+            client = get_google_client()
+        if not client:
+            raise RuntimeError("Google Sheets клиент не инициализирован")
+
+        ss = client.open_by_key(spreadsheet_id)
+        with _SS_LOCK:
+            _SPREADSHEETS[spreadsheet_id] = {"ss": ss, "worksheets": None, "fetched_at": time.monotonic()}
+        return ss
+
+
+def list_worksheets(spreadsheet_id: str, *, ttl: float = SPREADSHEET_META_TTL) -> list:
+    """ss.worksheets() с кэшем на ttl секунд (вместе с самим Spreadsheet)."""
+    ss = open_spreadsheet(spreadsheet_id, ttl=ttl)
+    with _SS_LOCK:
+        entry = _SPREADSHEETS.get(spreadsheet_id)
+        if entry and entry["worksheets"] is not None:
+            return entry["worksheets"]
+
+    with _fetch_lock(spreadsheet_id):
+        with _SS_LOCK:
+            entry = _SPREADSHEETS.get(spreadsheet_id)
+            if entry and entry["ss"] is ss and entry["worksheets"] is not None:
+                return entry["worksheets"]
+
+        worksheets = ss.worksheets()
+        with _SS_LOCK:
+            entry = _SPREADSHEETS.get(spreadsheet_id)
+            if entry and entry["ss"] is ss:
+                entry["worksheets"] = worksheets
+        return worksheets
+
+
+def clear_spreadsheet_cache(spreadsheet_id: str | None = None) -> None:
+    """Ручной сброс кэша метаданных: одной таблицы или всех."""
+    with _SS_LOCK:
+        if spreadsheet_id is None:
+            _SPREADSHEETS.clear()
+        else:
+            _SPREADSHEETS.pop(spreadsheet_id, None)
 
+
+def get_worksheet(month_key: str, sheet_name: str):
+    """Получает конкретный лист из таблицы по месяцу и названию листа"""
     try:
         if month_key not in PALM_SHEETS:
             print(f"❌ Таблица для месяца {month_key} не найдена")
@@ -146,24 +345,33 @@ def get_worksheet(month_key: str, sheet_name: str):
             return None
 
         spreadsheet_id = PALM_SHEETS[month_key]
-        spreadsheet = client.open_by_key(spreadsheet_id)
+        worksheets = list_worksheets(spreadsheet_id)
 
         # Пробуем найти лист
-        try:
-            worksheet = spreadsheet.worksheet(sheet_name)
-            print(f"✅ Лист найден: {sheet_name} в {month_key}")
-            return worksheet
-        except Exception as e:
-            print(f"❌ Лист {sheet_name} не найден в {month_key}: {e}")
+        for ws in worksheets:
+            if ws.title == sheet_name:
+                return ws
 
-            # Покажем доступные листы
-            worksheets = spreadsheet.worksheets()
-            print(f"📋 Доступные листы в {month_key}:")
-            for ws in worksheets:
-                print(f"   📄 {ws.title}")
+        # В кэше листа нет — возможно, его только что добавили: перечитываем один раз
+        clear_spreadsheet_cache(spreadsheet_id)
+        worksheets = list_worksheets(spreadsheet_id)
+        for ws in worksheets:
+            if ws.title == sheet_name:
+                print(f"✅ Лист найден: {sheet_name} в {month_key}")
+                return ws
 
-            return None
+        print(f"❌ Лист {sheet_name} не найден в {month_key}")
+
+        # Покажем доступные листы
+        print(f"📋 Доступные листы в {month_key}:")
+        for ws in worksheets:
+            print(f"   📄 {ws.title}")
+
+        return None
 
+    except SheetsBusyError:
+        # квота Google — не «листа нет»: пусть хендлер покажет «Google занят»
+        raise
     except Exception as e:
         print(f"❌ Ошибка получения листа {sheet_name} из {month_key}: {e}")
         return None
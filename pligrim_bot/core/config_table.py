@@ -0,0 +1,196 @@
+# pligrim_bot/core/config_table.py
+# Таблица конфигов отелей листа: строки «город / отель / даты» (внизу листа) разбираются
+# один раз на снимок листа и раскладываются по словарям: дата заезда dd/mm + город,
+# город, ключевое слово отеля. find_config_block* дальше ищут по ним (dict + bisect),
+# а не гоняют extract_city_line_simple по нижним 40 строкам на каждый пакет.
+#
+# Таблица живёт, пока жив снимок (тот же объект списка, что отдал sheet_cache):
+# write-through записи (update_row) в строки людей её не ломают, запись в строку
+# с городом или рост листа — выбрасывают, следующая выборка соберёт заново.
+
+import bisect
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from pligrim_bot.config.constants import SHEET_CACHE_MAX_SHEETS
+from pligrim_bot.core.metrics import timed
+from pligrim_bot.core.parsers.package_parser import (
+    CITY_ALIASES,
+    extract_city_line,
+    extract_city_line_simple,
+    norm_spaces,
+    row_has_any,
+)
+from pligrim_bot.core.utils.alias_matcher import any_substring_rx
+from pligrim_bot.data import sheet_cache
+
+
+# id(снимка) -> таблица (в ней же ссылка на снимок: id не переиспользуется, пока таблица жива)
+_TABLES: "OrderedDict[int, dict]" = OrderedDict()
+_LOCK = threading.Lock()
+
+_STATS = {"hits": 0, "builds": 0, "incremental": 0, "dropped": 0}
+
+# строка без алиаса города точно не конфиг — дорогие extract_* на ней не зовём
+_CITY_RX = any_substring_rx(CITY_ALIASES["madinah"] + CITY_ALIASES["makkah"])
+
+
+def _has_city(row) -> bool:
+    return _CITY_RX.search(" ".join(str(c) for c in row).lower()) is not None
+
+
+# ---------- построение ----------
+
+@timed("parse_seconds")
+def build_config_table(data: list[list[str]]) -> dict:
+    """
+    Один проход по листу:
+      lines   — строки-конфиги (город + две даты) сверху вниз:
+                {"row", "city", "hotel", "d1", "d2", "ddmm", "text"}
+      by_city — {город: [lines]}, by_ddmm — {(dd/mm заезда, город): [lines]}
+      near    — {row: {"madinah": (hotel, when), "makkah": (hotel, when)}} — extract_city_line
+                для всех строк с алиасом города (их смотрит find_config_block)
+    Поиск строк с алиасами пакета (kind_rows) и фильтр по отелю (hotel_lines) — лениво, с памятью.
+    """
+    lines: List[dict] = []
+    near: Dict[int, dict] = {}
+
+    for r, row in enumerate(data):
+        if not _has_city(row):
+            continue
+        near[r] = {"madinah": extract_city_line(row, "madinah"), "makkah": extract_city_line(row, "makkah")}
+
+        city, hotel, d1, d2 = extract_city_line_simple(row)
+        if not city or not d1 or not d2:
+            continue
+        lines.append({
+            "row": r,
+            "city": city,
+            "hotel": hotel or "—",
+            "d1": d1,
+            "d2": d2,
+            "ddmm": d1[:5],
+            "text": " ".join(norm_spaces(c) for c in row if norm_spaces(c)).lower(),
+        })
+
+    by_city: Dict[str, List[dict]] = {}
+    by_ddmm: Dict[Tuple[str, str], List[dict]] = {}
+    for line in lines:
+        by_city.setdefault(line["city"], []).append(line)
+        by_ddmm.setdefault((line["ddmm"], line["city"]), []).append(line)
+
+    return {
+        "height": len(data),
+        "lines": lines,
+        "by_city": by_city,
+        "by_ddmm": by_ddmm,
+        "near": near,
+        "kind_rows": {},
+        "hotel_lines": {},
+    }
+
+
+def get_config_table(data: list[list[str]]) -> dict:
+    """Таблица конфигов снимка листа: из памяти, если это тот же снимок той же высоты."""
+    with _LOCK:
+        table = _TABLES.get(id(data))
+        if table is not None and table["data"] is data and table["height"] == len(data):
+            _TABLES.move_to_end(id(data))
+            _STATS["hits"] += 1
+            return table
+
+    table = build_config_table(data)
+    table["data"] = data
+    with _LOCK:
+        _STATS["builds"] += 1
+        _TABLES[id(data)] = table
+        # по таблице на снимок: держим не больше, чем снимков в sheet_cache
+        while len(_TABLES) > SHEET_CACHE_MAX_SHEETS:
+            _TABLES.popitem(last=False)
+    return table
+
+
+# ---------- выборки ----------
+
+def _rows_from(lines: List[dict], r0: int) -> int:
+    return bisect.bisect_left(lines, r0, key=lambda line: line["row"])
+
+
+def _candidates(table: dict, city: str, ddmm: Optional[str]) -> List[dict]:
+    if ddmm:
+        return table["by_ddmm"].get((ddmm, city), [])
+    return table["by_city"].get(city, [])
+
+
+def first_line(table: dict, city: str, ddmm: Optional[str], r0: int) -> Optional[dict]:
+    """Первая строка-конфиг города не выше r0 (ddmm — только с этим днём заезда)."""
+    lines = _candidates(table, city, ddmm)
+    i = _rows_from(lines, r0)
+    return lines[i] if i < len(lines) else None
+
+
+def last_line_before(table: dict, city: str, ddmm: Optional[str], r0: int, r1: int) -> Optional[dict]:
+    """Последняя строка-конфиг города в [r0, r1)."""
+    lines = _candidates(table, city, ddmm)
+    i = _rows_from(lines, r1) - 1
+    return lines[i] if i >= 0 and lines[i]["row"] >= r0 else None
+
+
+def hotel_lines(table: dict, city: str, hotel_kw: Optional[str], r0: int) -> List[dict]:
+    """Строки-конфиги города не выше r0, в тексте которых есть hotel_kw (None — все)."""
+    lines = table["by_city"].get(city, [])
+    if hotel_kw:
+        memo = table["hotel_lines"]
+        key = (city, hotel_kw)
+        if key not in memo:
+            memo[key] = [line for line in lines if hotel_kw in line["text"]]
+        lines = memo[key]
+    return lines[_rows_from(lines, r0):]
+
+
+def kind_rows(table: dict, want_words: Tuple[str, ...], r0: int) -> List[int]:
+    """Строки не выше r0, где есть алиас пакета (row_has_any), — лист сканируется раз на набор алиасов."""
+    memo = table["kind_rows"]
+    rows = memo.get(want_words)
+    if rows is None:
+        rows = [r for r, row in enumerate(table["data"]) if row_has_any(row, want_words)]
+        memo[want_words] = rows
+    return rows[bisect.bisect_left(rows, r0):]
+
+
+def config_table_stats() -> dict:
+    with _LOCK:
+        return {**_STATS, "tables": len(_TABLES)}
+
+
+# ---------- write-through ----------
+
+def _on_row_update(key, values, row_idx: int, old_height: int) -> None:
+    """
+    update_row() записал строку в снимок. Строка людей конфиги не трогает — поправим
+    только память kind_rows; строка с городом или рост листа — таблицу выбрасываем.
+    """
+    with _LOCK:
+        table = _TABLES.get(id(values))
+        if table is None or table["data"] is not values:
+            return
+
+        row = values[row_idx]
+        if len(values) != old_height or row_idx in table["near"] or _has_city(row):
+            del _TABLES[id(values)]
+            _STATS["dropped"] += 1
+            return
+
+        for words, rows in table["kind_rows"].items():
+            i = bisect.bisect_left(rows, row_idx)
+            present = i < len(rows) and rows[i] == row_idx
+            hit = row_has_any(row, words)
+            if hit and not present:
+                rows.insert(i, row_idx)
+            elif present and not hit:
+                rows.pop(i)
+        _STATS["incremental"] += 1
+
+
+sheet_cache.add_row_listener(_on_row_update)
@@ -3,9 +3,12 @@ import re
 from datetime import datetime, date
 from gspread import WorksheetNotFound
 
-from pligrim_bot.config.settings import PALM_SHEETS, get_google_client
+from pligrim_bot.config.settings import PALM_SHEETS, get_google_client, list_worksheets
+from pligrim_bot.core.sheets_quota import SheetsBusyError
+from pligrim_bot.core.utils.alias_matcher import AliasMatcher
 from pligrim_bot.core.utils.date_utils import norm_date_str
 from pligrim_bot.core.utils.text_utils import norm_title
+from pligrim_bot.data import sheet_cache
 
 DDMM_RE = re.compile(r'(\d{1,2})\.(\d{1,2})')
 
@@ -27,12 +30,12 @@ def get_palm_sheet_names(month_key: str, *, include_past: bool = False) -> list[
             print("❌ Google Sheets клиент не доступен")
             return []
 
-        ss = client.open_by_key(sheet_id)
+        worksheets = list_worksheets(sheet_id)
         base_year = resolve_base_year(month_key, datetime.now().year)
         today = datetime.now().date()
 
         result = []
-        for ws in ss.worksheets():
+        for ws in worksheets:
             ddmm = parse_first_ddmm(ws.title)
             if ddmm is None:
                 # лист без даты — показываем (часто это инфо/шаблоны)
@@ -62,6 +65,9 @@ def get_palm_sheet_names(month_key: str, *, include_past: bool = False) -> list[
         result.sort(key=get_sort_key)
         return result
 
+    except SheetsBusyError:
+        # пустой список выглядел бы как «нет вылетов» — пусть менеджер увидит, что Google занят
+        raise
     except Exception as e:
         print(f"❌ Ошибка в get_palm_sheet_names: {e}")
         return []
@@ -73,8 +79,7 @@ def get_sheet_titles_by_id(spreadsheet_id: str) -> list[str]:
         if not client:
             return []
 
-        sheet = client.open_by_key(spreadsheet_id)
-        worksheet_titles = [ws.title for ws in sheet.worksheets()]
+        worksheet_titles = [ws.title for ws in list_worksheets(spreadsheet_id)]
         return worksheet_titles
     except Exception as e:
         print(f"❌ Ошибка получения листов для {spreadsheet_id}: {e}")
@@ -101,14 +106,16 @@ def find_worksheet_by_title(ss, wanted_title: str):
     """Ищет лист по названию, терпимо к пробелам/вариантам написания.
     Возвращает gspread.Worksheet или кидает WorksheetNotFound.
     """
+    # список листов берём один раз (и из кэша метаданных, если он есть)
+    candidates = list_worksheets(ss.id)
+
     # 1) точное совпадение
-    for ws in ss.worksheets():
+    for ws in candidates:
         if ws.title == wanted_title:
             return ws
 
     # 2) нормализованное совпадение
     want = norm_title(wanted_title)
-    candidates = ss.worksheets()
     for ws in candidates:
         if norm_title(ws.title) == want:
             return ws
@@ -118,7 +125,7 @@ def find_worksheet_by_title(ss, wanted_title: str):
     guess = difflib.get_close_matches(wanted_title, titles, n=1, cutoff=0.65)
     if guess:
         print(f"[WARN] Worksheet '{wanted_title}' not found, using close match '{guess[0]}'")
-        return ss.worksheet(guess[0])
+        return next(ws for ws in candidates if ws.title == guess[0])
 
     raise WorksheetNotFound(wanted_title)
 
@@ -138,27 +145,18 @@ def token_from_schedule(dep: str, ret: str,
     # "AMMA" у нас не используется для пакетов 7 дней
     return None
 
-def match_city_any(cell: str) -> str | None:
-    """Определяет город по тексту ячейки"""
-    s = (cell or "").lower()
-
-    # Мадина
-    if any(a in s for a in ("madinah", "medina", "madina", "медин", "медина")):
-        return "madinah"
+# порядок ключей — приоритет (Мадина, Мекка, Джедда, Аль-Ула)
+CITY_ANY_MATCHER = AliasMatcher({
+    "madinah": ("madinah", "medina", "madina", "медин", "медина"),
+    "makkah": ("makkah", "mecca", "мекка", "макка"),
+    "jeddah": ("jeddah", "jedda", "джедд", "джидд"),
+    "alula": ("alula", "al-ula", "аль-ула", "алула"),
+})
 
-    # Мекка
-    if any(a in s for a in ("makkah", "mecca", "мекка", "макка")):
-        return "makkah"
 
-    # Джедда
-    if any(a in s for a in ("jeddah", "jedda", "джедд", "джидд")):
-        return "jeddah"
-
-    # Аль-Ула
-    if any(a in s for a in ("alula", "al-ula", "аль-ула", "алула")):
-        return "alula"
-
-    return None
+def match_city_any(cell: str) -> str | None:
+    """Определяет город по тексту ячейки"""
+    return CITY_ANY_MATCHER.canon((cell or "").lower())
 
 def get_worksheet_data(worksheet, range_name: str = None):
     """Получает данные с листа"""
@@ -166,7 +164,7 @@ def get_worksheet_data(worksheet, range_name: str = None):
         if range_name:
             return worksheet.get(range_name)
         else:
-            return worksheet.get_all_values()
+            return sheet_cache.get_values(worksheet)
     except Exception as e:
         print(f"❌ Ошибка получения данных с листа {worksheet.title}: {e}")
         return []
@@ -174,7 +172,8 @@ def get_worksheet_data(worksheet, range_name: str = None):
 def find_column_index_by_header(worksheet, header_patterns: list, start_row: int = 1):
     """Находит индекс колонки по заголовку"""
     try:
-        headers = worksheet.row_values(start_row)
+        data = sheet_cache.get_values(worksheet)
+        headers = data[start_row - 1] if 0 < start_row <= len(data) else []
         for i, header in enumerate(headers):
             header_lower = header.lower()
             for pattern in header_patterns:
@@ -0,0 +1,332 @@
+# pligrim_bot/core/metrics.py
+# Метрики горячего пути: гистограммы времени и счётчики в памяти процесса,
+# отдаются в текстовом формате Prometheus на METRICS_HOST:METRICS_PORT/metrics.
+#
+#   * MetricsMiddleware — время каждого хэндлера aiogram (cb_palm_sheet, process_card, ...);
+#   * sheets_quota / sheets_gateway — каждый запрос к Sheets API, ожидание квоты и пула;
+#   * @timed("parse_seconds") — парсеры и поиск мест;
+#   * register_stats() — счётчики модулей (cache_stats, quota_stats, ...) как gauge.
+#
+# Без prometheus_client: формат простой, а зависимость ради одной страницы не нужна.
+# В webhook-режиме у каждого процесса-воркера свой порт: METRICS_PORT + 1 + номер воркера.
+
+import asyncio
+import bisect
+import functools
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+from pligrim_bot.config.constants import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+PREFIX = "pligrim_"
+
+# Границы корзин, сек: от быстрых парсеров до медленного Google
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+_LOCK = threading.Lock()
+_HISTOGRAMS: Dict[str, Dict[_Labels, "Histogram"]] = {}
+_COUNTERS: Dict[str, Dict[_Labels, float]] = {}
+_HELP: Dict[str, str] = {}
+# prefix -> fn() -> dict: счётчики модулей, читаются при каждом запросе /metrics
+_STATS_PROVIDERS: Dict[str, Callable[[], dict]] = {}
+
+_NAME_RX = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (как histogram в Prometheus)."""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)     # последняя — +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Оценка квантиля по корзинам (верхняя граница корзины, в которую он попал)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _labels(labels: dict) -> _Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name: str, help_text: str) -> None:
+    """Строка # HELP для метрики."""
+    _HELP[name] = help_text
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    """Одно наблюдение в гистограмму name{labels}."""
+    if not METRICS_ENABLED:
+        return
+    key = _labels(labels)
+    with _LOCK:
+        series = _HISTOGRAMS.setdefault(name, {})
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = Histogram()
+        hist.observe(seconds)
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """Счётчик name{labels} += value."""
+    if not METRICS_ENABLED:
+        return
+    key = _labels(labels)
+    with _LOCK:
+        series = _COUNTERS.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+
+class timer:
+    """with timer("sheets_api_seconds", op="values"): ... — время блока в гистограмму."""
+
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        status = "ok" if exc_type is None else "error"
+        observe(self.name, time.perf_counter() - self.started, status=status, **self.labels)
+
+
+def timed(name: str, **labels) -> Callable:
+    """Декоратор: время каждого вызова функции (и корутины) в гистограмму name{fn=...}."""
+
+    def wrap(fn: Callable) -> Callable:
+        fn_labels = {"fn": fn.__name__, **labels}
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer(name, **fn_labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **fn_labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return wrap
+
+
+def register_stats(prefix: str, provider: Callable[[], dict]) -> None:
+    """Счётчики модуля (cache_stats и т.п.) — числовые поля уйдут в /metrics как gauge prefix_<поле>."""
+    _STATS_PROVIDERS[prefix] = provider
+
+
+# ---------- aiogram ----------
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Время хэндлера от входа в middleware до ответа — в bot_handler_seconds{handler, event, status}.
+    Регистрируется как inner middleware на dp — действует и во вложенных роутерах.
+    """
+
+    def __init__(self, event: str):
+        self.event = event
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not METRICS_ENABLED:
+            return await handler(event, data)
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            observe("bot_handler_seconds", time.perf_counter() - started,
+                    handler=name, event=self.event, status=status)
+
+
+def install(dp) -> None:
+    """Подключает MetricsMiddleware к сообщениям и нажатиям кнопок."""
+    dp.message.middleware(MetricsMiddleware("message"))
+    dp.callback_query.middleware(MetricsMiddleware("callback_query"))
+
+
+# ---------- формат Prometheus ----------
+
+def _metric_name(*parts: str) -> str:
+    return PREFIX + _NAME_RX.sub("_", "_".join(p for p in parts if p))
+
+
+def _fmt_labels(labels: _Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _flatten(prefix: str, stats: dict, labels: _Labels = ()) -> Iterator[Tuple[str, _Labels, float]]:
+    """Числовые поля словаря; вложенные словари (например, вёдра квоты) — в метку name."""
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            yield _metric_name(prefix, key), labels, int(value)
+        elif isinstance(value, (int, float)):
+            yield _metric_name(prefix, key), labels, value
+        elif isinstance(value, dict) and all(isinstance(v, dict) for v in value.values()):
+            for sub_name, sub in value.items():
+                yield from _flatten(f"{prefix}_{key}", sub, labels + (("name", str(sub_name)),))
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus 0.0.4."""
+    lines: List[str] = []
+
+    with _LOCK:
+        histograms = {
+            name: {k: (h.bounds, list(h.counts), h.total, h.count) for k, h in series.items()}
+            for name, series in _HISTOGRAMS.items()
+        }
+        counters = {name: dict(series) for name, series in _COUNTERS.items()}
+
+    for name, series in sorted(histograms.items()):
+        full = _metric_name(name)
+        if name in _HELP:
+            lines.append(f"# HELP {full} {_HELP[name]}")
+        lines.append(f"# TYPE {full} histogram")
+        for labels, (bounds, counts, total, count) in sorted(series.items()):
+            seen = 0
+            for bound, n in zip(bounds + (float("inf"),), counts):
+                seen += n
+                lines.append(f"{full}_bucket{_fmt_labels(labels, (('le', _fmt_value(bound)),))} {seen}")
+            lines.append(f"{full}_sum{_fmt_labels(labels)} {total!r}")
+            lines.append(f"{full}_count{_fmt_labels(labels)} {count}")
+
+    for name, series in sorted(counters.items()):
+        full = _metric_name(name)
+        if name in _HELP:
+            lines.append(f"# HELP {full} {_HELP[name]}")
+        lines.append(f"# TYPE {full} counter")
+        for labels, value in sorted(series.items()):
+            lines.append(f"{full}{_fmt_labels(labels)} {_fmt_value(value)}")
+
+    gauges: Dict[str, List[Tuple[_Labels, float]]] = {}
+    for prefix, provider in list(_STATS_PROVIDERS.items()):
+        try:
+            stats = provider()
+        except Exception as e:
+            print(f"⚠️ Метрики {prefix}: {e}")
+            continue
+        for full, labels, value in _flatten(prefix, stats):
+            gauges.setdefault(full, []).append((labels, value))
+    for full, series in sorted(gauges.items()):
+        lines.append(f"# TYPE {full} gauge")
+        for labels, value in series:
+            lines.append(f"{full}{_fmt_labels(labels)} {_fmt_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def summary(name: str = "bot_handler_seconds", label: str = "handler") -> Dict[str, dict]:
+    """p50/p95/p99 (по корзинам) и число вызовов для каждого значения метки — для логов."""
+    out: Dict[str, dict] = {}
+    with _LOCK:
+        merged: Dict[str, Histogram] = {}
+        for labels, hist in _HISTOGRAMS.get(name, {}).items():
+            key = dict(labels).get(label, "")
+            acc = merged.setdefault(key, Histogram(hist.bounds))
+            acc.counts = [a + b for a, b in zip(acc.counts, hist.counts)]
+            acc.total += hist.total
+            acc.count += hist.count
+    for key, hist in merged.items():
+        out[key] = {
+            "count": hist.count,
+            "avg": hist.total / hist.count if hist.count else None,
+            "p50": hist.quantile(0.50),
+            "p95": hist.quantile(0.95),
+            "p99": hist.quantile(0.99),
+        }
+    return out
+
+
+def reset() -> None:
+    """Обнулить гистограммы и счётчики (замеры в bench/)."""
+    with _LOCK:
+        _HISTOGRAMS.clear()
+        _COUNTERS.clear()
+
+
+async def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> web.AppRunner | None:
+    """Поднимает GET /metrics на host:port; None — метрики выключены (METRICS_PORT=0)."""
+    if not METRICS_ENABLED or port <= 0:
+        return None
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Prometheus-Format": "0.0.4"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"⚠️ Метрики: не удалось занять {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    print(f"📈 Метрики: http://{host}:{port}/metrics")
+    return runner
+
+
+describe("bot_handler_seconds", "Время обработки апдейта хэндлером aiogram")
+describe("sheets_api_seconds", "Время одного HTTP-запроса к Sheets/Drive API")
+describe("sheets_quota_wait_seconds", "Ожидание токена квоты перед запросом к Sheets")
+describe("sheets_gateway_seconds", "Очередь к пулу потоков (stage=queue) и выполнение (stage=run) в run_sheets")
+describe("parse_seconds", "Время парсеров и поиска мест")
+describe("sheets_busy_total", "Сколько раз менеджер увидел «Google перегружен»")
+describe("webhook_updates_total", "Апдейты, принятые webhook-фронтом (status=queue_full — отказ 503)")
@@ -0,0 +1,283 @@
+# pligrim_bot/core/package_index.py
+# Индекс пакетов листа: шапки, границы, тип и строка заголовка таблицы.
+# Строится один раз по снимку листа, хранится на диске и пересобирается
+# только когда меняется хэш содержимого листа.
+
+import bisect
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from pligrim_bot.config.constants import PACKAGE_INDEX_FILE
+from pligrim_bot.core.parsers.package_parser import scan_palm_packages, kind_from_title, normtxt
+from pligrim_bot.data import sheet_cache
+
+
+# (spreadsheet_id, ws_title) -> индекс (см. _build_index)
+_INDEX: Dict[Tuple[str, str], dict] = {}
+_LOCK = threading.Lock()
+_LOADED = False
+
+_STATS = {"hits": 0, "rebuilds": 0, "hash_reuses": 0, "incremental": 0}
+
+# сколько строк над изменённой может «увидеть» её как заголовок таблицы (см. scan_palm_packages)
+_HEADER_LOOKAHEAD = 5
+
+
+# ---------- хэш содержимого ----------
+
+def _row_digest(r: int, row: List[str]) -> int:
+    raw = f"{r}\x1e" + "\x1f".join(str(c) for c in row)
+    return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _fingerprint(values: List[List[str]]) -> Tuple[List[int], int]:
+    """Хэш по строкам + общий XOR: одну строку можно перехэшировать за O(1)."""
+    digests = [_row_digest(r, row) for r, row in enumerate(values)]
+    total = len(values)
+    for d in digests:
+        total ^= d
+    return digests, total
+
+
+def _hex(total: int) -> str:
+    return f"{total:016x}"
+
+
+# ---------- построение ----------
+
+def _build_index(values: List[List[str]], content_hash: str) -> dict:
+    found = scan_palm_packages(values)
+    H = len(values)
+
+    packages = []
+    for i, p in enumerate(found):
+        end = found[i + 1]["row"] if i + 1 < len(found) else H
+        packages.append({
+            "title": p["title"],
+            "row": p["row"],
+            "col": p["col"],
+            "start": p["row"],
+            "end": end,
+            "kind": kind_from_title(p["title"]),
+            "header_row": p["header_row"],
+        })
+    return _with_lookups({"hash": content_hash, "height": H, "packages": packages})
+
+
+def _with_lookups(index: dict) -> dict:
+    """Добавляет производные поля, которые не пишем на диск."""
+    index["by_row"] = {p["row"]: p for p in index["packages"]}
+    index["rows"] = [p["row"] for p in index["packages"]]
+    return index
+
+
+# ---------- диск ----------
+
+def _disk_key(key: Tuple[str, str]) -> str:
+    return f"{key[0]}|{key[1]}"
+
+
+def _load_from_disk() -> None:
+    global _LOADED
+    if _LOADED:
+        return
+    _LOADED = True
+    try:
+        with open(PACKAGE_INDEX_FILE, encoding="utf-8") as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"⚠️ Не смогли прочитать {PACKAGE_INDEX_FILE}: {e}")
+        return
+
+    for disk_key, index in saved.items():
+        sid, _, title = disk_key.partition("|")
+        _INDEX[(sid, title)] = _with_lookups(index)
+
+
+def _save_to_disk() -> None:
+    payload = {
+        _disk_key(key): {"hash": ix["hash"], "height": ix["height"], "packages": ix["packages"]}
+        for key, ix in _INDEX.items()
+    }
+    try:
+        os.makedirs(os.path.dirname(PACKAGE_INDEX_FILE), exist_ok=True)
+        tmp_path = f"{PACKAGE_INDEX_FILE}.{os.getpid()}.tmp"  # свой tmp у каждого воркера
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, PACKAGE_INDEX_FILE)
+    except Exception as e:
+        print(f"⚠️ Не смогли сохранить {PACKAGE_INDEX_FILE}: {e}")
+
+
+# ---------- API ----------
+
+def get_package_index(ws) -> dict:
+    """
+    Индекс пакетов листа:
+      {"hash", "height", "packages": [{title,row,col,start,end,kind,header_row}],
+       "by_row": {row: package}, "rows": [row, ...]}
+    Лист целиком сканируется только если изменился хэш его содержимого.
+    """
+    key = sheet_cache.ws_key(ws)
+    values = sheet_cache.get_values(ws)
+
+    with _LOCK:
+        _load_from_disk()
+        index = _INDEX.get(key)
+        # тот же объект снимка, что и при прошлом вызове: правки пришли через update_row
+        if index is not None and index.get("_values") is values:
+            _STATS["hits"] += 1
+            return index
+
+    digests, total = _fingerprint(values)
+    content_hash = _hex(total)
+
+    with _LOCK:
+        index = _INDEX.get(key)
+        if index is not None and index["hash"] == content_hash:
+            _STATS["hash_reuses"] += 1
+        else:
+            _STATS["rebuilds"] += 1
+            print(f"🗂 Индекс пакетов: пересобираем «{key[1]}»")
+            index = _build_index(values, content_hash)
+            _INDEX[key] = index
+            _save_to_disk()
+
+        index["_values"] = values
+        index["_digests"] = digests
+        index["_total"] = total
+        return index
+
+
+def get_package(ws, pkg_row: int) -> Optional[dict]:
+    """Пакет по строке его шапки — O(1)."""
+    return get_package_index(ws)["by_row"].get(pkg_row)
+
+
+def next_package_row(index: dict, pkg_row: int) -> int:
+    """Строка следующей шапки после pkg_row (или высота листа) — конец пакета."""
+    rows = index["rows"]
+    i = bisect.bisect_right(rows, pkg_row)
+    return rows[i] if i < len(rows) else index["height"]
+
+
+def peek_package_index(ws) -> Optional[dict]:
+    """Индекс из памяти / с диска БЕЗ сверки с листом (может быть устаревшим)."""
+    key = sheet_cache.ws_key(ws)
+    with _LOCK:
+        _load_from_disk()
+        return _INDEX.get(key)
+
+
+def _cell(data, r: int, c: int) -> str:
+    if r >= len(data):
+        return ""
+    row = data[r]
+    return normtxt(str(row[c])) if c < len(row) else ""
+
+
+def _read_span(index: dict, pkg: dict) -> Tuple[int, int]:
+    """Диапазон для чтения: пакет + строка следующей шапки (по ней проверяем, что строки не съехали)."""
+    end = pkg["end"]
+    return (pkg["start"], end + 1) if end < index["height"] else (pkg["start"], end)
+
+
+def _block_matches(data, pkg: dict, index: dict) -> bool:
+    if _cell(data, pkg["start"], pkg["col"]) != pkg["title"]:
+        return False
+    nxt = index["by_row"].get(pkg["end"])
+    return nxt is None or _cell(data, nxt["row"], nxt["col"]) == nxt["title"]
+
+
+def package_blocks(ws, pkg_rows: List[int], *, fresh: bool = False) -> Dict[int, Tuple[int, int, object]]:
+    """
+    Данные нескольких пакетов листа: {pkg_row: (r0, r1, data)}, data[r][c] — абсолютные индексы.
+    Если полного снимка в кэше нет, читаем только диапазоны пакетов по границам
+    из индекса — все одним values:batchGet. Если границы устарели (строки вставили/удалили),
+    откатываемся на полный снимок и пересобираем индекс.
+    fresh=True — мимо кэша, прямо из Google (для проверки перед записью).
+    """
+    pkg_rows = list(dict.fromkeys(pkg_rows))
+    ttl = 0 if fresh else None
+
+    if fresh or sheet_cache.peek(ws) is None:
+        index = peek_package_index(ws)
+        if index is not None and all(r in index["by_row"] for r in pkg_rows):
+            spans = {r: _read_span(index, index["by_row"][r]) for r in pkg_rows}
+            blocks = sheet_cache.get_blocks(ws, list(spans.values()), ttl=ttl)
+
+            result = {}
+            for r, span in spans.items():
+                pkg = index["by_row"][r]
+                if not _block_matches(blocks[span], pkg, index):
+                    break
+                result[r] = (pkg["start"], pkg["end"], blocks[span])
+            else:
+                return result
+
+            print(f"🗂 Границы пакетов на «{ws.title}» устарели — читаем лист целиком")
+            sheet_cache.invalidate(ws)
+
+    values = sheet_cache.get_values(ws, ttl=ttl)
+    index = get_package_index(ws)
+    return {r: (r, next_package_row(index, r), values) for r in pkg_rows}
+
+
+def index_stats() -> dict:
+    with _LOCK:
+        return {**_STATS, "sheets": len(_INDEX)}
+
+
+def forget_index(ws=None) -> None:
+    """Забыть индекс листа (или все) в памяти — следующий get_package_index() соберёт его заново."""
+    with _LOCK:
+        _load_from_disk()       # чтобы файл не поднял забытое обратно
+        if ws is None:
+            _INDEX.clear()
+        else:
+            _INDEX.pop(sheet_cache.ws_key(ws), None)
+
+
+def _on_row_update(key, values, row_idx: int, old_height: int) -> None:
+    """
+    Инкрементальное обновление после write-through записи одной строки:
+    перехэшируем строку и пересканируем только окно, где могла поменяться шапка.
+    """
+    with _LOCK:
+        index = _INDEX.get(key)
+        if index is None or index.get("_values") is not values:
+            return
+
+        if len(values) != old_height:
+            # лист вырос — дешевле пересобрать при следующем обращении
+            index.pop("_values", None)
+            return
+
+        digests = index["_digests"]
+        total = index["_total"] ^ digests[row_idx]
+        digests[row_idx] = _row_digest(row_idx, values[row_idx])
+        index["_total"] = total ^ digests[row_idx]
+
+        lo = max(0, row_idx - _HEADER_LOOKAHEAD)
+        hi = min(len(values), row_idx + _HEADER_LOOKAHEAD + 1)
+        window = scan_palm_packages(values[lo:hi])
+        seen = {(p["row"] + lo, p["title"], p["header_row"] + lo)
+                for p in window if lo + p["row"] <= row_idx}
+        before = {(p["row"], p["title"], p["header_row"])
+                  for p in index["packages"] if lo <= p["row"] <= row_idx}
+
+        if seen != before:
+            # шапка пакета появилась/пропала — пересоберём при следующем обращении
+            index.pop("_values", None)
+            return
+
+        index["hash"] = _hex(index["_total"])
+        _STATS["incremental"] += 1
+
+
+sheet_cache.add_row_listener(_on_row_update)
@@ -3,6 +3,9 @@
 import re
 from typing import Optional, Dict, List
 
+from pligrim_bot.core.metrics import timed
+from pligrim_bot.core.utils.alias_matcher import AliasMatcher
+
 
 # --- Вспомогательные регулярки ---
 
@@ -13,19 +16,26 @@ WHATSAPP_PREFIX = re.compile(
     flags=re.MULTILINE
 )
 
+_SPACES = re.compile(r"[ \t]+")
+_SPACES_ANY = re.compile(r"\s+")
+_AMOUNT = re.compile(r"(\d+[.,]?\d*)")
+_AMOUNT_USD = re.compile(r"([\d\s]+[.,]?\d*)\s*\$")
+_CARD_START = re.compile(r"(?=ФИО\s*:)")
+
 
 def clean_text(text: str) -> str:
     """Нормализуем текст, убираем WhatsApp-шапку и лишние пробелы."""
     text = WHATSAPP_PREFIX.sub("", text or "")
     text = text.replace("\u202a", "").replace("\u202c", "")
-    text = re.sub(r"[ \t]+", " ", text)
+    text = _SPACES.sub(" ", text)
     return text.strip()
 
 
+@timed("parse_seconds")
 def split_cards(text: str) -> List[str]:
     """Разрезает большой текст на несколько карточек по «ФИО:»."""
     t = clean_text(text)
-    parts = re.split(r"(?=ФИО\s*:)", t)
+    parts = _CARD_START.split(t)
     return [p.strip() for p in parts if "ФИО" in p]
 
 
@@ -40,25 +50,26 @@ def normalize_amount(raw: Optional[str]) -> Optional[str]:
     """Извлекает число из вида '1600$', '192 $/520.7 = 100 000 тг' → '1600' / '192.0'."""
     if not raw:
         return None
-    m = re.search(r"([\d\s]+[.,]?\d*)\s*\$", raw)
+    m = _AMOUNT_USD.search(raw)
     if not m:
         return None
     return m.group(1).replace(" ", "").replace(",", ".")
 
 
+# код комнаты для карточки: порядок ключей — приоритет
+ROOM_CODE_MATCHER = AliasMatcher({
+    "SNGL": ("SNGL", "SGL"),
+    "DBL": ("DBL",),
+    "TRPL": ("TRPL",),
+    "QDR": ("QDR", "QUAD"),
+})
+
+
 def normalize_room(text: Optional[str]) -> str:
     if not text:
         return ""
     t = text.upper()
-    if "SNGL" in t or "SGL" in t:
-        return "SNGL"
-    if "DBL" in t:
-        return "DBL"
-    if "TRPL" in t:
-        return "TRPL"
-    if "QDR" in t or "QUAD" in t:
-        return "QDR"
-    return t
+    return ROOM_CODE_MATCHER.canon(t, t)
 
 
 def normalize_meal(text: Optional[str]) -> str:
@@ -78,6 +89,67 @@ def normalize_meal(text: Optional[str]) -> str:
 
 # --- ПАРСИНГ ОДНОЙ КАРТОЧКИ ---
 
+# Поле -> ключ «Ключ: значение» (как в прежних find(r"Ключ\s*:\s*(.+)")).
+# Карточка проходится один раз по двоеточиям: для каждого двоеточия одна
+# регулярка (по перевёрнутому тексту, якорь у двоеточия) говорит, чей это ключ.
+# Для поля берётся первое вхождение, значение — остаток строки.
+_SINGLE_CARD_KEYS = [
+    ("fio", ["ФИО"]),
+    ("contract_date", ["Дата договора"]),
+    ("departure_date", ["Дата вылета", "Дата"]),
+    ("package_name", ["Пакет название"]),
+    ("paid_amount", ["Cумма оплаты", "Сумма оплаты"]),   # латинская и русская С
+    ("amount", ["Сумма"]),
+    ("placement", ["Размещение"]),
+    ("meal", ["Питание"]),
+    ("rate", ["Курс"]),
+    ("visa", ["Виза"]),
+    ("region", ["Регион"]),
+    ("departure_city", ["Вылет"]),
+    ("avia", ["Авиа запрос", "Авиа"]),
+    ("train", ["Поезд"]),
+    ("phone", ["Контактные номера", "Телефон", "Номер"]),
+    ("manager", ["Менеджер"]),
+    ("source", ["Источник"]),
+    ("contract", ["Договор"]),
+    ("comments", ["Комментарии", "Комментарий", "Коммент"]),
+]
+
+
+def _reversed_key(field: str, keys: List[str]) -> str:
+    alts = "|".join(re.escape(k[::-1]) for k in keys)
+    # «Курс $:» — между ключом и двоеточием может стоять $
+    dollar = r"\$?\s*" if field == "rate" else ""
+    return rf"\s*{dollar}(?P<{field}>{alts})"
+
+
+_SINGLE_CARD_KEY_RE = re.compile(
+    "|".join(_reversed_key(field, keys) for field, keys in _SINGLE_CARD_KEYS),
+    flags=re.IGNORECASE,
+)
+_LEADING_WS = re.compile(r"\s*")
+
+
+def _scan_single_card(t: str) -> Dict[str, str]:
+    """Один проход по двоеточиям текста: {поле: значение} для первого вхождения каждого ключа."""
+    found: Dict[str, str] = {}
+    rev = t[::-1]
+    n = len(t)
+    colon = t.find(":")
+    while colon != -1:
+        m = _SINGLE_CARD_KEY_RE.match(rev, n - colon)
+        if m is not None and m.lastgroup not in found:
+            field = m.lastgroup
+            start = _LEADING_WS.match(t, colon + 1).end()
+            if field == "comments":
+                # комментарий — всё до конца карточки
+                found[field] = t[start:].strip()
+            else:
+                end = t.find("\n", start)
+                found[field] = (t[start:] if end == -1 else t[start:end]).strip()
+        colon = t.find(":", colon + 1)
+    return found
+
 
 def parse_single_card(text: str) -> Optional[Dict[str, str]]:
     """
@@ -85,38 +157,38 @@ def parse_single_card(text: str) -> Optional[Dict[str, str]]:
     Возвращает dict с унифицированными полями или None, если даже ФИО нет.
     """
     t = clean_text(text)
+    fields = _scan_single_card(t)
 
-    fio = find(r"ФИО\s*:\s*(.+)", t)
+    fio = fields.get("fio")
     if not fio:
         return None
 
-    departure_date = find(r"Дата(?: вылета)?\s*:\s*(.+)", t)
-    package_name = find(r"Пакет название\s*:\s*(.+)", t)
+    departure_date = fields.get("departure_date")
+    package_name = fields.get("package_name")
 
-    amount = find(r"Сумма\s*:\s*(.+)", t)
-    paid_amount = find(r"[CС]умма оплаты\s*:\s*(.+)", t)
+    amount = fields.get("amount")
+    paid_amount = fields.get("paid_amount")
 
-    placement = find(r"Размещение\s*:\s*(.+)", t)
-    meal = find(r"Питание\s*:\s*(.+)", t)
+    placement = fields.get("placement")
+    meal = fields.get("meal")
 
-    rate = find(r"Курс\s*\$?\s*:\s*(.+)", t)
-    visa = find(r"Виза\s*:\s*(.+)", t)
+    rate = fields.get("rate")
+    visa = fields.get("visa")
 
-    region = find(r"Регион\s*:\s*(.+)", t)
-    departure_city = find(r"Вылет\s*:\s*(.+)", t)
+    region = fields.get("region")
+    departure_city = fields.get("departure_city")
 
-    # Авиа / Авиа запрос
-    avia = find(r"Авиа(?: запрос)?\s*:\s*(.*)", t)
-    train = find(r"Поезд\s*:\s*(.*)", t)
+    avia = fields.get("avia")
+    train = fields.get("train")
 
-    phone = find(r"(Контактные номера|Телефон|Номер)\s*:\s*(.+)", t)
-    manager = find(r"Менеджер\s*:\s*(.+)", t)
-    source = find(r"Источник\s*:\s*(.+)", t)
+    phone = fields.get("phone")
+    manager = fields.get("manager")
+    source = fields.get("source")
 
-    contract = find(r"Договор\s*:\s*(.*)", t)
-    contract_date = find(r"Дата договора\s*:\s*(.*)", t)
+    contract = fields.get("contract")
+    contract_date = fields.get("contract_date")
 
-    comments = find(r"(Комментарии|Комментарий|Коммент)\s*:\s*([\s\S]*)", t)
+    comments = fields.get("comments")
 
     # ФИО → фамилия / имя
     parts = fio.split()
@@ -178,9 +250,74 @@ def parse_booking_cards(text: str) -> List[Dict[str, str]]:
     return result
 
 
-import re
-from typing import Dict
+# Ключ строки «Ключ: значение» (в нижнем регистре) -> поле parse_booking_card
+_CARD_ALIASES = {
+    "фио": "full_name",
+    "fio": "full_name",
+    "full name": "full_name",
+    "пакет название": "package_name",
+    "пакет": "package_name",
+    "package": "package_name",
+    "сумма": "amount_raw",
+    "cумма оплаты": "paid_raw",     # латинская C — так пишут в карточках
+    "сумма оплаты": "paid_raw",
+    "оплата": "paid_raw",
+    "размещение": "placement",
+    "питание": "meal",
+    "курс$": "course",
+    "курс $": "course",
+    "курс": "course",
+    "виза": "visa",
+    "visa": "visa",
+    "регион": "region",
+    "вылет": "departure_city",
+    "менеджер": "manager",
+    "manager": "manager",
+    "телефон": "phone",
+    "номер": "phone",
+    "контактные номера": "phone",
+    "поезд": "train",
+    "train": "train",
+    "авиа": "avia",
+    "авиа запрос": "avia",
+    "avia": "avia",
+    "договор": "contract",
+}
+
+# разделитель ключа и значения
+_KEY_SEP = re.compile(r"[:\-–]")
+
+
+def tokenize_card(text: str) -> tuple[Dict[str, str], str]:
+    """
+    Один проход по строкам карточки: ({поле: значение}, комментарий).
+    Для каждого поля берётся первая строка с его ключом; комментарий —
+    всё после строки «Комментарии:».
+    """
+    fields: Dict[str, str] = {}
+    comments = None
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+
+    for idx, line in enumerate(lines):
+        m = _KEY_SEP.search(line)
+        if m is None:
+            key, value = line.rstrip().lower(), None
+        else:
+            key, value = line[:m.start()].rstrip().lower(), line[m.end():].strip()
+
+        if comments is None and key == "комментарии" and not value:
+            comments = "\n".join(lines[idx + 1:]).strip()
+            continue
+
+        field = _CARD_ALIASES.get(key)
+        if field and value is not None and field not in fields:
+            fields[field] = value
 
+    return fields, comments or ""
+
+
+@timed("parse_seconds")
 def parse_booking_card(text: str) -> Dict[str, str] | None:
     """
     Парсит карточку из WhatsApp в нормальный dict.
@@ -190,33 +327,11 @@ def parse_booking_card(text: str) -> Dict[str, str] | None:
     if not text or not text.strip():
         return None
 
-    t = text.strip()
-
-    # Разбиваем на строки один раз
-    lines = [line.strip() for line in t.splitlines() if line.strip()]
-
-    def find_line(prefixes):
-        """
-        Ищет строку вида 'Префикс: значение' по указанным префиксам (список вариантов).
-        Возвращает только ТЕКСТ после двоеточия.
-        """
-        if isinstance(prefixes, str):
-            prefixes_list = [prefixes]
-        else:
-            prefixes_list = prefixes
-
-        # Собираем регэксп типа: ^(ФИО|FIO)\s*[:\-–]\s*(.*)$
-        pattern = r'^(?:' + "|".join(re.escape(p) for p in prefixes_list) + r')\s*[:\-–]\s*(.*)$'
-
-        for line in lines:
-            m = re.match(pattern, line, flags=re.IGNORECASE)
-            if m:
-                return m.group(1).strip()
-        return ""
+    fields, comments = tokenize_card(text.strip())
 
     # --- ФИО ---
-    full_name = find_line(["ФИО", "FIO", "Full name"])
-    full_name = re.sub(r"\s+", " ", full_name).strip()
+    full_name = fields.get("full_name", "")
+    full_name = _SPACES_ANY.sub(" ", full_name).strip()
 
     last_name = ""
     first_name = ""
@@ -229,33 +344,26 @@ def parse_booking_card(text: str) -> Dict[str, str] | None:
             last_name = full_name
 
     # --- Пакет, суммы и т.д. ---
-    package_name = find_line(["Пакет название", "Пакет", "Package"])
-    amount_raw = find_line(["Сумма"])
-    paid_raw = find_line(["Cумма оплаты", "Сумма оплаты", "Оплата"])
-    placement = find_line(["Размещение"])
-    meal = find_line(["Питание"])
-    course = find_line(["Курс$", "Курс $", "Курс"])
-    visa = find_line(["Виза", "Visa"])
-    region = find_line(["Регион"])
-    departure_city = find_line(["Вылет"])
-    manager = find_line(["Менеджер", "Manager"])
-    phone = find_line(["Телефон", "Номер", "Контактные номера"])
-    train = find_line(["Поезд", "Train"])
-    avia = find_line(["Авиа", "Авиа запрос", "Avia"])
-
-    # --- Комментарий: всё после строки 'Комментарии:' ---
-    comments = ""
-    for idx, line in enumerate(lines):
-        if re.match(r"^Комментарии\s*[:\-–]?\s*$", line, flags=re.IGNORECASE):
-            tail = lines[idx + 1:]
-            comments = "\n".join(tail).strip()
-            break
+    package_name = fields.get("package_name", "")
+    amount_raw = fields.get("amount_raw", "")
+    paid_raw = fields.get("paid_raw", "")
+    placement = fields.get("placement", "")
+    meal = fields.get("meal", "")
+    course = fields.get("course", "")
+    visa = fields.get("visa", "")
+    region = fields.get("region", "")
+    departure_city = fields.get("departure_city", "")
+    manager = fields.get("manager", "")
+    phone = fields.get("phone", "")
+    train = fields.get("train", "")
+    avia = fields.get("avia", "")
+    contract = fields.get("contract", "")
 
     # --- Чистая сумма (цифры из '1950$' и т.п.) ---
     def extract_amount(num_text: str) -> str:
         if not num_text:
             return ""
-        m = re.search(r"(\d+[.,]?\d*)", num_text)
+        m = _AMOUNT.search(num_text)
         return m.group(1).replace(",", ".") if m else ""
 
     amount_clean = extract_amount(amount_raw)
@@ -287,6 +395,7 @@ def parse_booking_card(text: str) -> Dict[str, str] | None:
         "train": train,
         "comments": comments,
         "avia": avia,
+        "contract": contract,
     }
 
     return booking
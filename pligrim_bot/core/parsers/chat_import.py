@@ -0,0 +1,107 @@
+# pligrim_bot/core/parsers/chat_import.py
+# Потоковый импорт экспорта чата WhatsApp (.txt): файл читается построчно,
+# карточки отдаются генератором — память не зависит от размера выгрузки.
+
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pligrim_bot.core.parsers.booking_parser import WHATSAPP_PREFIX, parse_booking_card
+
+# начало карточки — «ФИО:» (как в split_cards, может стоять и посреди строки)
+_CARD_START = re.compile(r"ФИО\s*:")
+_SPACES = re.compile(r"[ \t]+")
+_DIGITS = re.compile(r"\D+")
+
+
+def _clean_line(line: str) -> Tuple[bool, str]:
+    """(это шапка нового сообщения?, строка без шапки и лишних пробелов) — как clean_text для одной строки."""
+    m = WHATSAPP_PREFIX.match(line)
+    if m:
+        line = line[m.end():]
+    line = line.replace("\u202a", "").replace("\u202c", "")
+    return m is not None, _SPACES.sub(" ", line).strip()
+
+
+def iter_card_texts(lines: Iterable[str]) -> Iterator[Tuple[int, int, str]]:
+    """
+    Режет поток строк на карточки: (первая строка, последняя строка, текст), строки 1-based.
+    Карточка идёт от «ФИО:» до следующего «ФИО:» или до шапки следующего сообщения.
+    """
+    buf: List[str] = []
+    start = end = 0
+
+    for lineno, raw in enumerate(lines, 1):
+        is_header, line = _clean_line(raw.rstrip("\r\n"))
+
+        # новое сообщение закрывает текущую карточку
+        if is_header and buf:
+            yield start, end, "\n".join(buf)
+            buf = []
+
+        starts = [m.start() for m in _CARD_START.finditer(line)]
+        if not starts:
+            if buf and line:
+                buf.append(line)
+                end = lineno
+            continue
+
+        # хвост предыдущей карточки до «ФИО:»
+        head = line[:starts[0]].strip()
+        if buf:
+            if head:
+                buf.append(head)
+                end = lineno
+            yield start, end, "\n".join(buf)
+
+        # несколько карточек в одной строке — все, кроме последней, закрыты сразу
+        pieces = [line[a:b].strip() for a, b in zip(starts, starts[1:] + [len(line)])]
+        for piece in pieces[:-1]:
+            yield lineno, lineno, piece
+        buf = [pieces[-1]]
+        start = end = lineno
+
+    if buf:
+        yield start, end, "\n".join(buf)
+
+
+def _dedup_key(booking: Dict[str, str]) -> Optional[Tuple[str, str, str]]:
+    """
+    Одна и та же бронь: ФИО + телефон (только цифры) + номер договора.
+    Без телефона или без договора — не сравниваем: у семьи часто один контактный номер.
+    """
+    phone = _DIGITS.sub("", booking.get("phone") or "")
+    contract = (booking.get("contract") or "").strip().lower()
+    if not phone or not contract:
+        return None
+    name = " ".join((booking.get("full_name") or "").lower().split())
+    return name, phone, contract
+
+
+def iter_chat_bookings(lines: Iterable[str], *, dedup: bool = True) -> Iterator[Dict[str, str]]:
+    """
+    Разобранные карточки из потока строк чата (формат parse_booking_card)
+    + "line_start" / "line_end" — где карточка в исходном файле.
+    Повторы (то же ФИО, телефон и договор) пропускаются, если dedup=True.
+    """
+    seen = set()
+    for start, end, text in iter_card_texts(lines):
+        booking = parse_booking_card(text)
+        if not booking or not booking.get("full_name"):
+            continue
+
+        if dedup:
+            key = _dedup_key(booking)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+
+        booking["line_start"] = start
+        booking["line_end"] = end
+        yield booking
+
+
+def import_chat_file(path: str, *, dedup: bool = True) -> Iterator[Dict[str, str]]:
+    """Карточки из экспорта чата WhatsApp (.txt) — файл читается построчно."""
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        yield from iter_chat_bookings(f, dedup=dedup)
@@ -1,7 +1,9 @@
 from pligrim_bot.core.parsers.people_parser import *
 from pligrim_bot.core.utils.text_utils import *
+from pligrim_bot.core.metrics import timed
+from pligrim_bot.core.utils.alias_matcher import AliasMatcher, any_of
+from pligrim_bot.core.utils.date_utils import nights  # ночи между dd/mm/yyyy — с LRU разобранных дат
 import re
-from datetime import datetime
 
 CITY_ALIASES = {
     "madinah": ["madinah", "medinah", "medina", "madina", "mdinah", "mdina", "мадина", "медина"],
@@ -50,13 +52,28 @@ PKG_KIND_ALIASES = {
     "standard": ["standard"],
 }
 
+# один проход по названию пакета вместо вложенных циклов по алиасам (порядок = приоритет)
+PKG_KIND_MATCHER = AliasMatcher(PKG_KIND_ALIASES)
+
 
 def find_palm_packages(ws) -> list[dict]:
     """
     Ищет «шапки» пакетов на листе паломников.
-    Возвращает список словарей: {'title': str, 'row': int, 'col': int}
+    Возвращает список словарей: {'title': str, 'row': int, 'col': int, ...}
+    Берётся из индекса пакетов листа (core/package_index) — лист сканируется
+    заново только когда поменялось его содержимое.
+    """
+    from pligrim_bot.core.package_index import get_package_index
+
+    return [dict(p) for p in get_package_index(ws)["packages"]]
+
+
+@timed("parse_seconds")
+def scan_palm_packages(data: list[list[str]]) -> list[dict]:
+    """
+    Полный проход по снимку листа в поисках «шапок» пакетов.
+    Возвращает список словарей: {'title': str, 'row': int, 'col': int, 'header_row': int}
     """
-    data = ws.get_all_values()
     H = len(data)
     found = []
 
@@ -69,16 +86,16 @@ def find_palm_packages(ws) -> list[dict]:
             # ищем диапазон дат в заголовке пакета
             if RANGE_RE.search(txt):
                 # подтверждаем, что ниже действительно начинается таблица с колонками
-                header_nearby = False
+                header_row = None
                 for k in range(1, 6):  # смотрим 1..5 строк ниже
                     rr = r + k
                     if rr < H and row_has_table_header(data[rr]):
-                        header_nearby = True
+                        header_row = rr
                         break
-                if not header_nearby:
+                if header_row is None:
                     continue
 
-                found.append({"title": txt, "row": r, "col": c})
+                found.append({"title": txt, "row": r, "col": c, "header_row": header_row})
                 break  # на этой строке уже нашли один заголовок
 
     # убираем дубликаты и сортируем по порядку сверху-вниз
@@ -92,8 +109,9 @@ def find_palm_packages(ws) -> list[dict]:
 def row_has_any(row, keywords: tuple[str, ...]) -> bool:
     """Проверяет, содержит ли строка любые из ключевых слов"""
     line = low(' '.join(row))
-    return any(k in line for k in keywords)
+    return any_of(tuple(keywords)).search(line) is not None
 
+@timed("parse_seconds")
 def find_config_block(data: list[list[str]], start_r: int, end_r: int, want_kind: str) -> tuple[int | None, dict]:
     """
     Универсальный поиск конфигурации отелей:
@@ -104,6 +122,8 @@ def find_config_block(data: list[list[str]], start_r: int, end_r: int, want_kind
       - абсолютный индекс строки конфига (int) или None
       - payload (dict)
     """
+    from pligrim_bot.core.config_table import get_config_table, kind_rows
+
     want_kind = (want_kind or "niyet").lower()
     want_words = tuple(PKG_KIND_ALIASES.get(want_kind, PKG_KIND_ALIASES["niyet"]))
 
@@ -111,6 +131,7 @@ def find_config_block(data: list[list[str]], start_r: int, end_r: int, want_kind
     print(f"🔍 Ключевые слова: {want_words}")
 
     H = len(data)
+    table = get_config_table(data)
     mad = {"hotel": None, "when": None}
     mak = {"hotel": None, "when": None}
 
@@ -122,20 +143,18 @@ def find_config_block(data: list[list[str]], start_r: int, end_r: int, want_kind
             return None
         return nights(parts[0], parts[1])
 
-    # Ищем строки с ключевыми словами пакета ПО ВСЕМУ ЛИСТУ, начиная со start_r
-    for r in range(start_r, H):
-        row = data[r]
-        if not row_has_any(row, want_words):
-            continue
-
-        print(f"🔍 Найдена строка с ключевыми словами в R{r+1}: {row}")
+    # Строки с ключевыми словами пакета ПО ВСЕМУ ЛИСТУ, начиная со start_r (из таблицы конфигов)
+    for r in kind_rows(table, want_words, start_r):
+        print(f"🔍 Найдена строка с ключевыми словами в R{r+1}: {data[r]}")
 
         # смотрим текущую и 4 следующие строки на наличие городов
         for rr in range(r, min(r + 5, H)):
-            rw = data[rr]
+            near = table["near"].get(rr)
+            if near is None:
+                continue    # в строке нет ни Медины, ни Мекки
 
-            # Ищем Медина + отель + даты
-            h, w = extract_city_line(rw, "madinah")
+            # Медина + отель + даты
+            h, w = near["madinah"]
             if h and not mad["hotel"]:
                 mad["hotel"] = h
                 print(f"📍 Найдена Медина: {h}")
@@ -143,8 +162,8 @@ def find_config_block(data: list[list[str]], start_r: int, end_r: int, want_kind
                 mad["when"] = w
                 print(f"📅 Даты Медины: {w}")
 
-            # Ищем Мекка + отель + даты
-            h, w = extract_city_line(rw, "makkah")
+            # Мекка + отель + даты
+            h, w = near["makkah"]
             if h and not mak["hotel"]:
                 mak["hotel"] = h
                 print(f"📍 Найдена Мекка: {h}")
@@ -188,6 +207,7 @@ def find_config_block(data: list[list[str]], start_r: int, end_r: int, want_kind
     return None, {}
 
 
+@timed("parse_seconds")
 def find_config_block_by_package_name(
         data: list[list[str]],
         start_r: int,
@@ -206,6 +226,8 @@ def find_config_block_by_package_name(
         return find_config_block_4u(data, package_title)
 
     # 2) Fallback для нестандартных кейсов
+    from pligrim_bot.core.config_table import first_line, get_config_table
+
     H = len(data)
     print(f"🔍 Поиск конфигурации для пакета: '{package_title}' (общий fallback)")
 
@@ -214,41 +236,11 @@ def find_config_block_by_package_name(
     if start_ddmm:
         print(f"📌 Фильтр по стартовой дате тура: {start_ddmm}")
 
+    # первые Madinah / Makkah в нижних 40 строках — из таблицы конфигов листа
+    table = get_config_table(data)
     search_start = max(0, H - 40)
-    madinah_found = None
-    makkah_found = None
-
-    for r in range(search_start, H):
-        row = data[r]
-        city, hotel, d1, d2 = extract_city_line_simple(row)
-        if not city or not d1 or not d2:
-            continue
-
-        # **НОВОЕ**: если есть стартовая дата, берём только те конфиги,
-        # у которых заезд в первый город начинается в тот же день-месяц.
-        # d1 в формате 'dd/mm/yyyy' -> берём первые 5 символов 'dd/mm'
-        if start_ddmm and d1[:5] != start_ddmm:
-            continue
-
-        if city == "Madinah" and not madinah_found:
-            madinah_found = {
-                "city": city,
-                "hotel": hotel or "—",
-                "d1": d1,
-                "d2": d2,
-                "row": r,
-            }
-        elif city == "Makkah" and not makkah_found:
-            makkah_found = {
-                "city": city,
-                "hotel": hotel or "—",
-                "d1": d1,
-                "d2": d2,
-                "row": r,
-            }
-
-        if madinah_found and makkah_found:
-            break
+    madinah_found = first_line(table, "Madinah", start_ddmm, search_start)
+    makkah_found = first_line(table, "Makkah", start_ddmm, search_start)
 
     # дальше всё как у тебя
     if not madinah_found or not makkah_found:
@@ -286,84 +278,60 @@ def find_config_block_by_package_name(
 
 
 
+@timed("parse_seconds")
 def find_config_block_4u(data: list[list[str]], package_title: str) -> tuple[int | None, dict]:
     """
     Специальный поиск конфигурации отелей ДЛЯ 4U-пакетов:
-    - бегаем по нижней части листа (конфиги SHOHADA / SWISS / FAIRMONT)
+    - берём нижнюю часть листа (конфиги SHOHADA / SWISS / FAIRMONT) из таблицы конфигов
     - для Madinah берём последнюю строку перед нужной Makkah
     - для Makkah фильтруем по hotel_kw из названия пакета
     """
+    from pligrim_bot.core.config_table import get_config_table, hotel_lines, last_line_before
+
     H = len(data)
     hotel_kw = hotel_kw_from_4u_title(package_title)
     start_ddmm = first_ddmm_from_title(package_title)
     print(f"🔍 [4U] Поиск конфига для '{package_title}', hotel_kw={hotel_kw!r}, start_ddmm={start_ddmm!r}")
 
+    table = get_config_table(data)
     start_row = max(0, H - 40)
-    last_madinah = None
 
-    for r in range(start_row, H):
-        row = data[r]
-        city, hotel, d1, d2 = extract_city_line_simple(row)
-        if not city or not d1 or not d2:
+    # Makkah нужного отеля (сверху вниз) + последняя Madinah с нашей датой заезда над ней
+    for mak in hotel_lines(table, "Makkah", hotel_kw, start_row):
+        mad = last_line_before(table, "Madinah", start_ddmm, start_row, mak["row"])
+        print(f"📍 [4U] Makkah row R{mak['row']+1}: {mak['text']}")
+        if not mad:
             continue
 
-        row_text = " ".join(norm_spaces(c) for c in row if norm_spaces(c))
-        row_low = row_text.lower()
-
-        if city == "Madinah":
-            # если указан первый день тура — игнорируем чужие даты
-            if start_ddmm and d1[:5] != start_ddmm:
-                continue
-
-            last_madinah = {
-                "city": city,
-                "hotel": hotel or "—",
-                "d1": d1,
-                "d2": d2,
-                "row": r,
-            }
-            print(f"📍 [4U] Madinah row R{r+1}: {row_text}")
-
-        elif city == "Makkah":
-            if hotel_kw and hotel_kw not in row_low:
-                continue
-
-            print(f"📍 [4U] Makkah row R{r+1}: {row_text}")
-
-            if not last_madinah:
-                continue
-
-            mad = last_madinah
-
-            s1 = nights(mad["d1"], mad["d2"])
-            s2 = nights(d1, d2)
-
-            payload = {
-                "city1": mad["city"],
-                "hotel1": mad["hotel"],
-                "dates1": f"{mad['d1']} – {mad['d2']}",
-                "checkin1": "16:00",
-                "stay1": s1,
-                "stay1_nights": s1,
-
-                "city2": city,
-                "hotel2": hotel or "—",
-                "dates2": f"{d1} – {d2}",
-                "checkin2": "16:00",
-                "stay2": s2,
-                "stay2_nights": s2,
-
-                "service": "Виза и страховка",
-                "meal": "Завтрак и ужин",
-                "guide": "Групповой гид",
-                "excursions": "Мекка, Медина",
-                "transfer": "Автобус",
-                "tech_guide": "+966 56 328 0325",
-            }
-
-            cfg_row = min(mad["row"], r)
-            print(f"✅ [4U] Конфигурация найдена: Madinah={mad['hotel']} / Makkah={hotel or '—'} (строки {mad['row']+1} и {r+1})")
-            return cfg_row, payload
+        s1 = nights(mad["d1"], mad["d2"])
+        s2 = nights(mak["d1"], mak["d2"])
+
+        payload = {
+            "city1": mad["city"],
+            "hotel1": mad["hotel"],
+            "dates1": f"{mad['d1']} – {mad['d2']}",
+            "checkin1": "16:00",
+            "stay1": s1,
+            "stay1_nights": s1,
+
+            "city2": mak["city"],
+            "hotel2": mak["hotel"],
+            "dates2": f"{mak['d1']} – {mak['d2']}",
+            "checkin2": "16:00",
+            "stay2": s2,
+            "stay2_nights": s2,
+
+            "service": "Виза и страховка",
+            "meal": "Завтрак и ужин",
+            "guide": "Групповой гид",
+            "excursions": "Мекка, Медина",
+            "transfer": "Автобус",
+            "tech_guide": "+966 56 328 0325",
+        }
+
+        cfg_row = min(mad["row"], mak["row"])
+        print(f"✅ [4U] Конфигурация найдена: Madinah={mad['hotel']} / Makkah={mak['hotel']} (строки {mad['row']+1} и {mak['row']+1})")
+        return cfg_row, payload
 
     print("❌ [4U] Не удалось найти конфиг для 4U-пакета по названию")
     return None, {}
@@ -378,15 +346,6 @@ def debug_show_config_area(data: list[list[str]], start_row: int, num_rows: int
             print(f"R{r+1}: {non_empty}")
 
 
-def nights(d1: str, d2: str) -> int|None:
-    """Вычисляет количество ночей между двумя датами"""
-    try:
-        a = datetime.strptime(d1, "%d/%m/%Y")
-        b = datetime.strptime(d2, "%d/%m/%Y")
-        return max(0, (b - a).days)
-    except Exception:
-        return None
-
 def extract_city_line_simple(row):
     def clean(x):
         return norm_spaces(str(x) or "")
@@ -451,21 +410,14 @@ def extract_city_line_simple(row):
 
 def package_bounds(ws, pkg_row: int) -> tuple[int, int, list[dict]]:
     """Границы выбранного пакета [start, next) и список всех пакетов на листе"""
-    all_pk = find_palm_packages(ws)
-    H = len(ws.get_all_values())
-    nxt = H
-    for p in all_pk:
-        if p["row"] > pkg_row:
-            nxt = p["row"]
-            break
-    return pkg_row, nxt, all_pk
+    from pligrim_bot.core.package_index import get_package_index, next_package_row
+
+    index = get_package_index(ws)
+    nxt = next_package_row(index, pkg_row)
+    return pkg_row, nxt, [dict(p) for p in index["packages"]]
 
 def kind_from_title(title: str) -> str:
-    t = low(str(title))
-    for canon, variants in PKG_KIND_ALIASES.items():
-        if any(v in t for v in variants):
-            return canon
-    return "niyet"
+    return PKG_KIND_MATCHER.canon(low(str(title)), "niyet")
 
 def first_ddmm_from_title(title: str) -> str | None:
 
@@ -497,11 +449,13 @@ def hotel_to_right(row, city_col: int) -> str:
     return ""
 
 # Вспомогательные функции
+_WS_RX = re.compile(r'[\s\u00A0\u202F]+')
+
 def low(s: str) -> str:
-    return re.sub(r'[\s\u00A0\u202F]+', ' ', (str(s) or '')).strip().lower()
+    return _WS_RX.sub(' ', (str(s) or '')).strip().lower()
 
 def norm_spaces(s: str) -> str:
-    return re.sub(r'[\s\u00A0\u202F]+', ' ', (str(s) or '')).strip()
+    return _WS_RX.sub(' ', (str(s) or '')).strip()
 
 def to_slash(d: str) -> str:
     return d.replace('.', '/')
@@ -1,4 +1,6 @@
 from pligrim_bot.config.constants import *
+from pligrim_bot.core.metrics import timed
+from pligrim_bot.core.utils.alias_matcher import AliasMatcher, any_substring_rx
 
 def get_last(row, cols):   return _norm_spaces(row[cols["last"]])  if "last"  in cols and cols["last"]  < len(row) else ""
 def get_first(row, cols):  return _norm_spaces(row[cols["first"]]) if "first" in cols and cols["first"] < len(row) else ""
@@ -13,8 +15,7 @@ def is_guest_row(row: list[str], cols: dict) -> bool:
     # проверяем только эти два поля, без всего "row"
     if DATE_TOKEN_RX.search(last) or DATE_TOKEN_RX.search(first):
         return False
-    low_last, low_first = last.lower(), first.lower()
-    if any(tok in low_last for tok in NOISE_TOKENS) or any(tok in low_first for tok in NOISE_TOKENS):
+    if NOISE_RX.search(last.lower()) or NOISE_RX.search(first.lower()):
         return False
     return is_valid_name(last) or is_valid_name(first)
 
@@ -35,22 +36,22 @@ def detect_people_header(row: list[str]) -> dict | None:
         print(f"  Ячейка {i}: '{cell_text}'")
 
         # Тип комнаты - может быть ПЕРВОЙ колонкой!
-        if any(keyword in cell_text for keyword in ["type of room", "room type", "тип номера", "room", "type"]):
+        if _HDR_ROOM_RX.search(cell_text):
             cols["room"] = i
             print(f"    ✅ Найден тип комнаты в колонке {i}")
 
         # Фамилия
-        if any(keyword in cell_text for keyword in ["last name", "фамилия", "surname", "lastname"]):
+        if _HDR_LAST_RX.search(cell_text):
             cols["last"] = i
             print(f"    ✅ Найдена фамилия в колонке {i}")
 
         # Имя
-        if any(keyword in cell_text for keyword in ["first name", "имя", "firstname"]):
+        if _HDR_FIRST_RX.search(cell_text):
             cols["first"] = i
             print(f"    ✅ Найдено имя в колонке {i}")
 
         # Питание (может быть второй колонкой)
-        if any(keyword in cell_text for keyword in ["meal", "meal a day", "питание", "hb", "ro"]):
+        if _HDR_MEAL_RX.search(cell_text):
             cols["meal"] = i
             print(f"    ✅ Найдено питание в колонке {i}")
 
@@ -179,6 +180,106 @@ for w in HOTELS_NAME_HINTS:
 NOISE_TOKENS = BASE_NOISE_TOKENS | EXTRA_NOISE
 
 
+# типы комнат (canon_room_kind / _norm_room_kind)
+ROOM_KIND_MATCHER = AliasMatcher(ROOM_ALIASES)
+
+# служебные слова в ФИО (is_valid_name / is_guest_row)
+NOISE_RX = any_substring_rx(NOISE_TOKENS)
+
+# ключевые слова заголовка таблицы людей (detect_people_header)
+_HDR_ROOM_RX = any_substring_rx(["type of room", "room type", "тип номера", "room", "type"])
+_HDR_LAST_RX = any_substring_rx(["last name", "фамилия", "surname", "lastname"])
+_HDR_FIRST_RX = any_substring_rx(["first name", "имя", "firstname"])
+_HDR_MEAL_RX = any_substring_rx(["meal", "meal a day", "питание", "hb", "ro"])
+
+# «НЕ ЛЮДИ» в колонке ФИО (отели, города, служебный текст) — для collect_people_groups
+GROUP_BAD_FIO_EXACT = {
+    "ADDRESS",
+    "MAKKAH",
+    "MAKKA",
+    "MADINAH",
+    "MEDINA",
+    "JEDDAH",
+    "RIYADH",
+    "VALLY",
+    "VALLEY",
+    "HIKMA",
+    "HIKMA 7 DAYS",
+    "AMAL 7 DAYS",
+    "SWISSOTEL",
+    "FAIRMONT",
+    "ROTANA",
+    "WQF SFI",
+    "Address"
+}
+GROUP_BAD_FIO_CONTAINS_RX = any_substring_rx((
+    " DAYS",
+    "MAKKAH:",
+    "MADINAH:",
+    "MEDINAH:",
+))
+
+_WS_RX = re.compile(r"[\s\u00A0\u202F]+")
+_NAME_PUNCT_RX = re.compile(r"[/.\-_|]")
+
+
+def people_columns(data: list[list[str]], r0: int, r1: int, cols: dict) -> dict:
+    """
+    Колоночное представление строк [r0, r1) таблицы людей: каждая колонка нормализуется
+    один раз целиком, дальше разбор идёт по готовым спискам, а не по ячейкам.
+      rows   — номера строк листа
+      fio    — ФИО как у _get_person_name ("" — не человек)
+      room   — сырой тип комнаты (strip)
+      child  — ребёнок (как row_is_child)
+      blank  — строка целиком пустая
+    """
+    rows = list(range(r0, min(r1, len(data))))
+    block = [data[r] for r in rows]
+
+    def column(idx):
+        if idx is None:
+            return [None] * len(block)
+        return [_norm_spaces(row[idx]) if idx < len(row) else None for row in block]
+
+    last = column(cols.get("last"))
+    first = column(cols.get("first"))
+    name = column(cols.get("name"))
+    meal_idx = cols.get("meal")
+    r_room = cols.get("room")
+
+    # валидность имени — по уникальным значениям колонки, а не по каждой ячейке
+    uniq = set(last) | set(first) | set(name)
+    uniq.discard(None)
+    valid = {v: is_valid_name(v) for v in uniq}
+
+    def fio_of(i: int) -> str:
+        if name[i] is not None:
+            nm = name[i]
+            return nm if valid[nm] else ""
+        parts = [v for v in (last[i] or "", first[i] or "") if v and valid[v]]
+        return (" ".join(parts)).strip()
+
+    child_meal = [
+        meal_idx is not None and meal_idx < len(row) and bool(CHILD_RX.search(str(row[meal_idx] or "")))
+        for row in block
+    ]
+
+    return {
+        "rows": rows,
+        "fio": [fio_of(i) for i in range(len(block))],
+        "room": [
+            ((row[r_room] or "") if r_room is not None and r_room < len(row) else "").strip()
+            for row in block
+        ],
+        "child": [
+            cm or bool(CHILD_RX.search(" ".join(str(c or "") for c in row)))
+            for cm, row in zip(child_meal, block)
+        ],
+        "blank": [not any(str(c or "").strip() for c in row) for row in block],
+    }
+
+
+@timed("parse_seconds")
 def collect_people_groups(
         data: list[list[str]],
         hdr_row: int,
@@ -186,7 +287,6 @@ def collect_people_groups(
         end_row: int,
         pkg_start_row: int = None
 ) -> dict:
-    r_room = cols.get("room")
     rooms, flat = [], []
 
     # последняя открытая комната
@@ -200,34 +300,6 @@ def collect_people_groups(
     # вместимость по типу комнаты
     CAP = {"quad": 4, "trpl": 3, "dbl": 2, "twin": 2, "sgl": 1}
 
-    # 🔹 СЛОВАРЬ "НЕ ЛЮДЕЙ" (отели, города, служебный текст)
-    BAD_FIO_EXACT = {
-        "ADDRESS",
-        "MAKKAH",
-        "MAKKA",
-        "MADINAH",
-        "MEDINA",
-        "JEDDAH",
-        "RIYADH",
-        "VALLY",
-        "VALLEY",
-        "HIKMA",
-        "HIKMA 7 DAYS",
-        "AMAL 7 DAYS",
-        "SWISSOTEL",
-        "FAIRMONT",
-        "ROTANA",
-        "WQF SFI",
-        "Address"
-    }
-
-    BAD_FIO_CONTAINS = (
-        " DAYS",
-        "MAKKAH:",
-        "MADINAH:",
-        "MEDINAH:",
-    )
-
     def flush():
         nonlocal cur_kind, bucket, adults_count
         if cur_kind and bucket:
@@ -242,33 +314,27 @@ def collect_people_groups(
         bucket = []
         adults_count = 0
 
-    for r in range(hdr_row + 1, min(end_row, len(data))):
-        row = data[r]
+    # колонки нормализуем один раз, дальше — только по готовым спискам
+    pc = people_columns(data, hdr_row + 1, end_row, cols)
 
+    for r, blank, fio, raw_room, is_child in zip(pc["rows"], pc["blank"], pc["fio"], pc["room"], pc["child"]):
         # пустые/служебные строки полностью пропускаем
-        if not any(str(c or "").strip() for c in row):
+        if blank:
             continue
 
-        fio = _get_person_name(row, cols).strip()
+        fio = fio.strip()
         if not fio or len(fio) < 2:
             continue
 
         fio_up = fio.upper()
 
         # 🔧 ФИЛЬТР: если это не человек, а город/отель/текст — пропускаем
-        if fio_up in BAD_FIO_EXACT or any(pat in fio_up for pat in BAD_FIO_CONTAINS):
+        if fio_up in GROUP_BAD_FIO_EXACT or GROUP_BAD_FIO_CONTAINS_RX.search(fio_up):
             print(f"  ⚠️ Служебная строка («{fio}»), пропускаем как не-паломника")
             continue
 
         print(f"👤 Обрабатываем: {fio} (строка {r})")
 
-        # ребёнок (INF / child) не увеличивает капасити по взрослым
-        is_child = row_is_child(row, cols)
-
-        # читаем тип комнаты из колонки
-        raw_room = (row[r_room] if r_room is not None and r_room < len(row) else "")
-        raw_room = (raw_room or "").strip()
-
         if raw_room:  # ЯВНЫЙ тип — ВСЕГДА новая комната
             kind = _norm_room_kind(raw_room, last_explicit_kind)
             last_explicit_kind = kind
@@ -393,12 +459,12 @@ def is_valid_name(name: str) -> bool:
         return False
     if any(ch.isdigit() for ch in s):
         return False
-    if any(ch in "/.-_|" for ch in s):
+    if _NAME_PUNCT_RX.search(s):
         return False
 
     # 2) служебные слова
     low = s.lower()
-    if any(tok in low for tok in NOISE_TOKENS):
+    if NOISE_RX.search(low):
         return False
 
     # 3) отбрасываем одиночные маркеры
@@ -423,7 +489,7 @@ def _norm_hdr(s: str) -> str:
     return re.sub(r"[\s\u00A0\u202F]+", " ", (s or "").strip().lower())
 
 def _norm_spaces(s: str) -> str:
-    return re.sub(r'[\s\u00A0\u202F]+', ' ', (s or '')).strip()
+    return _WS_RX.sub(' ', (s or '')).strip()
 
 
 def _get_person_name(row, cols):
@@ -447,9 +513,9 @@ def _norm_room_kind(s: str, prev: str | None) -> str | None:
     if not t:
         return prev  # <-- тянем прошлый
 
-    for k, als in ROOM_ALIASES.items():
-        if any(a in t for a in als):
-            return k
+    k = ROOM_KIND_MATCHER.canon(t)
+    if k:
+        return k
 
     # Числовые подсказки
     if "4" in t: return "quad"
@@ -491,9 +557,9 @@ def canon_room_kind(value: str | None) -> str | None:
     s = norm_hdr(value)
     if not s:
         return None
-    for canon, variants in ROOM_ALIASES.items():
-        if any(v in s for v in variants):
-            return canon
+    canon = ROOM_KIND_MATCHER.canon(s)
+    if canon:
+        return canon
     # иногда пишут «2-мест», «3-мест»
     if "2" in s: return "dbl"
     if "3" in s: return "trpl"
@@ -534,9 +600,9 @@ def _norm_room_kind(s: str, prev: str|None) -> str|None:
 
     # Если есть явный тип - возвращаем его
     if t:
-        for k, als in ROOM_ALIASES.items():
-            if any(a in t for a in als):
-                return k
+        k = ROOM_KIND_MATCHER.canon(t)
+        if k:
+            return k
         # Цифровые указания
         if "2" in t: return "dbl"
         if "3" in t: return "trpl"
@@ -0,0 +1,162 @@
+# pligrim_bot/core/placement_writer.py
+# Запись размещений в лист без гонок между менеджерами.
+#
+# Все записи в один лист идут под замком этого листа. Внутри замка пакеты
+# перечитываются из Google (мимо кэша), свободные места ищутся заново,
+# и всё, что накопилось в очереди, уходит одним values:batchUpdate.
+# Если место, которое видел менеджер, уже заняли — берём следующее свободное.
+# Места для всей пачки подбирает allocate_package (меньше полупустых комнат).
+# При нескольких воркерах поверх потокового замка берётся межпроцессный (shared_cache.write_lock).
+
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from pligrim_bot.core.package_index import package_blocks, peek_package_index
+from pligrim_bot.core.room_allocator import (
+    allocate_package,
+    package_occupancy,
+    drop_occupancy,
+    build_row_values_from_payload,
+)
+from pligrim_bot.data import shared_cache, sheet_cache
+
+
+_LOCK = threading.Lock()
+# (spreadsheet_id, ws_title) -> замок записи в лист
+_WS_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+# (spreadsheet_id, ws_title) -> [(ws, pkg_row, payload, family, Future)] — ждут записи
+_PENDING: Dict[Tuple[str, str], list] = {}
+
+_STATS = {"placed": 0, "no_slot": 0, "flushes": 0, "failed": 0}
+
+
+def _ws_lock(key: Tuple[str, str]) -> threading.Lock:
+    with _LOCK:
+        lock = _WS_LOCKS.get(key)
+        if lock is None:
+            lock = _WS_LOCKS[key] = threading.Lock()
+        return lock
+
+
+def place_bookings(ws, pkg_row: int, payloads: List[dict],
+                   families: Optional[List[Optional[str]]] = None) -> List[Optional[int]]:
+    """
+    Размещает паломников в пакете. Возвращает row_idx (0-based) для каждого payload
+    или None, если подходящего места нет. families — пакет из карточки (для same_family).
+    Синхронная функция — вызывать через run_sheets.
+    """
+    key = sheet_cache.ws_key(ws)
+    families = families or [None] * len(payloads)
+    futures = []
+
+    with _LOCK:
+        queue = _PENDING.setdefault(key, [])
+        for payload, family in zip(payloads, families):
+            fut: Future = Future()
+            queue.append((ws, pkg_row, payload, family, fut))
+            futures.append(fut)
+
+    # кто первым взял замок — пишет всю очередь листа, включая чужие заявки
+    with _ws_lock(key):
+        with _LOCK:
+            batch = _PENDING.pop(key, [])
+        if batch:
+            try:
+                with shared_cache.write_lock(key):
+                    _flush(batch)
+            except Exception as e:
+                # ни одна заявка не должна зависнуть без ответа
+                _fail(batch, e)
+
+    return [f.result() for f in futures]
+
+
+def place_booking(ws, pkg_row: int, payload: dict, family: Optional[str] = None) -> Optional[int]:
+    """Один паломник — см. place_bookings()."""
+    return place_bookings(ws, pkg_row, [payload], [family])[0]
+
+
+def _flush(batch: list) -> None:
+    """Перечитать пакеты, распределить места и записать всё одним запросом. Зовётся под замком листа."""
+    ws = batch[0][0]
+    key = sheet_cache.ws_key(ws)
+    try:
+        blocks = package_blocks(ws, [item[1] for item in batch], fresh=True)
+    except Exception as e:
+        _fail(batch, e)
+        return
+
+    index = peek_package_index(ws)
+    by_pkg: Dict[int, list] = {}
+    for item in batch:
+        by_pkg.setdefault(item[1], []).append(item)
+
+    updates = []        # [(row_idx, row_values)]
+    placed = []         # [(future, row_idx)]
+
+    for pkg_row, items in by_pkg.items():
+        r0, r1, data = blocks[pkg_row]
+        try:
+            occ = package_occupancy(key, data, r0, r1)
+        except Exception as e:
+            _fail(items, e)
+            continue
+
+        pkg = index["by_row"].get(pkg_row) if index else None
+        # все заявки пакета распределяются разом — меньше полупустых комнат
+        rows = allocate_package(
+            occ,
+            [payload for _, _, payload, _, _ in items],
+            pkg_title=pkg["title"] if pkg else None,
+            families=[family for _, _, _, family, _ in items],
+        )
+
+        for (_, _, payload, _, fut), row_idx in zip(items, rows):
+            if row_idx is None:
+                _STATS["no_slot"] += 1
+                fut.set_result(None)
+                continue
+
+            # свежая строка из Google — Type of room / Visa остаются как в таблице
+            row_values = build_row_values_from_payload(payload, occ.cols, base_row=data[row_idx])
+            # место занято уже сейчас: индекс занятости совпадает с тем, что уйдёт в лист
+            occ.set_row(row_idx, row_values)
+            updates.append((row_idx, row_values))
+            placed.append((fut, row_idx))
+
+    if updates:
+        try:
+            ws.batch_update([
+                {"range": f"A{row_idx + 1}", "values": [row_values]}
+                for row_idx, row_values in updates
+            ])
+        except Exception as e:
+            # что именно записалось — неизвестно, пусть следующее чтение идёт в Google
+            sheet_cache.invalidate(ws)
+            drop_occupancy(key)
+            _fail([(fut,) for fut, _ in placed], e)
+            return
+
+        _STATS["flushes"] += 1
+        for row_idx, row_values in updates:
+            sheet_cache.update_row(ws, row_idx, row_values)
+        # ревизию снимка не переписываем: после своей записи лист один раз перекачается,
+        # зато чужая правка между чтением и записью не спрячется за новой ревизией
+
+    for fut, row_idx in placed:
+        _STATS["placed"] += 1
+        fut.set_result(row_idx)
+
+
+def _fail(batch: list, error: Exception) -> None:
+    print(f"❌ Запись размещений не прошла: {error}")
+    for *_, fut in batch:
+        if not fut.done():
+            _STATS["failed"] += 1
+            fut.set_exception(error)
+
+
+def writer_stats() -> dict:
+    with _LOCK:
+        return {**_STATS, "pending": sum(len(q) for q in _PENDING.values())}
@@ -0,0 +1,101 @@
+# pligrim_bot/core/prefetch.py
+# Фоновый прогрев: снимки и индексы пакетов ближайших вылетов держим в памяти,
+# чтобы первое нажатие на лист не ждало полного get_all_values().
+#
+# Идём с самым низким приоритетом (PRI_BACKGROUND), листы — с паузой между ними,
+# а если запас квоты чтения мал — проход пропускаем: менеджеры важнее.
+
+import asyncio
+import time
+from datetime import date, datetime
+from typing import List, Tuple
+
+from pligrim_bot.config.constants import (
+    PREFETCH_DEPARTURES,
+    PREFETCH_INTERVAL,
+    PREFETCH_MIN_HEADROOM,
+    PREFETCH_STAGGER,
+    SHEET_CACHE_TTL,
+)
+from pligrim_bot.config.settings import PALM_SHEETS, get_worksheet
+from pligrim_bot.core.google_sheets import get_palm_sheet_names, parse_first_ddmm, resolve_base_year
+from pligrim_bot.core.package_index import get_package_index
+from pligrim_bot.core.sheets_gateway import run_sheets
+from pligrim_bot.core.sheets_quota import PRI_BACKGROUND, read_headroom
+from pligrim_bot.data import sheet_cache
+
+_STATS = {"cycles": 0, "warmed": 0, "still_fresh": 0, "quota_skips": 0, "errors": 0}
+
+
+def upcoming_departures(limit: int = PREFETCH_DEPARTURES) -> List[Tuple[date, str, str]]:
+    """Ближайшие вылеты по всем месяцам: [(дата, month_key, название листа)], по дате."""
+    today = datetime.now().date()
+    found = []
+    for month_key in list(PALM_SHEETS):
+        base_year = resolve_base_year(month_key, today.year)
+        for title in get_palm_sheet_names(month_key, include_past=False):
+            ddmm = parse_first_ddmm(title)
+            if ddmm is None:
+                continue        # служебные листы без даты не греем
+            try:
+                found.append((date(base_year, ddmm[1], ddmm[0]), month_key, title))
+            except ValueError:
+                continue
+    found.sort()
+    return found[:limit]
+
+
+def warm_sheet(month_key: str, ws_title: str, *, interval: float = PREFETCH_INTERVAL) -> bool:
+    """
+    Перечитывает лист, если его снимок протухнет раньше следующего прохода, и обновляет индекс пакетов.
+    True — ходили в Google, False — снимок ещё поживёт (или листа нет).
+    """
+    ws = get_worksheet(month_key, ws_title)
+    if ws is None:
+        return False
+
+    age = sheet_cache.age(ws)
+    if age is not None and age + interval < SHEET_CACHE_TTL:
+        return False
+
+    sheet_cache.get_values(ws, ttl=max(0.0, SHEET_CACHE_TTL - interval))
+    get_package_index(ws)
+    return True
+
+
+async def prefetch_in_background(interval: float = PREFETCH_INTERVAL) -> None:
+    """Фоновая задача: раз в interval секунд греет PREFETCH_DEPARTURES ближайших вылетов."""
+    if PREFETCH_DEPARTURES <= 0:
+        return
+
+    while True:
+        started = time.monotonic()
+        _STATS["cycles"] += 1
+        try:
+            targets = await run_sheets(upcoming_departures, priority=PRI_BACKGROUND)
+            for _, month_key, ws_title in targets:
+                headroom = read_headroom()
+                if headroom is not None and headroom < PREFETCH_MIN_HEADROOM:
+                    _STATS["quota_skips"] += 1
+                    print(f"⏸ Прогрев: запас квоты {headroom:g} — остаток прохода пропускаем")
+                    break
+
+                fetched = await run_sheets(warm_sheet, month_key, ws_title, interval=interval, priority=PRI_BACKGROUND)
+                if fetched:
+                    _STATS["warmed"] += 1
+                    # листы по одному, с паузой: не выбирать квоту залпом
+                    await asyncio.sleep(PREFETCH_STAGGER)
+                else:
+                    _STATS["still_fresh"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _STATS["errors"] += 1
+            print(f"⚠️ Прогрев листов: {e}")
+
+        # интервал считаем от начала прохода, чтобы снимки не протухали из-за долгого прохода
+        await asyncio.sleep(max(1.0, interval - (time.monotonic() - started)))
+
+
+def prefetch_stats() -> dict:
+    return dict(_STATS)
@@ -1,9 +1,17 @@
 # pligrim_bot/core/room_allocator.py
 
+from collections import OrderedDict
 from typing import Dict, List, Tuple, Optional
+import bisect
 import re
+import threading
 
-from pligrim_bot.core.parsers.package_parser import package_bounds
+from pligrim_bot.config.constants import SHEET_CACHE_MAX_BLOCKS
+from pligrim_bot.core.metrics import timed
+from pligrim_bot.core.package_index import package_blocks
+from pligrim_bot.core.utils.alias_matcher import AliasMatcher
+from pligrim_bot.core.utils.validation import canon_family, same_family
+from pligrim_bot.data import sheet_cache
 
 # какие типы комнат к какому размеру относятся
 
@@ -20,6 +28,8 @@ ROOM_CANON = {
     "single": ["single", "sngl"],
 }
 
+ROOM_CANON_MATCHER = AliasMatcher(ROOM_CANON)
+
 ROOM_SIZE = {
     "quadro": 4,
     "triple": 3,
@@ -38,12 +48,7 @@ def normalize_room_type(cell: str) -> Optional[str]:
     t = _norm(cell)
     if not t:
         return None
-
-    for canon, variants in ROOM_CANON.items():
-        for v in variants:
-            if v in t:
-                return canon
-    return None
+    return ROOM_CANON_MATCHER.canon(t)
 
 
 
@@ -94,80 +99,278 @@ def find_header_and_cols(data: List[List[str]], start: int, end: int) -> Tuple[i
     return header_row, cols
 
 
-def find_free_slot_auto(ws, pkg_row: int, payload: Dict[str, str]) -> Optional[Tuple[int, Dict[str, int]]]:
-    """
-    НАЙТИ СВОБОДНОЕ МЕСТО ДЛЯ ПАЛОМНИКА ВНУТРИ ПАКЕТА (произвольное размещение)
-    Возвращает:
-        (row_index, cols_dict) — row_index это индекс строки (0-based) в get_all_values()
-    Если места нет → None
-    """
-    data = ws.get_all_values()
-    r0, r1, all_pk = package_bounds(ws, pkg_row)
+def _cell(row: List[str], col: int) -> str:
+    return str(row[col]).strip() if col < len(row) else ""
 
-    room_type = (payload.get("Type of room") or "").strip()
-    gender = (payload.get("Gender") or "").strip().upper()   # "M" / "F"
 
-    if not room_type:
-        return None
+class _Room:
+    __slots__ = ("start", "canon", "rows", "occupied", "free")
 
-    header_row, cols = find_header_and_cols(data, r0, r1)
-    type_col = cols["Type of room"]
-    last_col = cols["Last Name"]
-    gender_col = cols["Gender"]
+    def __init__(self, start: int, canon: str, rows: List[int]):
+        self.start = start
+        self.canon = canon
+        self.rows = rows
+        self.occupied: Dict[int, str] = {}      # строка -> пол ("" если не указан)
+        self.free: List[int] = []               # свободные строки по порядку
 
-    if type_col is None or last_col is None or gender_col is None:
-        raise RuntimeError("Не нашли нужные колонки (Type of room / Last Name / Gender)")
+    def gender_key(self) -> Optional[str]:
+        """None — в комнате ещё нет пола, "M"/"F" — один пол, "*" — смешанная."""
+        genders = {g for g in self.occupied.values() if g}
+        if not genders:
+            return None
+        return next(iter(genders)) if len(genders) == 1 else "*"
 
-    want_norm = normalize_room_type(room_type)
-    if not want_norm:
-        return None
 
-    r = header_row + 1
+class RoomOccupancy:
+    """
+    Занятость комнат одного пакета [r0, r1) — то же правило, что у прежнего
+    построчного обхода (первая подходящая комната сверху, пол комнаты не смешиваем),
+    но без пересканирования блока:
+      (тип комнаты, пол комнаты) -> упорядоченный список комнат со свободными местами.
+    Строится один раз по данным, дальше обновляется по одной строке (set_row).
+    """
 
-    while r < r1:
-        row = data[r]
-        cell_type = row[type_col] if type_col < len(row) else ""
-        rt_norm = normalize_room_type(cell_type)
+    def __init__(self, data, r0: int, r1: int):
+        self.data = data
+        self.lock = threading.Lock()
+        self.r0 = r0
+        self.r1 = r1
+        self.header_row, self.cols = find_header_and_cols(data, r0, r1)
+
+        for name in ("Type of room", "Last Name", "Gender"):
+            if self.cols[name] is None:
+                raise RuntimeError("Не нашли нужные колонки (Type of room / Last Name / Gender)")
+
+        self.rooms: Dict[int, _Room] = {}           # первая строка комнаты -> комната
+        self.room_of: Dict[int, _Room] = {}         # любая строка комнаты -> комната
+        # тип -> {пол комнаты -> [первые строки комнат со свободными местами]}
+        self.free_by_type: Dict[str, Dict[Optional[str], List[int]]] = {}
+
+        type_col = self.cols["Type of room"]
+        r = self.header_row + 1
+        while r < r1:
+            canon = normalize_room_type(_cell(data[r], type_col))
+            if not canon:
+                r += 1
+                continue
 
-        if not rt_norm:
-            r += 1
-            continue
+            room = _Room(r, canon, list(range(r, min(r + ROOM_SIZE[canon], r1))))
+            self.rooms[r] = room
+            for rr in room.rows:
+                self.room_of[rr] = room
+                self._read_row(room, rr, data[rr])
+            self._link(room)
+            r += ROOM_SIZE[canon]
+
+    # ---------- внутреннее ----------
+
+    def _read_row(self, room: _Room, row_idx: int, row: List[str]) -> None:
+        if _cell(row, self.cols["Last Name"]):
+            room.occupied[row_idx] = _cell(row, self.cols["Gender"]).upper()
+            if row_idx in room.free:
+                room.free.remove(row_idx)
+        else:
+            room.occupied.pop(row_idx, None)
+            if row_idx not in room.free:
+                bisect.insort(room.free, row_idx)
+
+    def _link(self, room: _Room) -> None:
+        if room.free:
+            bisect.insort(self.free_by_type.setdefault(room.canon, {}).setdefault(room.gender_key(), []), room.start)
+
+    def _unlink(self, room: _Room) -> None:
+        starts = self.free_by_type.get(room.canon, {}).get(room.gender_key())
+        if starts and room.start in starts:
+            starts.remove(room.start)
+
+    # ---------- API ----------
+
+    def find(self, payload: Dict[str, str]) -> Optional[int]:
+        """Строка (0-based) первого свободного места для payload или None."""
+        want = normalize_room_type((payload.get("Type of room") or "").strip())
+        if not want:
+            return None
+        gender = (payload.get("Gender") or "").strip().upper()
+
+        with self.lock:
+            by_gender = self.free_by_type.get(want, {})
+            if gender:
+                lists = [by_gender.get(gender), by_gender.get(None)]
+            else:
+                lists = list(by_gender.values())
+
+            heads = [starts[0] for starts in lists if starts]
+            if not heads:
+                return None
+            return self.rooms[min(heads)].free[0]
+
+    def set_row(self, row_idx: int, row: List[str]) -> bool:
+        """
+        Строка пакета изменилась (записали паломника / очистили место).
+        False — изменилась разметка (шапка или тип комнаты), индекс надо пересобрать.
+        """
+        if row_idx <= self.header_row:
+            return False
+
+        canon = normalize_room_type(_cell(row, self.cols["Type of room"]))
+        room = self.room_of.get(row_idx)
+        if room is None:
+            return canon is None
+        if row_idx == room.start and canon != room.canon:
+            return False
+
+        with self.lock:
+            self._unlink(room)
+            self._read_row(room, row_idx, row)
+            self._link(room)
+        return True
+
+
+# (spreadsheet_id, ws_title, r0) -> RoomOccupancy, привязан к объекту данных из sheet_cache
+_OCCUPANCY: "OrderedDict[Tuple[str, str, int], RoomOccupancy]" = OrderedDict()
+_OCC_LOCK = threading.Lock()
+
+
+def package_occupancy(key: Tuple[str, str], data, r0: int, r1: int) -> RoomOccupancy:
+    """Индекс занятости пакета для этих данных: из памяти или строим один раз."""
+    with _OCC_LOCK:
+        occ = _OCCUPANCY.get(key + (r0,))
+        if occ is None or occ.data is not data or occ.r1 != r1:
+            occ = RoomOccupancy(data, r0, r1)
+            _OCCUPANCY[key + (r0,)] = occ
+        _OCCUPANCY.move_to_end(key + (r0,))
+        while len(_OCCUPANCY) > SHEET_CACHE_MAX_BLOCKS:
+            _OCCUPANCY.popitem(last=False)
+        return occ
+
+
+def drop_occupancy(key: Tuple[str, str]) -> None:
+    """Забыть индексы занятости листа (например, после неудачной записи)."""
+    with _OCC_LOCK:
+        for k in [k for k in _OCCUPANCY if k[:2] == key]:
+            del _OCCUPANCY[k]
+
+
+def _on_row_update(key, values, row_idx: int, old_height: int) -> None:
+    """Write-through из sheet_cache: поправить занятость одной комнаты, не пересканируя пакет."""
+    with _OCC_LOCK:
+        for k, occ in list(_OCCUPANCY.items()):
+            if k[:2] != key or occ.data is not values or not (occ.r0 <= row_idx < occ.r1):
+                continue
+            if len(values) != old_height or not occ.set_row(row_idx, values[row_idx]):
+                del _OCCUPANCY[k]
 
-        room_size = ROOM_SIZE[rt_norm]
 
-        # если тип комнаты не наш, пропускаем весь блок этой комнаты
-        if rt_norm != want_norm:
-            r += room_size
-            continue
+sheet_cache.add_row_listener(_on_row_update)
 
-        room_rows = list(range(r, min(r + room_size, r1)))
-
-        # смотрим, кто уже живёт в комнате
-        existing_genders = set()
-        for rr in room_rows:
-            row_rr = data[rr]
-            ln = row_rr[last_col] if last_col < len(row_rr) else ""
-            gd = row_rr[gender_col] if gender_col < len(row_rr) else ""
-            if ln.strip():
-                if gd.strip():
-                    existing_genders.add(gd.strip().upper())
-
-        # если в комнате уже стоит пол, а наш другой – не берём эту комнату
-        if existing_genders:
-            if gender and existing_genders != {gender}:
-                r += room_size
-                continue
 
-        # ищем свободное место (пустой Last Name)
-        for rr in room_rows:
-            row_rr = data[rr]
-            ln = row_rr[last_col] if last_col < len(row_rr) else ""
-            if not str(ln).strip():
-                return rr, cols
+def find_free_slot_auto(ws, pkg_row: int, payload: Dict[str, str]) -> Optional[Tuple[int, Dict[str, int]]]:
+    """
+    НАЙТИ СВОБОДНОЕ МЕСТО ДЛЯ ПАЛОМНИКА ВНУТРИ ПАКЕТА (произвольное размещение)
+    Возвращает:
+        (row_index, cols_dict) — row_index это индекс строки (0-based) в get_all_values()
+    Если места нет → None
+    """
+    if not (payload.get("Type of room") or "").strip():
+        return None
 
-        r += room_size
+    # только строки этого пакета: из снимка, если он в кэше, иначе — чтением диапазона
+    r0, r1, data = package_blocks(ws, [pkg_row])[pkg_row]
+    occ = package_occupancy(sheet_cache.ws_key(ws), data, r0, r1)
+    row_idx = occ.find(payload)
+    return (row_idx, occ.cols) if row_idx is not None else None
 
-    return None
+
+@timed("parse_seconds")
+def find_free_slot_in(data, r0: int, r1: int, payload: Dict[str, str]) -> Optional[Tuple[int, Dict[str, int]]]:
+    """
+    То же, что find_free_slot_auto, но по уже прочитанным строкам пакета [r0, r1)
+    (без кэша индекса). data[r][c] — абсолютные индексы (снимок, RowWindow и т.п.).
+    """
+    if not (payload.get("Type of room") or "").strip():
+        return None
+    occ = RoomOccupancy(data, r0, r1)
+    row_idx = occ.find(payload)
+    return (row_idx, occ.cols) if row_idx is not None else None
+
+
+class _RoomPlan:
+    """Состояние комнаты на время расчёта распределения (исходный индекс не трогаем)."""
+    __slots__ = ("start", "canon", "free", "gender", "occupied")
+
+    def __init__(self, room: _Room):
+        self.start = room.start
+        self.canon = room.canon
+        self.free = list(room.free)
+        self.gender = room.gender_key()
+        self.occupied = bool(room.occupied)
+
+
+@timed("parse_seconds")
+def allocate_package(
+        occ: RoomOccupancy,
+        payloads: List[Dict[str, str]],
+        *,
+        pkg_title: Optional[str] = None,
+        families: Optional[List[Optional[str]]] = None,
+) -> List[Optional[int]]:
+    """
+    Распределение всех заявок пакета сразу (вместо «первая подходящая комната» по одной).
+    Цель — как можно меньше полупустых комнат:
+      1) сначала добиваем частично занятые комнаты (с наименьшим числом свободных мест),
+      2) потом заселяем пустые комнаты целиком,
+      3) остаток — в комнату, где он помещается плотнее всего.
+    Пол комнаты не смешиваем, тип комнаты — как в заявке. Если у заявки указан пакет
+    (families[i]) другой семьи, чем пакет листа (см. same_family), — не размещаем.
+    Возвращает row_idx (0-based) для каждой заявки или None.
+    """
+    result: List[Optional[int]] = [None] * len(payloads)
+    pkg_family = canon_family(pkg_title)
+
+    # (тип, пол) -> индексы заявок; сначала группы с полом — им выбор комнат уже
+    groups: "OrderedDict[Tuple[str, str], List[int]]" = OrderedDict()
+    for i, p in enumerate(payloads):
+        canon = normalize_room_type((p.get("Type of room") or "").strip())
+        if not canon:
+            continue
+        family = canon_family(families[i]) if families and families[i] else None
+        if family and pkg_family and not same_family(family, pkg_family):
+            print(f"⚠️ Заявка {i + 1}: пакет «{families[i]}» не из семьи «{pkg_title}» — не размещаем")
+            continue
+        gender = (p.get("Gender") or "").strip().upper()
+        groups.setdefault((canon, gender), []).append(i)
+
+    with occ.lock:
+        plans = [_RoomPlan(room) for room in occ.rooms.values() if room.free]
+
+    for (canon, gender), idxs in sorted(groups.items(), key=lambda kv: kv[0][1] == ""):
+        rooms = [
+            rp for rp in plans
+            if rp.canon == canon and (not gender or rp.gender in (None, gender))
+        ]
+        queue = list(idxs)
+
+        while queue:
+            rooms = [rp for rp in rooms if rp.free]
+            if not rooms:
+                break
+
+            fits = [rp for rp in rooms if len(rp.free) <= len(queue)]
+            if fits:
+                # комнату можно закрыть полностью: частично занятые — первыми
+                room = min(fits, key=lambda rp: (not rp.occupied, len(rp.free), rp.start))
+            else:
+                # остаток меньше любой комнаты: туда, где останется меньше пустых мест
+                room = min(rooms, key=lambda rp: (not rp.occupied, len(rp.free), rp.start))
+
+            take = min(len(room.free), len(queue))
+            for _ in range(take):
+                result[queue.pop(0)] = room.free.pop(0)
+            room.occupied = True
+            if gender and room.gender is None:
+                room.gender = gender
+
+    return result
 
 
 def build_row_values_from_payload(
@@ -0,0 +1,151 @@
+# pligrim_bot/core/sheets_gateway.py
+# Асинхронный шлюз к Google Sheets: синхронный gspread крутится в ограниченном пуле потоков,
+# чтобы один медленный запрос не останавливал polling для всех менеджеров.
+# Очередь к пулу — по приоритету: запись размещения обгоняет чтение меню.
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from pligrim_bot.config.constants import SHEETS_WORKERS, SHEETS_CALL_TIMEOUT
+from pligrim_bot.core import metrics
+from pligrim_bot.core.sheets_quota import PRI_READ, SheetsBusyError, priority as sheets_priority
+
+
+class SheetsTimeoutError(RuntimeError):
+    """Google Sheets не ответил за SHEETS_CALL_TIMEOUT секунд."""
+
+
+# что показать менеджеру, когда Google не отвечает или не даёт квоту
+SHEETS_BUSY_TEXT = "Google перегружен ⏳\nПопробуйте ещё раз через минуту."
+SHEETS_BUSY_ERRORS = (SheetsBusyError, SheetsTimeoutError)
+
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=SHEETS_WORKERS, thread_name_prefix="sheets")
+
+_LOCK = threading.Lock()
+_STATS = {
+    "queued": 0,        # ждут свободного потока
+    "running": 0,       # выполняются прямо сейчас
+    "max_queued": 0,
+    "done": 0,
+    "failed": 0,
+    "timeouts": 0,
+    "busy_seconds": 0.0,
+}
+
+
+class _PriorityGate:
+    """
+    Не больше SHEETS_WORKERS задач в пуле одновременно; освободившийся поток
+    достаётся ждущей задаче с наименьшим priority (при равенстве — кто раньше пришёл).
+    Живёт в одном event loop; release() зовётся из loop (call_soon_threadsafe).
+    """
+
+    def __init__(self, slots: int):
+        self.free = slots
+        self._waiters: list = []        # heap [(priority, seq, future)]
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int) -> None:
+        if self.free > 0 and not self._waiters:
+            self.free -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # место уже успели отдать нам — возвращаем его следующему
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.free += 1
+
+
+_GATE = _PriorityGate(SHEETS_WORKERS)
+
+
+def _release_from_thread(loop: asyncio.AbstractEventLoop) -> None:
+    try:
+        loop.call_soon_threadsafe(_GATE.release)
+    except RuntimeError:
+        # loop уже закрыт (остановка бота) — ждать места больше некому
+        pass
+
+
+def _inc(name: str, value=1) -> None:
+    with _LOCK:
+        _STATS[name] += value
+        if name == "queued" and _STATS["queued"] > _STATS["max_queued"]:
+            _STATS["max_queued"] = _STATS["queued"]
+
+
+async def run_sheets(fn: Callable[..., Any], *args, timeout: float | None = None,
+                     priority: int = PRI_READ, **kwargs) -> Any:
+    """
+    Выполняет синхронную функцию с вызовами gspread в пуле потоков.
+    priority — см. sheets_quota (PRI_WRITE / PRI_READ / PRI_BACKGROUND): и место в очереди
+    к пулу, и место в очереди за квотой Google.
+    Кидает SheetsTimeoutError, если ответа нет дольше timeout (по умолчанию SHEETS_CALL_TIMEOUT),
+    SheetsBusyError — если Google не дал квоту и после повторов.
+    """
+    timeout = SHEETS_CALL_TIMEOUT if timeout is None else timeout
+    fn_name = getattr(fn, "__name__", "call")
+
+    def job():
+        _inc("running")
+        started = time.monotonic()
+        try:
+            with sheets_priority(priority), metrics.timer("sheets_gateway_seconds", fn=fn_name, stage="run"):
+                return fn(*args, **kwargs)
+        finally:
+            _inc("running", -1)
+            _inc("busy_seconds", time.monotonic() - started)
+
+    async def call():
+        _inc("queued")
+        try:
+            with metrics.timer("sheets_gateway_seconds", fn=fn_name, stage="queue"):
+                await _GATE.acquire(priority)
+        finally:
+            _inc("queued", -1)
+
+        loop = asyncio.get_running_loop()
+        try:
+            cf = _EXECUTOR.submit(job)
+        except BaseException:
+            _GATE.release()
+            raise
+        # поток освобождается, только когда функция реально закончилась (даже после нашего таймаута)
+        cf.add_done_callback(lambda f: _release_from_thread(loop))
+        return await asyncio.wrap_future(cf)
+
+    try:
+        result = await asyncio.wait_for(call(), timeout)
+    except asyncio.TimeoutError:
+        _inc("timeouts")
+        raise SheetsTimeoutError(f"{getattr(fn, '__name__', fn)}: нет ответа за {timeout:g} c")
+    except Exception:
+        _inc("failed")
+        raise
+
+    _inc("done")
+    return result
+
+
+def gateway_stats() -> dict:
+    """Глубина очереди и загрузка пула — для логов и метрик."""
+    with _LOCK:
+        return {**_STATS, "workers": SHEETS_WORKERS}
@@ -0,0 +1,271 @@
+# pligrim_bot/core/sheets_quota.py
+# Квота Google Sheets API: ведро токенов на сервисный аккаунт и на каждую таблицу,
+# приоритеты (запись паломника раньше чтения меню) и повтор с разбросом при 429/5xx.
+#
+# Подключается как http_client gspread (см. settings.get_google_client), поэтому
+# через лимитер проходит каждый запрос к Sheets, откуда бы его ни позвали.
+
+import contextlib
+import contextvars
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterator, Tuple
+
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+from pligrim_bot.config.constants import (
+    BOT_WORKERS,
+    SHEETS_BACKOFF_BASE,
+    SHEETS_BACKOFF_MAX,
+    SHEETS_CALL_TIMEOUT,
+    SHEETS_MAX_RETRIES,
+    SHEETS_QUOTA_BURST,
+    SHEETS_READS_PER_MIN,
+    SHEETS_SHEET_READS_PER_MIN,
+    SHEETS_SHEET_WRITES_PER_MIN,
+    SHEETS_WRITES_PER_MIN,
+)
+from pligrim_bot.core import metrics
+
+
+class SheetsBusyError(RuntimeError):
+    """Google не дал квоту (429) или отвечал 5xx и после всех повторов — «Google перегружен»."""
+
+
+# Приоритеты: меньше — раньше
+PRI_WRITE = 0          # запись размещения
+PRI_READ = 5           # меню и чтение по кнопке менеджера
+PRI_BACKGROUND = 9     # фоновый прогрев кэша
+
+_PRIORITY: contextvars.ContextVar[int] = contextvars.ContextVar("sheets_priority", default=PRI_READ)
+
+_RETRY_CODES = {408, 429, 500, 502, 503, 504}
+_SPREADSHEET_RX = re.compile(r"/spreadsheets/([^/:?]+)")
+# что за запрос — для метрик: values:batchGet, batchUpdate, drive.files ...
+_API_OP_RX = re.compile(r"/spreadsheets/[^/:?]+(/values)?.*?(?::(append|clear|batch\w+|get\w*))?(?:\?|$)")
+# POST-запросы, которые на самом деле чтение
+_READ_POSTS = (":batchGetByDataFilter", ":getByDataFilter")
+
+_SEQ = itertools.count()
+_LOCK = threading.Lock()
+_STATS = {"requests": 0, "retries": 0, "throttled": 0, "server_errors": 0, "gave_up": 0}
+
+
+@contextlib.contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Все запросы к Sheets внутри блока идут с этим приоритетом."""
+    token = _PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def current_priority() -> int:
+    return _PRIORITY.get()
+
+
+class TokenBucket:
+    """
+    Ведро на per_min запросов в минуту с запасом burst.
+    Когда токенов нет, ждущие потоки получают их по приоритету (затем по очереди прихода).
+    """
+
+    def __init__(self, name: str, per_min: float, burst: int):
+        self.name = name
+        self.per_min = per_min
+        self.rate = per_min / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters: list = []        # heap [(priority, seq)]
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, level: int, deadline: float) -> None:
+        """Взять токен до deadline (time.monotonic) — иначе SheetsBusyError."""
+        started = time.monotonic()
+        with self._cond:
+            me = (level, next(_SEQ))
+            heapq.heappush(self._waiters, me)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    first = self._waiters[0] is me
+                    if first and self.tokens >= 1:
+                        self.tokens -= 1
+                        heapq.heappop(self._waiters)
+                        self._cond.notify_all()
+                        break
+                    if now >= deadline:
+                        raise SheetsBusyError(f"квота {self.name}: нет свободного запроса")
+                    # первому — ждать ровно до следующего токена, остальным — пока их не разбудят
+                    pause = (1 - self.tokens) / self.rate if first else deadline - now
+                    self._cond.wait(max(0.01, min(pause, deadline - now)))
+            except BaseException:
+                self._waiters.remove(me)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+
+        waited = time.monotonic() - started
+        self.acquired += 1
+        if waited > 0.01:
+            self.waited += 1
+            self.wait_seconds += waited
+
+    def penalize(self, seconds: float) -> None:
+        """Google сказал 429 — на seconds никто из ведра не ходит."""
+        with self._cond:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "per_min": self.per_min,
+                "headroom": round(max(self.tokens, 0.0), 2),    # сколько запросов можно сделать сразу
+                "capacity": self.capacity,
+                "waiting": len(self._waiters),
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
+
+
+# (scope, id, "read" | "write") -> TokenBucket; scope — "account" или "sheet"
+_BUCKETS: Dict[Tuple[str, str, str], TokenBucket] = {}
+
+
+def _per_process(per_min: float) -> float:
+    # квота общая на все процессы-воркеры — каждому своя доля
+    return per_min / max(1, BOT_WORKERS)
+
+
+def _bucket(scope: str, ident: str, kind: str) -> TokenBucket:
+    key = (scope, ident, kind)
+    with _LOCK:
+        bucket = _BUCKETS.get(key)
+        if bucket is None:
+            if scope == "account":
+                per_min = SHEETS_READS_PER_MIN if kind == "read" else SHEETS_WRITES_PER_MIN
+            else:
+                per_min = SHEETS_SHEET_READS_PER_MIN if kind == "read" else SHEETS_SHEET_WRITES_PER_MIN
+            bucket = _BUCKETS[key] = TokenBucket(f"{scope}:{ident}:{kind}", _per_process(per_min), SHEETS_QUOTA_BURST)
+        return bucket
+
+
+def _inc(name: str) -> None:
+    with _LOCK:
+        _STATS[name] += 1
+
+
+def api_op(method: str, endpoint: str) -> str:
+    """Короткое имя запроса без id таблицы и диапазона — метка для метрик."""
+    if "sheets.googleapis.com" not in endpoint:
+        return "drive.files" if "/drive/" in endpoint else "other"
+    m = _API_OP_RX.search(endpoint)
+    if m is None:
+        return method.lower()
+    values, action = m.groups()
+    if values:
+        return f"values:{action}" if action else f"values.{method.lower()}"
+    return action or f"spreadsheet.{method.lower()}"
+
+
+def backoff_delay(attempt: int) -> float:
+    """Экспоненциальная пауза с разбросом ±50%, чтобы воркеры не били в Google хором."""
+    return min(SHEETS_BACKOFF_MAX, SHEETS_BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+
+class QuotaHTTPClient(HTTPClient):
+    """HTTPClient gspread: перед каждым запросом к Sheets — токены из вёдер, на 429/5xx — повтор."""
+
+    def __init__(self, auth, session=None) -> None:
+        super().__init__(auth, session)
+        self.account = getattr(auth, "service_account_email", None) or "default"
+
+    def _buckets(self, method: str, endpoint: str):
+        if "sheets.googleapis.com" not in endpoint:
+            return ()       # Drive (openall и т.п.) — другая квота
+        kind = "read" if method.upper() == "GET" or endpoint.endswith(_READ_POSTS) else "write"
+        buckets = [_bucket("account", self.account, kind)]
+        m = _SPREADSHEET_RX.search(endpoint)
+        if m:
+            buckets.insert(0, _bucket("sheet", m.group(1), kind))
+        return buckets
+
+    def request(self, method, endpoint, *args, **kwargs):
+        buckets = self._buckets(method, endpoint)
+        level = current_priority()
+        deadline = time.monotonic() + SHEETS_CALL_TIMEOUT
+        op = api_op(method, endpoint)
+
+        attempt = 0
+        while True:
+            if buckets:
+                with metrics.timer("sheets_quota_wait_seconds", op=op):
+                    for bucket in buckets:
+                        bucket.acquire(level, deadline)
+            _inc("requests")
+            started = time.perf_counter()
+            try:
+                result = super().request(method, endpoint, *args, **kwargs)
+            except APIError as e:
+                code = e.code if isinstance(e.code, int) else getattr(e.response, "status_code", 0)
+                metrics.observe("sheets_api_seconds", time.perf_counter() - started, op=op, status=str(code))
+                if code not in _RETRY_CODES:
+                    raise
+                _inc("throttled" if code == 429 else "server_errors")
+
+                delay = backoff_delay(attempt)
+                attempt += 1
+                if attempt > SHEETS_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                    _inc("gave_up")
+                    raise SheetsBusyError(f"Google Sheets перегружен ({code}): {e}") from e
+
+                _inc("retries")
+                print(f"⏳ Sheets {code}, повтор #{attempt} через {delay:.1f} c")
+                if code == 429 and buckets:
+                    # пауза через вёдра: притормаживают все потоки, а первым после неё пойдёт запись
+                    for bucket in buckets:
+                        bucket.penalize(delay)
+                else:
+                    time.sleep(delay)
+            except Exception:
+                metrics.observe("sheets_api_seconds", time.perf_counter() - started, op=op, status="error")
+                raise
+            else:
+                metrics.observe("sheets_api_seconds", time.perf_counter() - started, op=op, status="ok")
+                return result
+
+
+def read_headroom() -> float | None:
+    """Наименьший запас чтений среди вёдер сервисных аккаунтов (None — запросов ещё не было)."""
+    with _LOCK:
+        buckets = [b for (scope, _, kind), b in _BUCKETS.items() if scope == "account" and kind == "read"]
+    if not buckets:
+        return None
+    return min(b.snapshot()["headroom"] for b in buckets)
+
+
+def quota_stats() -> dict:
+    """Запас квоты по вёдрам и счётчики повторов — для логов и метрик."""
+    with _LOCK:
+        buckets = list(_BUCKETS.values())
+        stats = dict(_STATS)
+    stats["buckets"] = {b.name: b.snapshot() for b in buckets}
+    return stats
@@ -0,0 +1,70 @@
+# pligrim_bot/core/utils/alias_matcher.py
+# Поиск алиасов (города, типы пакетов, типы комнат) за один проход по строке.
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+
+def any_substring_rx(tokens, flags=0) -> re.Pattern:
+    """
+    Одна регулярка «есть ли в строке хоть один из токенов» — вместо any(tok in s for tok in tokens).
+    Длинные токены первыми; пустой токен совпадает с любой строкой, как и "" in s.
+    """
+    toks = sorted({str(t) for t in tokens}, key=len, reverse=True)
+    return re.compile("|".join(re.escape(t) for t in toks) or r"(?!)", flags)
+
+
+@lru_cache(maxsize=256)
+def any_of(keywords: Tuple[str, ...]) -> re.Pattern:
+    """any_substring_rx с кэшем по кортежу ключевых слов (для row_has_any и т.п.)."""
+    return any_substring_rx(keywords)
+
+
+class AliasMatcher:
+    """
+    Таблица {канон: [алиасы]} → одна регулярка.
+    Смысл тот же, что у цикла
+        for canon, variants in table.items():
+            if any(v in text for v in variants): return canon
+    т.е. побеждает канон, который раньше в таблице (порядок ключей — приоритет),
+    где бы в строке ни стоял его алиас. Совпадения ищутся с перекрытием
+    (lookahead), поэтому «niyet/10d» не прячет «niyet» и наоборот.
+    """
+
+    def __init__(self, table: Dict[str, Iterable[str]]):
+        self.keys = list(table)
+        groups = []
+        first_chars = set()
+        for i, key in enumerate(self.keys):
+            variants = sorted({str(v) for v in table[key]}, key=len, reverse=True)
+            if not variants:
+                continue
+            if "" in variants:
+                first_chars = None          # пустой алиас совпадает в любой позиции
+            elif first_chars is not None:
+                first_chars.update(v[0] for v in variants)
+            groups.append(f"(?P<k{i}>{'|'.join(re.escape(v) for v in variants)})")
+
+        # быстрый фильтр позиций по первой букве алиасов
+        prefix = f"(?=[{''.join(re.escape(ch) for ch in sorted(first_chars))}])" if first_chars else ""
+        self._rx = re.compile(f"{prefix}(?=(?:{'|'.join(groups) or '(?!)'}))")
+        self.match = lru_cache(maxsize=4096)(self._match)
+
+    def _match(self, text: str) -> Optional[Tuple[str, int, int]]:
+        """(канон, начало, конец) лучшего по приоритету алиаса в строке или None."""
+        best = None
+        for m in self._rx.finditer(text):
+            i = int(m.lastgroup[1:])
+            if best is None or i < best[0]:
+                best = (i, m.start(), m.end(m.lastgroup))
+                if i == 0:
+                    break
+        if best is None:
+            return None
+        return self.keys[best[0]], best[1], best[2]
+
+    def canon(self, text: str, default: Optional[str] = None) -> Optional[str]:
+        """Только канон (или default, если ни один алиас не встретился)."""
+        found = self.match(text)
+        return found[0] if found else default
@@ -1,23 +1,68 @@
-from datetime import datetime
 import re
 from datetime import datetime
+from functools import lru_cache
 
 from pligrim_bot.config.constants import DATE_ANY, DATE_ISO, DATE_RE
 
+# Один и тот же десяток дат («05/11/2025», «12.10.2025») при проходе по листу разбирается
+# тысячи раз — регулярки компилируем один раз, разобранные строки держим в LRU.
+_DATE_CACHE_SIZE = 4096
+
+_START_DDMM_RX = re.compile(r'(\d{2}\.\d{2})-\d{2}\.\d{2}')
+_DDMM_PAIR_RX = re.compile(r'(\d{1,2})[.\-/](\d{1,2}).*?[–—-].*?(\d{1,2})[.\-/](\d{1,2})')
+_YEAR_RX = re.compile(r'(20\d{2})')
+
+
+@lru_cache(maxsize=_DATE_CACHE_SIZE)
+def parse_dmy(s: str, sep: str = "/") -> datetime | None:
+    """
+    «dd/mm/yyyy» (или с другим sep) → datetime, иначе None.
+    То же, что strptime(s, f"%d{sep}%m{sep}%Y"), но без strptime: разбор руками,
+    strptime — только для редких строк, которые быстрый путь не понял (пробелы и т.п.).
+    """
+    parts = s.split(sep)
+    if len(parts) == 3:
+        d, m, y = parts
+        # только ASCII-цифры: strptime «٣» или «²» тоже не примет
+        if (0 < len(d) <= 2 and 0 < len(m) <= 2 and len(y) == 4
+                and s.isascii() and d.isdigit() and m.isdigit() and y.isdigit()):
+            try:
+                return datetime(int(y), int(m), int(d))
+            except ValueError:
+                return None
+    try:
+        return datetime.strptime(s, f"%d{sep}%m{sep}%Y")
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=_DATE_CACHE_SIZE)
+def _nights(d1: str, d2: str) -> int | None:
+    a, b = parse_dmy(d1), parse_dmy(d2)
+    if a is None or b is None:
+        return None
+    return max(0, (b - a).days)
+
+
+def nights(d1: str, d2: str) -> int | None:
+    """Ночей между «dd/mm/yyyy» и «dd/mm/yyyy» (не меньше 0) или None."""
+    if not isinstance(d1, str) or not isinstance(d2, str):
+        return None
+    return _nights(d1, d2)
+
 
 def extract_start_date(title):
 
-    date_match = re.search(r'(\d{2}\.\d{2})-\d{2}\.\d{2}', title)
+    date_match = _START_DDMM_RX.search(title)
     if date_match:
         start_date_str = date_match.group(1) + f".{datetime.now().year}"
-        try:
-            return datetime.strptime(start_date_str, "%d.%m.%Y")
-        except:
-            return datetime.min
+        return parse_dmy(start_date_str, ".") or datetime.min
     return datetime.min
 
-def as_ddmmYYYY_pair(text: str) -> tuple[str|None, str|None]:
-    m = DATE_ANY.findall(text or "")
+
+@lru_cache(maxsize=_DATE_CACHE_SIZE)
+def _ddmmYYYY_pair(text: str) -> tuple[str|None, str|None]:
+    m = DATE_ANY.findall(text)
     if len(m) >= 2:
         def mk_dmY(t):
             d,m,y = t
@@ -25,7 +70,7 @@ def as_ddmmYYYY_pair(text: str) -> tuple[str|None, str|None]:
             return f"{d.zfill(2)}/{m.zfill(2)}/{y}"
         return mk_dmY(m[0]), mk_dmY(m[1])
 
-    m2 = DATE_ISO.findall(text or "")
+    m2 = DATE_ISO.findall(text)
     if len(m2) >= 2:
         def mk_iso(t):
             y,m,d = t
@@ -33,24 +78,30 @@ def as_ddmmYYYY_pair(text: str) -> tuple[str|None, str|None]:
         return mk_iso(m2[0]), mk_iso(m2[1])
     return None, None
 
+def as_ddmmYYYY_pair(text: str) -> tuple[str|None, str|None]:
+    return _ddmmYYYY_pair(text or "")
+
 def _pick_ddmm_pair_from_title(title: str):
-    m = re.search(r'(\d{1,2})[.\-/](\d{1,2}).*?[–—-].*?(\d{1,2})[.\-/](\d{1,2})', title or "")
+    m = _DDMM_PAIR_RX.search(title or "")
     if not m:
         return None, None
     d1, m1, d2, m2 = m.groups()
     return (int(d1), int(m1)), (int(d2), int(m2))
 
+@lru_cache(maxsize=512)
+def _ddmm_rx(dd: str, mm: str) -> re.Pattern:
+    # варианты: 29/10, 29.10, 29-10, 29/10/2025 и т.п.
+    return re.compile(rf'(?<!\d){dd}[./-]{mm}(?:[./-]\d{{2,4}})?(?!\d)')
+
 def _row_has_ddmm(row_join: str, dd: str, mm: str) -> bool:
     """
     Проверяет, встречается ли в строке дата с этим днём и месяцем
     (любой разделитель, год опционален).
     """
-    # варианты: 29/10, 29.10, 29-10, 29/10/2025 и т.п.
-    pat = rf'(?<!\d){dd}[./-]{mm}(?:[./-]\d{{2,4}})?(?!\d)'
-    return re.search(pat, row_join) is not None
+    return _ddmm_rx(dd, mm).search(row_join) is not None
 
 def _year_from_sheet(ws) -> int:
-    m = re.search(r'(20\d{2})', ws.spreadsheet.title + " " + ws.title)
+    m = _YEAR_RX.search(ws.spreadsheet.title + " " + ws.title)
     return int(m.group(1)) if m else datetime.now().year
 
 def _anchors_from_title(title: str, ws):
@@ -65,13 +116,15 @@ def _anchors_from_title(title: str, ws):
     return start, end
 
 def _parse_start_end(when: str):
-    try:
-        a, b = [x.strip() for x in (when or "").split("–")]
-        d1 = datetime.strptime(a, "%d/%m/%Y")
-        d2 = datetime.strptime(b, "%d/%m/%Y")
-        return d1, d2
-    except Exception:
+    if when is not None and not isinstance(when, str):
+        return None, None
+    parts = [x.strip() for x in (when or "").split("–")]
+    if len(parts) != 2:
         return None, None
+    d1, d2 = parse_dmy(parts[0]), parse_dmy(parts[1])
+    if d1 is None or d2 is None:
+        return None, None
+    return d1, d2
 
 def to_ddmmyyyy(m):
     d, mth, y = m
@@ -93,44 +146,41 @@ def two_dates_in_row(cells):
     return None, None
 
 def nights_ddmmyyyy_with_slash(d1, d2):
-    from datetime import datetime
-    try:
-        a = datetime.strptime(d1, "%d/%m/%Y")
-        b = datetime.strptime(d2, "%d/%m/%Y")
-        return max(0, (b - a).days)
-    except Exception:
-        return None
+    return nights(d1, d2)
 
 def _parse_start_date(when: str):
     """Возвращает datetime начала периода DD/MM/YYYY – DD/MM/YYYY."""
-    if not when:
-        return None
-    try:
-        a = when.split("–")[0].strip()
-        return datetime.strptime(a, "%d/%m/%Y")
-    except Exception:
+    if not when or not isinstance(when, str):
         return None
+    return parse_dmy(when.split("–")[0].strip())
 
-def norm_date_str(s: str) -> str | None:
-    """Любую 5.11.25 / 05.11.2025 / 05/11/25 → 05.11.2025"""
-    m = DATE_RE.search(s or "")
+@lru_cache(maxsize=_DATE_CACHE_SIZE)
+def _norm_dmy(s: str) -> str | None:
+    m = DATE_RE.search(s)
     if not m:
         return None
     d, mth, y = m.groups()
     y = ("20" + y) if len(y) == 2 else y
     return f"{d.zfill(2)}.{mth.zfill(2)}.{y}"
 
+def norm_date_str(s: str) -> str | None:
+    """Любую 5.11.25 / 05.11.2025 / 05/11/25 → 05.11.2025"""
+    return _norm_dmy(s or "")
+
 def norm_date(val: str) -> str | None:
     if not isinstance(val, str):
         val = str(val or "")
-    s = val.strip()
-    m = DATE_RE.search(s)
-    if not m:
-        return None
-    d, mth, y = m.groups()
-    y = f"20{y}" if len(y) == 2 else y
-    return f"{d.zfill(2)}.{mth.zfill(2)}.{y}"
+    return _norm_dmy(val.strip())
 
 def year_from_title(title: str) -> int | None:
-    m = re.search(r"(20\d{2})", title)
+    m = _YEAR_RX.search(title)
     return int(m.group(1)) if m else None
+
+def date_cache_stats() -> dict:
+    """Попадания в LRU разобранных дат — для /metrics."""
+    out = {}
+    for name, fn in (("parse_dmy", parse_dmy), ("nights", _nights), ("norm_date", _norm_dmy),
+                     ("date_pair", _ddmmYYYY_pair)):
+        info = fn.cache_info()
+        out[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return out
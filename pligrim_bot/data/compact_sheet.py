@@ -0,0 +1,143 @@
+# pligrim_bot/data/compact_sheet.py
+# Компактный снимок листа для sheet_cache. В get_all_values() одни и те же строки повторяются
+# тысячи раз (пустые ячейки, DBL/TRPL, HB, отели, менеджеры) — храним каждую один раз
+# в таблице строк листа, а ячейки — номерами в ней, по колонкам (array, 2–4 байта на ячейку).
+# Снаружи снимок выглядит как list[list[str]]: len(data), data[r][c], срезы, обход строк.
+
+import sys
+from array import array
+from itertools import zip_longest
+from typing import Iterable, Iterator, List
+
+_MAX_SHORT_ID = 0xFFFF  # пока строк в таблице меньше — номера в array("H")
+
+
+class RowView(tuple):
+    """
+    Строка снимка только для чтения — tuple из строк таблицы листа.
+    С list сравнивается и складывается как list, чтобы старый код вида
+    row == [...] или row + [""] * n работал без изменений.
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if isinstance(other, list):
+            return tuple.__eq__(self, tuple(other))
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = tuple.__hash__
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class CompactSheet:
+    """
+    Снимок листа: strings — таблица строк листа (strings[0] == ""),
+    columns[c][r] — номер строки таблицы в ячейке (r, c), widths[r] — длина строки r
+    (строки «рваные», как у get_all_values() после write-through).
+    Менять — только целыми строками: data[r] = row и append(row) (их зовёт sheet_cache.update_row).
+    """
+
+    __slots__ = ("strings", "_ids", "columns", "widths")
+
+    def __init__(self, values: Iterable[List[str]] = ()):
+        # номер строки = порядок первого появления; dict помнит порядок — он же таблица строк
+        self._ids = {"": 0}
+        put = self._ids.setdefault
+        row_ids = [[put(cell, len(self._ids)) for cell in row] for row in values]
+        self.strings: List[str] = list(self._ids)
+
+        code = self._typecode()
+        # строки → колонки (короткие строки добиваем номером "")
+        self.columns: List[array] = [array(code, col) for col in zip_longest(*row_ids, fillvalue=0)]
+        self.widths = array("H", map(len, row_ids))
+
+    # ---------- чтение ----------
+
+    def __len__(self) -> int:
+        return len(self.widths)
+
+    def __getitem__(self, r):
+        if isinstance(r, slice):
+            return [self._row(i) for i in range(*r.indices(len(self.widths)))]
+        if r < 0:
+            r += len(self.widths)
+        if not 0 <= r < len(self.widths):
+            raise IndexError("индекс строки вне снимка")
+        return self._row(r)
+
+    def __iter__(self) -> Iterator[RowView]:
+        for r in range(len(self.widths)):
+            yield self._row(r)
+
+    def _row(self, r: int) -> RowView:
+        cols = self.columns
+        if self.widths[r] != len(cols):
+            cols = cols[:self.widths[r]]
+        strings = self.strings
+        return RowView([strings[col[r]] for col in cols])
+
+    @property
+    def width(self) -> int:
+        """Длина самой длинной строки (как max(len(row)) у списка строк)."""
+        return max(self.widths, default=0)
+
+    # ---------- запись целой строки ----------
+
+    def __setitem__(self, r: int, row: List[str]) -> None:
+        if r < 0:
+            r += len(self.widths)
+        if not 0 <= r < len(self.widths):
+            raise IndexError("индекс строки вне снимка")
+        ids = [self._intern(cell) for cell in row]
+        self._ensure(len(ids))
+        for c, col in enumerate(self.columns):
+            col[r] = ids[c] if c < len(ids) else 0
+        self.widths[r] = len(ids)
+
+    def append(self, row: List[str]) -> None:
+        ids = [self._intern(cell) for cell in row]
+        self._ensure(len(ids))
+        for c, col in enumerate(self.columns):
+            col.append(ids[c] if c < len(ids) else 0)
+        self.widths.append(len(ids))
+
+    # ---------- внутреннее ----------
+
+    def _intern(self, cell) -> int:
+        i = self._ids.get(cell)
+        if i is None:
+            i = self._ids[cell] = len(self.strings)
+            self.strings.append(cell)
+        return i
+
+    def _typecode(self) -> str:
+        return "H" if len(self.strings) <= _MAX_SHORT_ID else "I"
+
+    def _ensure(self, width: int) -> None:
+        """Новые строки таблицы могли не влезть в 2 байта, строка могла стать шире листа."""
+        code = self._typecode()
+        if self.columns and self.columns[0].typecode != code:
+            self.columns = [array(code, col) for col in self.columns]
+        height = len(self.widths)
+        while len(self.columns) < width:
+            self.columns.append(array(code, bytes(array(code).itemsize * height)))
+
+    def nbytes(self) -> int:
+        """Сколько памяти держит снимок (массивы + таблица строк), приблизительно."""
+        total = sys.getsizeof(self.strings) + sys.getsizeof(self._ids) + sys.getsizeof(self.widths)
+        total += sum(sys.getsizeof(s) for s in self.strings)
+        total += sum(sys.getsizeof(col) for col in self.columns)
+        return total
@@ -0,0 +1,135 @@
+# pligrim_bot/data/shared_cache.py
+# Общий для процессов-воркеров уровень кэша листов (L2) в SQLite-файле.
+#
+# У каждого процесса свой sheet_cache в памяти (L1). Здесь:
+#   * снимки листов — воркер, которому лист нужен позже, не качает его из Google заново;
+#   * поколение листа — любая запись/сброс в одном процессе увеличивает его,
+#     и остальные процессы выбрасывают свою копию вместо того, чтобы жить со старой до TTL;
+#   * межпроцессный замок записи в лист (flock), поверх потокового замка placement_writer.
+# Выключено, пока бот работает одним процессом (SHEET_CACHE_SHARED=0).
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from pligrim_bot.config.constants import SHEET_CACHE_SHARED, SHEET_CACHE_SHARED_FILE, STATE_DIR
+
+try:
+    import fcntl
+except ImportError:         # Windows: межпроцессного замка нет, только потоковый
+    fcntl = None
+
+_LOCK = threading.Lock()
+_DB: Optional[sqlite3.Connection] = None
+
+LOCKS_DIR = os.path.join(STATE_DIR, "locks")
+
+
+def enabled() -> bool:
+    return SHEET_CACHE_SHARED
+
+
+def _db() -> sqlite3.Connection:
+    """Соединение открывается лениво — в процессе, который им пользуется (не до fork)."""
+    global _DB
+    if _DB is None:
+        os.makedirs(os.path.dirname(SHEET_CACHE_SHARED_FILE) or ".", exist_ok=True)
+        db = sqlite3.connect(SHEET_CACHE_SHARED_FILE, timeout=10, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS gens (key TEXT PRIMARY KEY, gen INTEGER NOT NULL)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            " key TEXT PRIMARY KEY, gen INTEGER NOT NULL, fetched_at REAL NOT NULL, body TEXT NOT NULL)"
+        )
+        _DB = db
+    return _DB
+
+
+def _k(key: Tuple[str, str]) -> str:
+    return f"{key[0]}|{key[1]}"
+
+
+def generation(key: Tuple[str, str]) -> int:
+    """Текущее поколение листа (0 — ещё ни разу не менялся)."""
+    with _LOCK:
+        row = _db().execute("SELECT gen FROM gens WHERE key = ?", (_k(key),)).fetchone()
+    return row[0] if row else 0
+
+
+def bump(key: Tuple[str, str]) -> int:
+    """Лист изменился: новое поколение, снимок в L2 больше не годится. Возвращает новое поколение."""
+    with _LOCK:
+        db = _db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "INSERT INTO gens(key, gen) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET gen = gen + 1",
+                (_k(key),),
+            )
+            db.execute("DELETE FROM snapshots WHERE key = ?", (_k(key),))
+            gen = db.execute("SELECT gen FROM gens WHERE key = ?", (_k(key),)).fetchone()[0]
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+    return gen
+
+
+def bump_spreadsheet(spreadsheet_id: str | None = None) -> None:
+    """Новое поколение для всех листов таблицы (или вообще всех, без аргумента)."""
+    like = f"{spreadsheet_id}|%" if spreadsheet_id else "%"
+    with _LOCK:
+        db = _db()
+        db.execute("UPDATE gens SET gen = gen + 1 WHERE key LIKE ?", (like,))
+        db.execute("DELETE FROM snapshots WHERE key LIKE ?", (like,))
+
+
+def load(key: Tuple[str, str], ttl: float) -> Optional[Tuple[List[List[str]], int, float]]:
+    """(снимок, поколение, возраст в сек) из L2, если он не старше ttl и не устарел по поколению."""
+    with _LOCK:
+        row = _db().execute(
+            "SELECT s.body, s.gen, s.fetched_at, COALESCE(g.gen, 0) "
+            "FROM snapshots s LEFT JOIN gens g ON g.key = s.key WHERE s.key = ?",
+            (_k(key),),
+        ).fetchone()
+    if row is None:
+        return None
+    body, gen, fetched_at, current = row
+    age = time.time() - fetched_at
+    if gen != current or age >= ttl:
+        return None
+    return json.loads(body), gen, age
+
+
+def store(key: Tuple[str, str], values: List[List[str]], gen: int) -> None:
+    """Положить снимок, скачанный при поколении gen (если лист за это время поменялся — не кладём)."""
+    body = json.dumps(values, ensure_ascii=False)
+    with _LOCK:
+        _db().execute(
+            "INSERT INTO snapshots(key, gen, fetched_at, body) "
+            "SELECT ?, ?, ?, ? WHERE ? = COALESCE((SELECT gen FROM gens WHERE key = ?), 0) "
+            "ON CONFLICT(key) DO UPDATE SET gen = excluded.gen, fetched_at = excluded.fetched_at, body = excluded.body",
+            (_k(key), gen, time.time(), body, gen, _k(key)),
+        )
+
+
+@contextlib.contextmanager
+def write_lock(key: Tuple[str, str]) -> Iterator[None]:
+    """Замок записи в лист между процессами (flock на файле в STATE_DIR/locks)."""
+    if not enabled() or fcntl is None:
+        yield
+        return
+    os.makedirs(LOCKS_DIR, exist_ok=True)
+    name = hashlib.sha1(_k(key).encode("utf-8")).hexdigest()[:16]
+    with open(os.path.join(LOCKS_DIR, f"{name}.lock"), "a+") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,400 @@
+# pligrim_bot/data/sheet_cache.py
+# Общий кэш снимков листов: один get_all_values() на лист вместо трёх на каждое размещение.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pligrim_bot.config.constants import (
+    SHEET_CACHE_TTL,
+    SHEET_CACHE_MAX_SHEETS,
+    SHEET_CACHE_MAX_BLOCKS,
+    SHEET_CACHE_MAX_AGE,
+    SHEET_CACHE_COMPACT,
+    SHEET_CHANGE_DETECTION,
+)
+from pligrim_bot.data import shared_cache, sheet_revisions
+from pligrim_bot.data.compact_sheet import CompactSheet
+
+
+class RowWindow:
+    """
+    Кусок листа — строки [start, start + len(rows)), но адресуется абсолютными
+    индексами как полный снимок: window[r][c]. len() — как у снимка до конца куска,
+    поэтому циклы вида range(a, min(b, len(data))) работают без изменений.
+    """
+
+    def __init__(self, start: int, rows: List[List[str]]):
+        self.start = start
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return self.start + len(self.rows)
+
+    def __getitem__(self, r: int) -> List[str]:
+        if r < self.start:
+            raise IndexError(f"строка {r} вне куска [{self.start}, {len(self)})")
+        return self.rows[r - self.start]
+
+    def __setitem__(self, r: int, row: List[str]) -> None:
+        self.rows[r - self.start] = row
+
+
+# (spreadsheet_id, ws_title) -> {"values": CompactSheet | list[list[str]], "fetched_at": float, "gen": int,
+#                               "revision": str | None, "downloaded_at": float}
+# gen — поколение листа в shared_cache (при нескольких воркерах), иначе всегда 0;
+# revision — ревизия таблицы в Drive не новее той, при которой скачан снимок (см. sheet_revisions);
+# fetched_at продлевается при сверке ревизии, downloaded_at — время настоящего скачивания
+_CACHE: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+_LOCK = threading.RLock()
+
+# (spreadsheet_id, ws_title, r0, r1) -> {"window": RowWindow, "fetched_at": float, "gen": int,
+#                                         "revision": str | None, "downloaded_at": float}
+# Куски листа, прочитанные диапазоном (один пакет), когда весь лист качать незачем.
+_BLOCKS: "OrderedDict[Tuple[str, str, int, int], dict]" = OrderedDict()
+
+# по одному замку на лист, чтобы параллельные промахи не качали лист дважды
+_FETCH_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+
+_STATS = {"hits": 0, "misses": 0, "evictions": 0, "row_updates": 0, "block_hits": 0, "block_misses": 0,
+          "shared_hits": 0, "revalidated": 0}
+
+# Подписчики на write-through: fn(key, values, row_idx, old_height) — производные структуры
+# (индекс пакетов и т.п.) обновляются по одной строке, а не пересчитываются целиком.
+# values — снимок листа или RowWindow куска, в который попала строка.
+_ROW_LISTENERS: List[Callable] = []
+
+
+def ws_key(ws) -> Tuple[str, str]:
+    """Ключ кэша для листа: (id таблицы, название листа)."""
+    spreadsheet_id = getattr(ws, "spreadsheet_id", None) or ws.spreadsheet.id
+    return spreadsheet_id, ws.title
+
+
+def _fetch_lock(key: Tuple[str, str]) -> threading.Lock:
+    with _LOCK:
+        lock = _FETCH_LOCKS.get(key)
+        if lock is None:
+            lock = _FETCH_LOCKS[key] = threading.Lock()
+        return lock
+
+
+def _generation(key: Tuple[str, str]) -> int:
+    """Поколение листа: меняется, когда лист записал/сбросил любой процесс. Один процесс — всегда 0."""
+    return shared_cache.generation(key) if shared_cache.enabled() else 0
+
+
+def _fresh(entry: dict | None, ttl: float, gen: int = 0) -> bool:
+    return entry is not None and entry["gen"] == gen and (time.monotonic() - entry["fetched_at"]) < ttl
+
+
+def _compact(values: List[List[str]]):
+    """Снимок в том виде, в каком держим его в памяти (SHEET_CACHE_COMPACT)."""
+    if SHEET_CACHE_COMPACT and not isinstance(values, CompactSheet):
+        return CompactSheet(values)
+    return values
+
+
+def _store(key: Tuple[str, str], values: List[List[str]], gen: int = 0, age: float = 0.0,
+           revision: Optional[str] = None) -> List[List[str]]:
+    """Кладёт снимок в кэш; возвращает то, что легло (компактный снимок, если включён)."""
+    values = _compact(values)
+    with _LOCK:
+        fetched_at = time.monotonic() - age
+        _CACHE[key] = {"values": values, "fetched_at": fetched_at, "gen": gen,
+                       "revision": revision, "downloaded_at": fetched_at}
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > SHEET_CACHE_MAX_SHEETS:
+            old_key, _ = _CACHE.popitem(last=False)
+            _FETCH_LOCKS.pop(old_key, None)
+            _STATS["evictions"] += 1
+    return values
+
+
+def _lookup(key: Tuple[str, str], ttl: float, gen: int | None = None) -> Optional[List[List[str]]]:
+    if gen is None:
+        gen = _generation(key)
+    with _LOCK:
+        entry = _CACHE.get(key)
+        if not _fresh(entry, ttl, gen):
+            return None
+        _CACHE.move_to_end(key)
+        return entry["values"]
+
+
+def _revision_now(ws, ttl: float) -> Optional[str]:
+    """
+    Ревизия таблицы перед скачиванием — из памяти sheet_revisions, если проверяли недавно
+    (None — сверка выключена, недоступна или чтение мимо кэша, ttl=0).
+    Ревизия старее настоящей безопасна: максимум лишнее скачивание, но не старые данные.
+    """
+    if not SHEET_CHANGE_DETECTION or ttl <= 0:
+        return None
+    return sheet_revisions.current(ws)
+
+
+def _revalidate(ws, entry: dict | None, gen: int) -> bool:
+    """
+    Снимок/кусок протух по TTL, но таблица с тех пор не менялась — продлеваем его
+    одним запросом метаданных вместо скачивания. True — продлили.
+    """
+    if not SHEET_CHANGE_DETECTION or entry is None or entry["gen"] != gen or entry["revision"] is None:
+        return False
+    if time.monotonic() - entry["downloaded_at"] >= SHEET_CACHE_MAX_AGE:
+        return False
+    if sheet_revisions.current(ws) != entry["revision"]:
+        return False
+    with _LOCK:
+        entry["fetched_at"] = time.monotonic()
+    _STATS["revalidated"] += 1
+    return True
+
+
+def _revalidate_snapshot(ws, key: Tuple[str, str], gen: int) -> Optional[List[List[str]]]:
+    with _LOCK:
+        entry = _CACHE.get(key)
+    if not _revalidate(ws, entry, gen):
+        return None
+    with _LOCK:
+        if key in _CACHE:
+            _CACHE.move_to_end(key)
+    return entry["values"]
+
+
+def get_values(ws, *, ttl: float | None = None) -> List[List[str]]:
+    """
+    Снимок листа как в ws.get_all_values(), но из кэша, пока он не старше TTL.
+    ВАЖНО: возвращается общий объект — менять его можно только через update_row().
+    При SHEET_CACHE_COMPACT это CompactSheet: data[r][c] и обход — как у списка, строки только для чтения.
+    """
+    ttl = SHEET_CACHE_TTL if ttl is None else ttl
+    key = ws_key(ws)
+
+    values = _lookup(key, ttl)
+    if values is not None:
+        _STATS["hits"] += 1
+        return values
+
+    with _fetch_lock(key):
+        # пока ждали замок, лист мог скачать соседний поток
+        values = _lookup(key, ttl)
+        if values is not None:
+            _STATS["hits"] += 1
+            return values
+
+        gen = _generation(key)
+        if ttl > 0:
+            # таблица не менялась с прошлого скачивания — хватит запроса метаданных
+            values = _revalidate_snapshot(ws, key, gen)
+            if values is not None:
+                return values
+
+        # соседний процесс мог уже скачать этот лист
+        if shared_cache.enabled() and ttl > 0:
+            shared = shared_cache.load(key, ttl)
+            if shared is not None:
+                values, gen, age = shared
+                _STATS["shared_hits"] += 1
+                return _store(key, values, gen, age)
+
+        _STATS["misses"] += 1
+        revision = _revision_now(ws, ttl)
+        values = ws.get_all_values()
+        if shared_cache.enabled():
+            shared_cache.store(key, values, gen)
+        return _store(key, values, gen, revision=revision)
+
+
+def _a1_rows(r0: int, r1: int) -> str:
+    """0-based [r0, r1) → A1-диапазон целых строк, например '28:54'."""
+    return f"{r0 + 1}:{r1}"
+
+
+def get_blocks(ws, spans: List[Tuple[int, int]], *, ttl: float | None = None) -> Dict[Tuple[int, int], RowWindow]:
+    """
+    Несколько кусков листа [r0, r1) за ОДИН запрос values:batchGet.
+    Если полный снимок листа уже в кэше — отдаём его, в Google не ходим.
+    """
+    ttl = SHEET_CACHE_TTL if ttl is None else ttl
+    key = ws_key(ws)
+    gen = _generation(key)
+
+    values = _lookup(key, ttl, gen)
+    if values is None and ttl > 0:
+        values = _revalidate_snapshot(ws, key, gen)
+    if values is not None:
+        _STATS["hits"] += 1
+        return {span: values for span in spans}
+
+    result: Dict[Tuple[int, int], RowWindow] = {}
+    missing: List[Tuple[int, int]] = []
+    stale: Dict[Tuple[int, int], dict] = {}
+    with _LOCK:
+        for span in spans:
+            entry = _BLOCKS.get(key + span)
+            if _fresh(entry, ttl, gen):
+                _BLOCKS.move_to_end(key + span)
+                result[span] = entry["window"]
+                _STATS["block_hits"] += 1
+            elif span not in missing:
+                missing.append(span)
+                if entry is not None:
+                    stale[span] = entry
+
+    # протухшие куски: одна сверка ревизии на всю таблицу
+    if ttl > 0:
+        for span, entry in stale.items():
+            if _revalidate(ws, entry, gen):
+                result[span] = entry["window"]
+                missing.remove(span)
+
+    if not missing:
+        return result
+
+    _STATS["block_misses"] += len(missing)
+    revision = _revision_now(ws, ttl)
+    ranges = ws.batch_get([_a1_rows(r0, r1) for r0, r1 in missing])
+
+    with _LOCK:
+        for (r0, r1), got in zip(missing, ranges):
+            rows = [list(r) for r in got]
+            # Google обрезает пустые строки в конце диапазона — добиваем до нужной высоты
+            rows += [[] for _ in range(r1 - r0 - len(rows))]
+            window = RowWindow(r0, _compact(rows))
+            now = time.monotonic()
+            _BLOCKS[key + (r0, r1)] = {"window": window, "fetched_at": now, "gen": gen,
+                                       "revision": revision, "downloaded_at": now}
+            _BLOCKS.move_to_end(key + (r0, r1))
+            result[(r0, r1)] = window
+        while len(_BLOCKS) > SHEET_CACHE_MAX_BLOCKS:
+            _BLOCKS.popitem(last=False)
+
+    return result
+
+
+def peek(ws) -> Optional[List[List[str]]]:
+    """Снимок из кэша без похода в Google (или None, если его нет / протух)."""
+    return _lookup(ws_key(ws), SHEET_CACHE_TTL)
+
+
+def age(ws) -> Optional[float]:
+    """Сколько секунд снимку листа в кэше (None — снимка нет). Для фонового прогрева."""
+    with _LOCK:
+        entry = _CACHE.get(ws_key(ws))
+        return None if entry is None else time.monotonic() - entry["fetched_at"]
+
+
+def update_row(ws, row_idx: int, row_values: List[str]) -> None:
+    """
+    Write-through: после ws.update() кладём записанную строку прямо в снимок,
+    чтобы следующее чтение не перекачивало лист. row_idx — 0-based.
+    """
+    key = ws_key(ws)
+    # лист поменялся: остальные процессы выбросят свои копии при следующем чтении
+    new_gen = shared_cache.bump(key) if shared_cache.enabled() else 0
+    touched = []        # [(values, old_height)] — куски и снимок, куда легла строка
+    with _LOCK:
+        for (sid, title, r0, r1), block in _BLOCKS.items():
+            if (sid, title) != key:
+                continue
+            _advance_gen(block, new_gen)
+            if r0 <= row_idx < r1:
+                window = block["window"]
+                window[row_idx] = _merge_row(row_values, window[row_idx])
+                touched.append((window, len(window)))
+
+        entry = _CACHE.get(key)
+        if entry is not None:
+            _advance_gen(entry, new_gen)
+            values = entry["values"]
+            old_height = len(values)
+            width = values.width if isinstance(values, CompactSheet) else max((len(r) for r in values), default=0)
+            while len(values) <= row_idx:
+                values.append([""] * width)
+
+            values[row_idx] = _merge_row(row_values, values[row_idx])
+            touched.append((values, old_height))
+            _STATS["row_updates"] += 1
+
+    # подписчиков зовём уже без замка кэша, чтобы их собственные замки не пересекались с нашим
+    for values, old_height in touched:
+        for fn in _ROW_LISTENERS:
+            fn(key, values, row_idx, old_height)
+
+
+def _advance_gen(entry: dict, new_gen: int) -> None:
+    """
+    Наша копия видела лист до этой записи — после неё она актуальна для нового поколения.
+    Если между ними писал другой процесс (поколение прыгнуло больше чем на 1), копию не трогаем:
+    она устарела и будет перечитана.
+    """
+    if entry["gen"] == new_gen - 1:
+        entry["gen"] = new_gen
+
+
+def _merge_row(row_values: List[str], old_row: List[str]) -> List[str]:
+    """Записанные ячейки поверх старой строки (хвост старой строки сохраняем)."""
+    row = list(row_values)
+    if len(row) < len(old_row):
+        row += old_row[len(row):]
+    return row
+
+
+def add_row_listener(fn: Callable) -> None:
+    """Подписаться на update_row(): fn(key, values, row_idx, old_height)."""
+    if fn not in _ROW_LISTENERS:
+        _ROW_LISTENERS.append(fn)
+
+
+def invalidate(ws=None, *, spreadsheet_id: str | None = None, ws_title: str | None = None) -> None:
+    """
+    Сбросить снимок одного листа (ws или spreadsheet_id + ws_title), всей таблицы
+    (spreadsheet_id) или всё целиком (без аргументов).
+    """
+    key = ws_key(ws) if ws is not None else None
+    if key is None and spreadsheet_id is not None and ws_title is not None:
+        key = (spreadsheet_id, ws_title)
+
+    if shared_cache.enabled():
+        if key is not None:
+            shared_cache.bump(key)
+        else:
+            shared_cache.bump_spreadsheet(spreadsheet_id)
+    with _LOCK:
+        if key is not None:
+            _CACHE.pop(key, None)
+            for bkey in [k for k in _BLOCKS if k[:2] == key]:
+                del _BLOCKS[bkey]
+            return
+        if spreadsheet_id is not None:
+            for key in [k for k in _CACHE if k[0] == spreadsheet_id]:
+                del _CACHE[key]
+            for bkey in [k for k in _BLOCKS if k[0] == spreadsheet_id]:
+                del _BLOCKS[bkey]
+            return
+        _CACHE.clear()
+        _BLOCKS.clear()
+
+
+def cache_stats() -> dict:
+    """Счётчики попаданий/промахов — для отладки и метрик."""
+    with _LOCK:
+        stats = {**_STATS, "sheets": len(_CACHE), "blocks": len(_BLOCKS)}
+        # сколько памяти держат компактные снимки листов (см. compact_sheet)
+        stats["snapshot_bytes"] = sum(e["values"].nbytes() for e in _CACHE.values()
+                                      if isinstance(e["values"], CompactSheet))
+    # доля чтений без похода в Google: попадания в L1/L2 и продлённые по ревизии снимки
+    served = stats["hits"] + stats["shared_hits"] + stats["revalidated"]
+    stats["hit_ratio"] = round(served / max(1, served + stats["misses"]), 4)
+    blocks = stats["block_hits"] + stats["block_misses"]
+    stats["block_hit_ratio"] = round(stats["block_hits"] / max(1, blocks), 4)
+    return stats
+
+
+def _on_sheet_changed(spreadsheet_id: str, ws_title: str | None) -> None:
+    invalidate(spreadsheet_id=spreadsheet_id, ws_title=ws_title)
+
+
+# push-уведомления «таблица изменилась» сбрасывают снимки сразу, не дожидаясь TTL
+sheet_revisions.add_change_listener(_on_sheet_changed)
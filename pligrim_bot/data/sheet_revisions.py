@@ -0,0 +1,98 @@
+# pligrim_bot/data/sheet_revisions.py
+# Ревизия таблицы из Drive (version + modifiedTime) — дешёвый запрос метаданных.
+# sheet_cache сверяет её с ревизией, при которой скачан снимок: не поменялась —
+# продлеваем снимок без get_all_values().
+#
+# Ревизия общая на файл: правка любого листа таблицы сбрасывает все её листы.
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from gspread.urls import DRIVE_FILES_API_V3_URL
+
+from pligrim_bot.config.constants import SHEET_REVISION_CHECK_TTL
+
+_LOCK = threading.Lock()
+# spreadsheet_id -> {"revision": str, "checked_at": float}
+_REVISIONS: Dict[str, dict] = {}
+_STATS = {"checks": 0, "cached": 0, "errors": 0, "pushes": 0}
+
+# Подписчики на push-уведомления: fn(spreadsheet_id, ws_title | None)
+_CHANGE_LISTENERS: List[Callable] = []
+
+
+def _spreadsheet_id(ws) -> str:
+    return getattr(ws, "spreadsheet_id", None) or ws.spreadsheet.id
+
+
+def fetch_revision(ws) -> Optional[str]:
+    """Ревизия файла таблицы прямо из Drive; None — узнать нельзя (нет http-клиента, ошибка)."""
+    http = getattr(ws, "client", None)
+    if http is None or not hasattr(http, "request"):
+        return None
+    res = http.request(
+        "get",
+        f"{DRIVE_FILES_API_V3_URL}/{_spreadsheet_id(ws)}",
+        params={"fields": "version,modifiedTime", "supportsAllDrives": True},
+    )
+    meta = res.json()
+    return f"{meta.get('version')}|{meta.get('modifiedTime')}"
+
+
+def current(ws, *, max_age: float = SHEET_REVISION_CHECK_TTL) -> Optional[str]:
+    """
+    Текущая ревизия таблицы. Листы одной таблицы делят проверку: за max_age секунд
+    в Drive ходим не больше одного раза. None — ревизию узнать не удалось.
+    """
+    sid = _spreadsheet_id(ws)
+    now = time.monotonic()
+    with _LOCK:
+        entry = _REVISIONS.get(sid)
+        if entry is not None and now - entry["checked_at"] < max_age:
+            _STATS["cached"] += 1
+            return entry["revision"]
+
+    try:
+        revision = fetch_revision(ws)
+    except Exception as e:
+        _STATS["errors"] += 1
+        print(f"⚠️ Не смогли узнать ревизию таблицы {sid}: {e}")
+        return None
+    if revision is None:
+        return None
+
+    _STATS["checks"] += 1
+    with _LOCK:
+        _REVISIONS[sid] = {"revision": revision, "checked_at": now}
+    return revision
+
+
+def forget(spreadsheet_id: str | None = None) -> None:
+    with _LOCK:
+        if spreadsheet_id is None:
+            _REVISIONS.clear()
+        else:
+            _REVISIONS.pop(spreadsheet_id, None)
+
+
+def add_change_listener(fn: Callable) -> None:
+    """Подписаться на notify_changed(): fn(spreadsheet_id, ws_title | None)."""
+    if fn not in _CHANGE_LISTENERS:
+        _CHANGE_LISTENERS.append(fn)
+
+
+def notify_changed(spreadsheet_id: str, ws_title: str | None = None) -> None:
+    """
+    Push-уведомление «таблица изменилась» (Drive push-канал, onEdit из Apps Script,
+    тестовая заглушка): ревизия забывается, подписчики сбрасывают свои снимки.
+    """
+    _STATS["pushes"] += 1
+    forget(spreadsheet_id)
+    for fn in list(_CHANGE_LISTENERS):
+        fn(spreadsheet_id, ws_title)
+
+
+def revision_stats() -> dict:
+    with _LOCK:
+        return {**_STATS, "spreadsheets": len(_REVISIONS)}
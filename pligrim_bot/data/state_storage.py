@@ -0,0 +1,217 @@
+# pligrim_bot/data/state_storage.py
+# Где живут состояния диалогов (FSM) и временные словари превью.
+#
+# MemoryStorage теряет все начатые брони при рестарте и растёт без предела.
+# Здесь: ограниченный словарь с TTL (для PREVIEW_CACHE / EDIT_STATE) и
+# FSM-хранилище в локальном SQLite-файле — переживает рестарт, общий для
+# нескольких процессов на одной машине. Для нескольких машин — Redis.
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+
+class TTLMap(MutableMapping):
+    """
+    dict с ограничением: запись живёт ttl секунд с последней записи,
+    сверх maxsize выбрасываются самые давние. Потокобезопасен.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Any, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float) -> None:
+        # записи упорядочены по времени записи — протухшие всегда в начале
+        while self._items:
+            key, (_, expires_at) = next(iter(self._items.items()))
+            if expires_at > now:
+                break
+            self._items.popitem(last=False)
+
+    def __getitem__(self, key):
+        with self._lock:
+            value, expires_at = self._items[key]
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                raise KeyError(key)
+            return value
+
+    def __setitem__(self, key, value) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._items[key] = (value, now + self.ttl)
+            self._items.move_to_end(key)
+            self._purge(now)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __delitem__(self, key) -> None:
+        with self._lock:
+            del self._items[key]
+
+    def __iter__(self) -> Iterator:
+        with self._lock:
+            self._purge(time.monotonic())
+            return iter(list(self._items))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge(time.monotonic())
+            return len(self._items)
+
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def _check_payload(value: Any, path: str = "data") -> None:
+    """
+    Данные FSM уходят в JSON — пропускаем только то, что вернётся из него тем же:
+    str / int / float / bool / None, list и dict со строковыми ключами.
+    Кортеж стал бы списком, ключ-число — строкой, а дата — строкой через str().
+    """
+    if isinstance(value, _JSON_SCALARS):
+        return
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            _check_payload(item, f"{path}[{i}]")
+        return
+    if isinstance(value, dict):
+        for k, item in value.items():
+            if not isinstance(k, str):
+                raise TypeError(f"{path}: ключ {k!r} не строка — в FSM только строковые ключи")
+            _check_payload(item, f"{path}[{k!r}]")
+        return
+    raise TypeError(f"{path}: {type(value).__name__} не сохранится в FSM как есть (только JSON-типы)")
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в SQLite-файле.
+    Состояние и данные пользователя — одна строка таблицы; запись старше ttl
+    считается пустой, сверх max_keys удаляются самые давно тронутые.
+    Файл в режиме WAL — несколько процессов бота могут работать с ним одновременно.
+    """
+
+    _PRUNE_EVERY = 100  # раз в столько записей подрезаем таблицу
+
+    def __init__(self, path: str, *, ttl: float, max_keys: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY,"
+            " state TEXT,"
+            " data TEXT NOT NULL DEFAULT '{}',"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS fsm_updated ON fsm(updated_at)")
+
+    # --- синхронная часть (в потоке) ---
+
+    def _read(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, data, updated_at FROM fsm WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[2] > self.ttl:
+            return None
+        return row
+
+    def _write(self, key: str, column: str, value: Optional[str]) -> None:
+        now = time.time()
+        with self._lock:
+            # протухшая запись не должна воскреснуть вместе со старым состоянием/данными
+            self._db.execute("DELETE FROM fsm WHERE key = ? AND updated_at < ?", (key, now - self.ttl))
+            self._db.execute(
+                f"INSERT INTO fsm(key, {column}, updated_at) VALUES (?, ?, ?) "
+                f"ON CONFLICT(key) DO UPDATE SET {column} = excluded.{column}, updated_at = excluded.updated_at",
+                (key, value, now),
+            )
+            self._writes += 1
+            if self._writes % self._PRUNE_EVERY == 0:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        """Удаляет протухшие записи и всё сверх max_keys. Зовётся под self._lock."""
+        self._db.execute("DELETE FROM fsm WHERE updated_at < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM fsm WHERE key IN ("
+            " SELECT key FROM fsm ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_keys,),
+        )
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await asyncio.to_thread(self._write, self.key_builder.build(key), "state", value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await asyncio.to_thread(self._read, self.key_builder.build(key))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        _check_payload(data)
+        raw = json.dumps(data, ensure_ascii=False)
+        await asyncio.to_thread(self._write, self.key_builder.build(key), "data", raw)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await asyncio.to_thread(self._read, self.key_builder.build(key))
+        return json.loads(row[1]) if row else {}
+
+    async def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def make_fsm_storage(kind: str, *, path: str, redis_url: str, ttl: float, max_keys: int) -> BaseStorage:
+    """
+    FSM-хранилище по имени: "memory" | "sqlite" | "redis".
+    Если Redis недоступен (нет пакета) — откатываемся на SQLite, а не падаем при старте.
+    """
+    kind = (kind or "memory").strip().lower()
+
+    if kind == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            print(f"⚠️ FSM_STORAGE=redis, но redis не установлен ({e}) — используем SQLite")
+            kind = "sqlite"
+        else:
+            print(f"🗄 FSM: Redis {redis_url}")
+            return RedisStorage.from_url(redis_url, state_ttl=int(ttl), data_ttl=int(ttl))
+
+    if kind == "sqlite":
+        print(f"🗄 FSM: SQLite {path}")
+        return SQLiteStorage(path, ttl=ttl, max_keys=max_keys)
+
+    if kind != "memory":
+        print(f"⚠️ Неизвестный FSM_STORAGE={kind!r} — используем память")
+    return MemoryStorage()
@@ -5,6 +5,7 @@ from aiogram.types import CallbackQuery
 
 from pligrim_bot.core.room_allocator import find_free_slot_auto, build_row_values_from_payload
 from pligrim_bot.config.settings import get_worksheet
+from pligrim_bot.data import sheet_cache
 
 @router.callback_query(F.data == "booking_place_auto")
 async def on_booking_place_auto(callback: CallbackQuery, state: FSMContext):
@@ -31,6 +32,7 @@ async def on_booking_place_auto(callback: CallbackQuery, state: FSMContext):
 
     # Обновляем одну строку (row_idx 0-based -> +1 для Google Sheets)
     ws.update(f"A{row_idx+1}", [row_values])
+    sheet_cache.update_row(ws, row_idx, row_values)
 
     await callback.message.answer("✅ Паломник успешно размещён в комнате (произвольно).")
     await callback.answer()
@@ -1,7 +1,11 @@
 # pligrim_bot/handlers/palm_booking_flow.py
 # Логика: /start → месяц → лист → пакет → ждём карточку → показываем разбор.
 
+import asyncio
 import logging
+import os
+import re
+import tempfile
 from typing import List, Dict
 
 from aiogram import Router, F
@@ -14,16 +18,23 @@ from aiogram.types import (
 )
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
+from pligrim_bot.config.constants import CHAT_IMPORT_MAX_CARDS
 from pligrim_bot.config.settings import get_worksheet
-from pligrim_bot.core.room_allocator import find_free_slot_auto, build_row_values_from_payload
+from pligrim_bot.core import metrics
+from pligrim_bot.core.placement_writer import place_booking, place_bookings
 
 from pligrim_bot.config.settings import PALM_SHEETS
 from pligrim_bot.core.google_sheets import get_palm_sheet_names
+from pligrim_bot.core.parsers.chat_import import import_chat_file
 from pligrim_bot.core.parsers.booking_parser import (
     parse_booking_card,
     build_sheet_row_payload,
+    split_cards,
 )
+from pligrim_bot.core.sheets_gateway import run_sheets, SheetsTimeoutError, SHEETS_BUSY_ERRORS, SHEETS_BUSY_TEXT
+from pligrim_bot.core.sheets_quota import PRI_WRITE, SheetsBusyError
 from pligrim_bot.core.utils.text_utils import safe_cb_text
+from pligrim_bot.core.utils.validation import canon_family, same_family
 
 
 logger = logging.getLogger(__name__)
@@ -36,6 +47,8 @@ class BookingStates(StatesGroup):
     choosing_gender = State()          # <- новый
     waiting_for_card_text = State()
     review = State()
+    review_bulk = State()              # несколько карточек в одном сообщении
+    bulk_gender = State()              # пол по номерам строк сводки
     editing_field = State()
     waiting_new_value = State()
 
@@ -84,6 +97,8 @@ def get_palm_sheet_buttons(month_key: str, show_all: bool = False) -> InlineKeyb
 
         return InlineKeyboardMarkup(inline_keyboard=rows)
 
+    except SheetsBusyError:
+        raise
     except Exception as e:
         logger.exception(f"Ошибка в get_palm_sheet_buttons: {e}")
         return InlineKeyboardMarkup(
@@ -115,8 +130,29 @@ def build_palm_packages_kb(month_key: str, ws_title: str, packages: List[Dict])
 
 # ========= Заглушка: позже подружим с package_parser =========
 from pligrim_bot.core.parsers.package_parser import find_palm_packages
+from pligrim_bot.core.package_index import get_package
 from pligrim_bot.config.settings import get_worksheet
 
+def _load_packages_sync(month_key: str, ws_title: str) -> list[dict]:
+    """Синхронная часть load_packages_for_sheet — выполняется в пуле sheets_gateway."""
+    # 1. Берём рабочий лист
+    ws = get_worksheet(month_key, ws_title)
+    if ws is None:
+        print("❌ Не найден worksheet:", month_key, ws_title)
+        return []
+
+    # 2. Ищем пакеты
+    return find_palm_packages(ws)
+
+
+def _get_package_sync(month_key: str, ws_title: str, pkg_row: int) -> dict | None:
+    """Пакет по строке шапки из индекса листа — выполняется в пуле sheets_gateway."""
+    ws = get_worksheet(month_key, ws_title)
+    if ws is None:
+        return None
+    return get_package(ws, pkg_row)
+
+
 async def load_packages_for_sheet(month_key: str, ws_title: str) -> list[dict]:
     """
     Реальный поиск пакетов на листе паломников.
@@ -125,14 +161,7 @@ async def load_packages_for_sheet(month_key: str, ws_title: str) -> list[dict]:
         [{"title": "...", "row": int}, ...]
     """
     try:
-        # 1. Берём рабочий лист
-        ws = get_worksheet(month_key, ws_title)
-        if ws is None:
-            print("❌ Не найден worksheet:", month_key, ws_title)
-            return []
-
-        # 2. Ищем пакеты
-        packages_raw = find_palm_packages(ws)
+        packages_raw = await run_sheets(_load_packages_sync, month_key, ws_title)
 
         # 3. Переводим в формат, который нужен клавиатуре
         packages = [
@@ -146,6 +175,8 @@ async def load_packages_for_sheet(month_key: str, ws_title: str) -> list[dict]:
         print(f"📦 Найдено пакетов: {len(packages)}")
         return packages
 
+    except SHEETS_BUSY_ERRORS:
+        raise
     except Exception as e:
         print(f"❌ Ошибка load_packages_for_sheet: {e}")
         return []
@@ -173,10 +204,21 @@ async def cb_back_months(callback: CallbackQuery):
     await callback.answer()
 
 
+async def sheets_busy(callback: CallbackQuery, where: str, error: Exception) -> None:
+    """Google не ответил / не дал квоту — говорим об этом, а не показываем пустое меню."""
+    print(f"⏳ {where}: {error}")
+    metrics.inc("sheets_busy_total", where=where)
+    await callback.answer(SHEETS_BUSY_TEXT, show_alert=True)
+
+
 @router.callback_query(F.data.startswith("palm_month:"))
 async def cb_palm_month(callback: CallbackQuery):
     month_key = callback.data.split(":", 1)[1]
-    kb = get_palm_sheet_buttons(month_key)
+    try:
+        kb = await run_sheets(get_palm_sheet_buttons, month_key)
+    except SHEETS_BUSY_ERRORS as e:
+        await sheets_busy(callback, "cb_palm_month", e)
+        return
     await callback.message.edit_text(f"Месяц: {month_key}\n\nВыберите вылет:", reply_markup=kb)
     await callback.answer()
 
@@ -184,7 +226,11 @@ async def cb_palm_month(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("palm_show_all:"))
 async def cb_show_all(callback: CallbackQuery):
     month_key = callback.data.split(":", 1)[1]
-    kb = get_palm_sheet_buttons(month_key, show_all=True)
+    try:
+        kb = await run_sheets(get_palm_sheet_buttons, month_key, show_all=True)
+    except SHEETS_BUSY_ERRORS as e:
+        await sheets_busy(callback, "cb_show_all", e)
+        return
     await callback.message.edit_text(f"Месяц: {month_key}\n\nВсе листы:", reply_markup=kb)
     await callback.answer()
 
@@ -192,7 +238,11 @@ async def cb_show_all(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("palm_sheet:"))
 async def cb_palm_sheet(callback: CallbackQuery):
     _, month_key, ws_title = callback.data.split(":", 2)
-    packages = await load_packages_for_sheet(month_key, ws_title)
+    try:
+        packages = await load_packages_for_sheet(month_key, ws_title)
+    except SHEETS_BUSY_ERRORS as e:
+        await sheets_busy(callback, "cb_palm_sheet", e)
+        return
 
     kb = build_palm_packages_kb(month_key, ws_title, packages)
     await callback.message.edit_text(
@@ -207,7 +257,11 @@ async def cb_palm_sheet(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("palm_back_to_sheets:"))
 async def cb_back_sheets(callback: CallbackQuery):
     month_key = callback.data.split(":", 1)[1]
-    kb = get_palm_sheet_buttons(month_key)
+    try:
+        kb = await run_sheets(get_palm_sheet_buttons, month_key)
+    except SHEETS_BUSY_ERRORS as e:
+        await sheets_busy(callback, "cb_back_sheets", e)
+        return
     await callback.message.edit_text(f"Месяц: {month_key}\n\nВыберите вылет:", reply_markup=kb)
     await callback.answer()
 
@@ -218,16 +272,17 @@ async def cb_palm_package(callback: CallbackQuery, state: FSMContext):
     _, month_key, ws_title, row_str = callback.data.split(":", 3)
     pkg_row = int(row_str)
 
-    # Подтягиваем название пакета по row
-    packages = await load_packages_for_sheet(month_key, ws_title)
-    pkg_title = None
-    for p in packages:
-        try:
-            if int(p.get("row")) == pkg_row:
-                pkg_title = p.get("title")
-                break
-        except Exception:
-            continue
+    # Подтягиваем название пакета по row — из индекса пакетов, без пересканирования листа
+    try:
+        pkg = await run_sheets(_get_package_sync, month_key, ws_title, pkg_row)
+    except SHEETS_BUSY_ERRORS as e:
+        # без названия пакета импорт чата не отфильтрует чужие карточки — не идём дальше
+        await sheets_busy(callback, "cb_palm_package", e)
+        return
+    except Exception as e:
+        print(f"❌ Ошибка получения пакета: {e}")
+        pkg = None
+    pkg_title = pkg["title"] if pkg else None
 
     print(f"🔎 Выбран пакет row={pkg_row}, title={pkg_title!r}")
 
@@ -286,11 +341,244 @@ def render_booking_preview_text(state_data: dict) -> str:
 
 # ========= ХЭНДЛЕР ПРИНЯТИЯ КАРТОЧКИ =========
 
+# сколько строк сводки показываем (сообщение Telegram — до 4096 символов)
+BULK_PREVIEW_LIMIT = 60
+
+
+def render_bulk_preview_text(state_data: dict) -> str:
+    payloads = state_data.get("bulk_payloads") or []
+    skipped = state_data.get("bulk_skipped") or 0
+
+    ws_title = state_data.get("ws_title") or "—"
+    pkg_title = state_data.get("pkg_title") or "—"
+
+    lines = [
+        f"📄 Лист: {ws_title}",
+        f"Пакет: {pkg_title}",
+        "",
+        f"👥 Карточек: {len(payloads)}",
+        "",
+    ]
+    for i, p in enumerate(payloads[:BULK_PREVIEW_LIMIT], 1):
+        name = f"{p.get('Last Name') or '—'} {p.get('First Name') or ''}".strip()
+        lines.append(f"{i}. {name} — {p.get('Type of room') or '—'}, {p.get('Gender') or '—'}")
+    if len(payloads) > BULK_PREVIEW_LIMIT:
+        lines.append(f"… и ещё {len(payloads) - BULK_PREVIEW_LIMIT}")
+    genders = {(p.get("Gender") or "").strip().upper() for p in payloads}
+    if len(payloads) > 1 and len(genders) == 1:
+        lines.append("")
+        lines.append(f"⚠️ У всех пол {genders.pop() or '—'}. Если группа смешанная — "
+                     f"нажмите «👥 Пол по номерам», иначе комнаты подберутся не тем.")
+    if skipped:
+        lines.append("")
+        lines.append(f"⚠️ Не разобрано карточек: {skipped}")
+    return "\n".join(lines)
+
+
+def booking_bulk_preview_kb(count: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"✅ Разместить всех ({count})",
+                    callback_data="booking_place_bulk"
+                )
+            ],
+            [
+                InlineKeyboardButton(
+                    text="👥 Пол по номерам",
+                    callback_data="bulk_gender"
+                )
+            ],
+            [
+                InlineKeyboardButton(
+                    text="❌ Отмена",
+                    callback_data="booking_cancel"
+                )
+            ],
+        ]
+    )
+
+
+async def process_bulk_cards(message: Message, state: FSMContext, cards: List[str]):
+    """Несколько карточек в одном сообщении: разбираем все и показываем одну сводку."""
+    bookings = [b for b in (parse_booking_card(card) for card in cards) if b]
+    await show_bulk_preview(message, state, bookings, skipped=len(cards) - len(bookings))
+
+
+async def show_bulk_preview(message: Message, state: FSMContext, bookings: List[dict], skipped: int = 0):
+    data = await state.get_data()
+    gender = data.get("gender")
+
+    payloads, families = [], []
+    for booking in bookings:
+        # выбранный пол — только тем, у кого пола ещё нет; смешанную группу
+        # менеджер правит в сводке («Пол по номерам»)
+        if gender and not booking.get("gender"):
+            booking["gender"] = gender
+        payloads.append(build_sheet_row_payload(booking))
+        families.append(booking.get("package_name") or None)
+
+    if not payloads:
+        await message.answer("Не могу разобрать карточки 😢\nПроверь формат.")
+        return
+
+    data.update(
+        bulk_payloads=payloads,
+        bulk_families=families,
+        bulk_skipped=skipped,
+    )
+    await state.set_data(data)
+
+    await message.answer(render_bulk_preview_text(data), reply_markup=booking_bulk_preview_kb(len(payloads)))
+    await state.set_state(BookingStates.review_bulk)
+
+
+_BULK_GENDER_RX = re.compile(r"([MFМЖ])\s*:?\s*([\d\s,\-–]+)", re.IGNORECASE)
+_GENDER_LETTERS = {"M": "M", "М": "M", "F": "F", "Ж": "F"}
+
+
+def parse_bulk_genders(text: str, count: int) -> Dict[int, str] | None:
+    """
+    «F 2 5 7-9» / «M 1-3, F 4-6» → {индекс строки (с 0): "M"/"F"}.
+    None — не разобрали или номер вне 1..count.
+    """
+    result: Dict[int, str] = {}
+    for letter, numbers in _BULK_GENDER_RX.findall(text):
+        gender = _GENDER_LETTERS[letter.upper()]
+        for part in re.split(r"[\s,]+", numbers.replace("–", "-").strip()):
+            if not part or part == "-":
+                continue
+            lo, _, hi = part.partition("-")
+            if not lo.isdigit() or (hi and not hi.isdigit()):
+                return None
+            a, b = int(lo), int(hi or lo)
+            if not 1 <= a <= b <= count:
+                return None
+            for i in range(a - 1, b):
+                result[i] = gender
+    return result or None
+
+
+@router.callback_query(F.data == "bulk_gender")
+async def on_bulk_gender(callback: CallbackQuery, state: FSMContext):
+    if not (await state.get_data()).get("bulk_payloads"):
+        await callback.answer("Сводка устарела — пришлите карточки заново.", show_alert=True)
+        return
+    await callback.message.answer(
+        "Отправьте пол и номера строк из сводки, например:\n"
+        "F 2 5 7-9\n"
+        "или: M 1-3, F 4-6\n\n"
+        "Строки, которых нет в сообщении, сохранят свой пол."
+    )
+    await state.set_state(BookingStates.bulk_gender)
+    await callback.answer()
+
+
+@router.message(BookingStates.bulk_gender, F.text)
+async def process_bulk_gender(message: Message, state: FSMContext):
+    data = await state.get_data()
+    payloads = data.get("bulk_payloads") or []
+    genders = parse_bulk_genders(message.text, len(payloads))
+    if genders is None:
+        await message.answer(f"Не понял 😢 Формат: «F 2 5 7-9», номера от 1 до {len(payloads)}.")
+        return
+
+    for i, gender in genders.items():
+        payloads[i]["Gender"] = gender
+    data["bulk_payloads"] = payloads
+    await state.set_data(data)
+
+    await message.answer(render_bulk_preview_text(data), reply_markup=booking_bulk_preview_kb(len(payloads)))
+    await state.set_state(BookingStates.review_bulk)
+
+
+# Bot API отдаёт боту файлы не больше 20 МБ
+TG_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+
+
+def _import_chat_sync(path: str, pkg_title: str | None, limit: int) -> tuple[List[dict], dict]:
+    """
+    Карточки из экспорта для выбранного пакета: генератор читается до конца, но в памяти
+    остаются не больше limit карточек. Карточки другой семьи пакетов (см. same_family)
+    и сверх limit только считаются. Файл удаляется в любом случае.
+    """
+    pkg_family = canon_family(pkg_title)
+    picked: List[dict] = []
+    counts = {"total": 0, "other_pkg": 0, "over_limit": 0}
+    try:
+        for booking in import_chat_file(path):
+            counts["total"] += 1
+            family = canon_family(booking.get("package_name"))
+            if pkg_family and family and not same_family(family, pkg_family):
+                counts["other_pkg"] += 1
+            elif len(picked) >= limit:
+                counts["over_limit"] += 1
+            else:
+                picked.append(booking)
+    finally:
+        os.remove(path)
+    return picked, counts
+
+
+@router.message(BookingStates.waiting_for_card_text, F.document)
+async def process_chat_export(message: Message, state: FSMContext):
+    """Экспорт чата WhatsApp (.txt) документом — карточки выбранного пакета в пакетный режим."""
+    doc = message.document
+    if not (doc.file_name or "").lower().endswith(".txt"):
+        await message.answer("Пришлите экспорт чата WhatsApp в формате .txt")
+        return
+
+    if doc.file_size and doc.file_size > TG_DOWNLOAD_LIMIT:
+        await message.answer("Файл больше 20 МБ — Telegram не даст боту его скачать.\n"
+                             "Разбейте экспорт на части или пришлите карточки сообщениями.")
+        return
+
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    os.close(fd)
+    try:
+        await message.bot.download(doc, destination=path)
+    except Exception as e:
+        os.remove(path)
+        print(f"❌ Не скачали экспорт чата {doc.file_name}: {e}")
+        await message.answer("Не получилось скачать файл из Telegram 😢 Попробуйте ещё раз.")
+        return
+
+    pkg_title = (await state.get_data()).get("pkg_title")
+    try:
+        # файл читается построчно в отдельном потоке — polling не блокируем
+        bookings, counts = await asyncio.to_thread(_import_chat_sync, path, pkg_title, CHAT_IMPORT_MAX_CARDS)
+    except Exception as e:
+        logger.exception(f"Импорт чата {doc.file_name}: {e}")
+        await message.answer("Не смог прочитать экспорт чата 😢\nПроверьте, что это .txt из WhatsApp.")
+        return
+
+    print(f"📥 Импорт чата {doc.file_name}: карточек {counts['total']}, в пачку {len(bookings)}")
+    notes = []
+    if counts["other_pkg"]:
+        notes.append(f"Пропущено карточек другого пакета: {counts['other_pkg']}")
+    if counts["over_limit"]:
+        notes.append(f"В пачку берём не больше {CHAT_IMPORT_MAX_CARDS} карточек, ещё {counts['over_limit']} "
+                     f"не взяты — разбейте экспорт на части.")
+    if notes and bookings:
+        await message.answer("⚠️ " + "\n⚠️ ".join(notes))
+    if not bookings and counts["total"]:
+        await message.answer(f"В файле {counts['total']} карточек, но ни одной для пакета «{pkg_title or '—'}».")
+        return
+    await show_bulk_preview(message, state, bookings)
+
+
 @router.message(BookingStates.waiting_for_card_text)
 async def process_card(message: Message, state: FSMContext):
-    data = await state.get_data()
     text = message.text or ""
 
+    # в сообщении несколько карточек — пакетный режим
+    cards = split_cards(text)
+    if len(cards) > 1:
+        await process_bulk_cards(message, state, cards)
+        return
+
+    data = await state.get_data()
     booking = parse_booking_card(text)
 
     if not booking:
@@ -340,6 +628,25 @@ def booking_preview_kb() -> InlineKeyboardMarkup:
         ]
     )
 
+def _place_auto_sync(month_key: str, ws_title: str, pkg_row: int, payload: dict,
+                     family: str | None = None) -> tuple[str, int | None]:
+    """
+    Все блокирующие вызовы gspread для размещения — выполняется в пуле sheets_gateway.
+    Возвращает (статус, row_idx): "ok" / "no_ws" / "no_slot".
+    """
+    ws = get_worksheet(month_key, ws_title)
+    if not ws:
+        return "no_ws", None
+
+    # место ищется заново под замком листа по свежим данным: если его успел занять
+    # другой менеджер, паломник попадёт в следующее свободное
+    row_idx = place_booking(ws, pkg_row, payload, family)
+    if row_idx is None:
+        return "no_slot", None
+
+    return "ok", row_idx
+
+
 @router.callback_query(F.data == "booking_place_auto")
 async def on_booking_place_auto(callback: CallbackQuery, state: FSMContext):
     """
@@ -360,33 +667,39 @@ async def on_booking_place_auto(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
 
-    ws = get_worksheet(month_key, ws_title)
-    if not ws:
-        await callback.message.answer("Не смог найти лист в таблице 😢")
+    try:
+        family = (data.get("booking") or {}).get("package_name") or None
+        # запись обгоняет чтение меню и в пуле потоков, и в очереди за квотой Google
+        status, row_idx = await run_sheets(
+            _place_auto_sync, month_key, ws_title, pkg_row, payload, family, priority=PRI_WRITE
+        )
+    except SheetsTimeoutError as e:
+        print(f"⏱ on_booking_place_auto: {e}")
+        await callback.message.answer(
+            "Google Sheets не ответил вовремя ⏱\nПроверьте лист перед повтором — запись могла пройти."
+        )
         await callback.answer()
         return
-
-    # ищем свободное место
-    slot = find_free_slot_auto(ws, pkg_row, payload)
-    if not slot:
-        await callback.message.answer("Не нашёл свободную комнату подходящего типа/пола.")
+    except SheetsBusyError as e:
+        print(f"⏳ on_booking_place_auto: {e}")
+        await callback.message.answer(SHEETS_BUSY_TEXT + "\nПроверьте лист перед повтором — запись могла пройти.")
+        await callback.answer()
+        return
+    except Exception as e:
+        logger.exception(f"on_booking_place_auto: {e}")
+        await callback.message.answer("❌ Ошибка при размещении.\nПроверьте лист перед повтором — запись могла пройти.")
         await callback.answer()
         return
 
-    row_idx, cols = slot
-
-    # Берём текущую строку как основу, чтобы сохранить Type of room / Visa
-    base_row = ws.row_values(row_idx + 1)
-
-    # Собираем итоговую строку, не перезаписывая Type of room и Visa
-    row_values = build_row_values_from_payload(
-        payload,
-        cols,
-        base_row=base_row,
-    )
+    if status == "no_ws":
+        await callback.message.answer("Не смог найти лист в таблице 😢")
+        await callback.answer()
+        return
 
-    # обновляем одну строку (A + индекс строки 1-based)
-    ws.update(f"A{row_idx+1}", [row_values])
+    if status == "no_slot":
+        await callback.message.answer("Не нашёл свободную комнату подходящего типа/пола (или пакет в карточке другой семьи).")
+        await callback.answer()
+        return
 
     await callback.message.answer(
         f"✅ Паломник размещён в строке {row_idx+1} листа «{ws_title}»."
@@ -395,3 +708,75 @@ async def on_booking_place_auto(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await callback.answer()
 
+
+def _place_bulk_sync(month_key: str, ws_title: str, pkg_row: int, payloads: list[dict],
+                     families: list | None = None) -> tuple[str, list]:
+    """
+    Пакетное размещение: одно свежее чтение пакета, места распределяются по очереди,
+    все строки уходят одним batchUpdate (см. placement_writer).
+    Возвращает (статус, [row_idx | None для каждой карточки]).
+    """
+    ws = get_worksheet(month_key, ws_title)
+    if not ws:
+        return "no_ws", []
+    return "ok", place_bookings(ws, pkg_row, payloads, families)
+
+
+@router.callback_query(F.data == "booking_place_bulk")
+async def on_booking_place_bulk(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+
+    month_key = data.get("month_key")
+    ws_title = data.get("ws_title")
+    pkg_row = data.get("pkg_row")
+    payloads = data.get("bulk_payloads")
+
+    if not (month_key and ws_title and isinstance(pkg_row, int) and payloads):
+        await callback.message.answer("Не хватает данных для размещения (месяц/лист/пакет).")
+        await callback.answer()
+        return
+
+    await callback.answer("Размещаем…")
+
+    try:
+        status, rows = await run_sheets(
+            _place_bulk_sync, month_key, ws_title, pkg_row, payloads, data.get("bulk_families"),
+            priority=PRI_WRITE,
+        )
+    except SheetsTimeoutError as e:
+        print(f"⏱ on_booking_place_bulk: {e}")
+        await callback.message.answer(
+            "Google Sheets не ответил вовремя ⏱\nПроверьте лист перед повтором — запись могла пройти."
+        )
+        return
+    except SheetsBusyError as e:
+        print(f"⏳ on_booking_place_bulk: {e}")
+        await callback.message.answer(SHEETS_BUSY_TEXT + "\nПроверьте лист перед повтором — запись могла пройти.")
+        return
+    except Exception as e:
+        # колбэк уже отвечен «Размещаем…» — без этого сообщения менеджер не узнает, что случилось
+        logger.exception(f"on_booking_place_bulk: {e}")
+        await callback.message.answer("❌ Ошибка при размещении.\nПроверьте лист перед повтором — запись могла пройти.")
+        return
+
+    if status == "no_ws":
+        await callback.message.answer("Не смог найти лист в таблице 😢")
+        return
+
+    placed, missed = [], []
+    for p, row_idx in zip(payloads, rows):
+        name = f"{p.get('Last Name') or '—'} {p.get('First Name') or ''}".strip()
+        if row_idx is None:
+            missed.append(f"• {name} — {p.get('Type of room') or '—'}")
+        else:
+            placed.append(f"• {name} → строка {row_idx + 1}")
+
+    lines = [f"✅ Размещено {len(placed)} из {len(payloads)} на листе «{ws_title}»."]
+    lines += placed
+    if missed:
+        lines.append("")
+        lines.append("❗️ Не размещены (нет комнаты подходящего типа/пола или пакет другой семьи):")
+        lines += missed
+
+    await callback.message.answer("\n".join(lines))
+    await state.clear()
@@ -0,0 +1,99 @@
+# tests/conftest.py
+# Тесты идут на фейковом Google Sheets (bench/fake_sheets.py) — как бенчмарки.
+# Окружение выставляем до импорта pligrim_bot: константы читаются при импорте.
+
+import itertools
+import os
+import tempfile
+
+os.environ.setdefault("BOT_STATE_DIR", tempfile.mkdtemp(prefix="tests-state-"))
+os.environ.setdefault("FSM_STORAGE", "memory")
+os.environ.setdefault("PREFETCH_DEPARTURES", "0")
+os.environ.setdefault("METRICS_ENABLED", "0")
+for _name in ("SHEETS_READS_PER_MIN", "SHEETS_WRITES_PER_MIN", "SHEETS_SHEET_READS_PER_MIN", "SHEETS_SHEET_WRITES_PER_MIN"):
+    os.environ.setdefault(_name, "1000000")
+os.environ.setdefault("SHEETS_QUOTA_BURST", "1000000")
+os.environ.setdefault("SHEETS_BACKOFF_BASE", "0.01")
+os.environ.setdefault("SHEETS_BACKOFF_MAX", "0.05")
+
+from typing import Dict, List, Sequence, Tuple
+
+import pytest
+
+from bench.fake_sheets import FakeSheetsBackend, make_client
+from bench.fixtures import HEADER, WIDTH
+
+from pligrim_bot.core.package_index import forget_index
+from pligrim_bot.core.room_allocator import _OCCUPANCY, _OCC_LOCK
+from pligrim_bot.data import sheet_cache, sheet_revisions
+
+_IDS = itertools.count(1)
+
+PKG_TITLE = "12.10-19.10 NIYET/7d"
+
+
+def guest_row(last: str, gender: str, room: str = "") -> List[str]:
+    row = [""] * WIDTH
+    row[HEADER.index("Type of room")] = room
+    row[HEADER.index("Last Name")] = last
+    row[HEADER.index("First Name")] = "TEST"
+    row[HEADER.index("Gender")] = gender
+    return row
+
+
+def empty_row(room: str = "") -> List[str]:
+    row = [""] * WIDTH
+    row[HEADER.index("Type of room")] = room
+    return row
+
+
+def package_rows(rooms: Sequence[Tuple[str, int, Sequence[str]]], title: str = PKG_TITLE) -> List[List[str]]:
+    """
+    Пакет в раскладке листа паломников: шапка, заголовок, комнаты.
+    rooms — [(тип, вместимость, [пол занятых мест сверху])].
+    """
+    rows = [[title] + [""] * (WIDTH - 1), list(HEADER)]
+    n = 0
+    for room, cap, taken in rooms:
+        for slot in range(cap):
+            label = room if slot == 0 else ""
+            if slot < len(taken):
+                n += 1
+                rows.append(guest_row(f"GUEST{n}", taken[slot], label))
+            else:
+                rows.append(empty_row(label))
+    rows.append([""] * WIDTH)
+    return rows
+
+
+def payload(room: str, gender: str, last: str = "NEW") -> Dict[str, str]:
+    return {"Type of room": room, "Gender": gender, "Last Name": last, "First Name": "PILGRIM"}
+
+
+@pytest.fixture(autouse=True)
+def _clean_caches():
+    """Снимки, ревизии и индексы — свои у каждого теста."""
+    yield
+    sheet_cache.invalidate()
+    sheet_revisions.forget()
+    forget_index()
+    with _OCC_LOCK:
+        _OCCUPANCY.clear()
+
+
+@pytest.fixture
+def backend() -> FakeSheetsBackend:
+    return FakeSheetsBackend()
+
+
+@pytest.fixture
+def open_sheet(backend):
+    """open_sheet({"Лист": values}) -> (spreadsheet_id, {название: gspread.Worksheet})."""
+
+    def _open(sheets: Dict[str, List[List[str]]]):
+        sid = f"test-{next(_IDS)}"
+        backend.add_spreadsheet(sid, f"Test {sid}", sheets)
+        ss = make_client(backend).open_by_key(sid)
+        return sid, {title: ss.worksheet(title) for title in sheets}
+
+    return _open
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from bench.fixtures import HEADER
+
+from pligrim_bot.core import placement_writer
+from pligrim_bot.data import sheet_cache
+
+from tests.conftest import package_rows, payload
+
+LAST = HEADER.index("Last Name")
+WS = "12.10 NIYET"
+
+
+def _wait_pending(key, count: int, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with placement_writer._LOCK:
+            if len(placement_writer._PENDING.get(key, [])) >= count:
+                return
+        time.sleep(0.005)
+    raise AssertionError("заявки не встали в очередь листа")
+
+
+def test_place_bookings_writes_guests(backend, open_sheet):
+    sid, sheets = open_sheet({WS: package_rows([("DBL", 2, ["M"]), ("DBL", 2, [])])})
+    ws = sheets[WS]
+
+    rows = placement_writer.place_bookings(ws, 0, [payload("DBL", "M", "ALPHA"), payload("DBL", "F", "BETA")])
+
+    assert rows == [3, 4]
+    values = backend.values(sid, WS)
+    assert values[3][LAST] == "ALPHA"
+    assert values[4][LAST] == "BETA"
+
+
+def test_concurrent_placements_share_one_batch_update(backend, open_sheet):
+    sid, sheets = open_sheet({WS: package_rows([("DBL", 2, ["M"]), ("DBL", 2, []), ("TRPL", 3, [])])})
+    ws = sheets[WS]
+    key = sheet_cache.ws_key(ws)
+    before = backend.values(sid, WS)
+    results = {}
+
+    def place(name, payloads):
+        results[name] = placement_writer.place_bookings(ws, 0, payloads)
+
+    threads = [
+        threading.Thread(target=place, args=("a", [payload("DBL", "M", "A1"), payload("DBL", "M", "A2")])),
+        threading.Thread(target=place, args=("b", [payload("DBL", "M", "B1"), payload("TRPL", "F", "B2")])),
+    ]
+    # пока замок листа занят, обе заявки встают в одну очередь — её запишет первый, кто его возьмёт
+    with placement_writer._ws_lock(key):
+        for t in threads:
+            t.start()
+        _wait_pending(key, 4)
+    for t in threads:
+        t.join(10)
+
+    assert backend.calls["values:batchUpdate"] == 1
+    placed = [r for r in results["a"] + results["b"] if r is not None]
+    assert len(placed) == 4
+    assert len(set(placed)) == len(placed)          # ни одной кровати дважды
+    after = backend.values(sid, WS)
+    for r in placed:
+        assert not before[r][LAST]                  # занятые места не перезаписаны
+        assert after[r][LAST] in {"A1", "A2", "B1", "B2"}
+    assert after[2][LAST] == before[2][LAST]
+
+
+def test_failed_write_invalidates_cache_and_occupancy(backend, open_sheet, monkeypatch):
+    _, sheets = open_sheet({WS: package_rows([("DBL", 2, [])])})
+    ws = sheets[WS]
+    key = sheet_cache.ws_key(ws)
+    invalidated, dropped = [], []
+
+    def broken_batch_update(*args, **kwargs):
+        raise RuntimeError("batchUpdate failed")
+
+    real_invalidate = sheet_cache.invalidate
+    monkeypatch.setattr(ws, "batch_update", broken_batch_update)
+    monkeypatch.setattr(sheet_cache, "invalidate",
+                        lambda w=None, **kw: (invalidated.append(sheet_cache.ws_key(w)), real_invalidate(w, **kw)))
+    monkeypatch.setattr(placement_writer, "drop_occupancy", dropped.append)
+
+    with pytest.raises(RuntimeError, match="batchUpdate failed"):
+        placement_writer.place_bookings(ws, 0, [payload("DBL", "M")])
+
+    assert invalidated == [key]
+    assert dropped == [key]
+    assert placement_writer.writer_stats()["pending"] == 0
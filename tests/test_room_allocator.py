@@ -0,0 +1,105 @@
+import random
+
+from bench.fixtures import HEADER, synthetic_sheet
+
+from pligrim_bot.core.parsers.package_parser import scan_palm_packages
+from pligrim_bot.core.room_allocator import RoomOccupancy, allocate_package
+
+from tests.conftest import PKG_TITLE, empty_row, guest_row, package_rows, payload
+
+LAST = HEADER.index("Last Name")
+
+
+def _occ(rows):
+    return RoomOccupancy(rows, 0, len(rows))
+
+
+def test_partial_room_is_completed_before_empty_one():
+    # пустой DBL выше, DBL с одним M ниже — одинокий M идёт к соседу, а не в пустую комнату
+    rows = package_rows([("DBL", 2, []), ("DBL", 2, ["M"])])
+    occ = _occ(rows)
+
+    assert allocate_package(occ, [payload("DBL", "M")]) == [5]
+
+
+def test_group_fills_partial_rooms_then_whole_empty_rooms():
+    rows = package_rows([("DBL", 2, []), ("DBL", 2, ["M"]), ("TRPL", 3, ["M"])])
+    occ = _occ(rows)
+
+    got = allocate_package(occ, [payload("DBL", "M", f"M{i}") for i in range(3)])
+
+    # место в полупустом DBL, затем пустой DBL целиком
+    assert sorted(got) == [2, 3, 5]
+
+
+def test_gender_is_not_mixed():
+    rows = package_rows([("DBL", 2, ["F"]), ("DBL", 2, [])])
+    occ = _occ(rows)
+
+    assert allocate_package(occ, [payload("DBL", "M")]) == [4]
+    assert allocate_package(occ, [payload("DBL", "F")]) == [3]
+
+
+def test_room_type_is_respected():
+    rows = package_rows([("DBL", 2, []), ("TRPL", 3, [])])
+    occ = _occ(rows)
+
+    assert allocate_package(occ, [payload("TRPL", "M"), payload("QUAD", "M"), payload("", "M")]) == [4, None, None]
+
+
+def test_booking_from_other_family_is_rejected():
+    rows = package_rows([("DBL", 2, [])])
+    occ = _occ(rows)
+
+    got = allocate_package(
+        occ,
+        [payload("DBL", "M", "A"), payload("DBL", "M", "B")],
+        pkg_title=PKG_TITLE,
+        families=["HIKMA 10d", "NIYET 7d"],
+    )
+    assert got[0] is None
+    assert got[1] == 2
+
+
+def test_allocation_does_not_change_the_index():
+    rows = package_rows([("DBL", 2, ["M"])])
+    occ = _occ(rows)
+
+    allocate_package(occ, [payload("DBL", "M")])
+    assert occ.find(payload("DBL", "M")) == 3
+
+
+def _snapshot(occ: RoomOccupancy):
+    rooms = {start: (room.canon, dict(room.occupied), list(room.free)) for start, room in occ.rooms.items()}
+    free = {canon: {g: list(starts) for g, starts in by_gender.items() if starts}
+            for canon, by_gender in occ.free_by_type.items()}
+    return rooms, {k: v for k, v in free.items() if v}
+
+
+def test_set_row_matches_rebuild():
+    values = [list(r) for r in synthetic_sheet(3, seed=3)]
+    packages = scan_palm_packages(values)
+    r0 = packages[0]["row"]
+    r1 = packages[1]["row"]
+    occ = RoomOccupancy(values, r0, r1)
+    rng = random.Random(5)
+
+    for step in range(40):
+        row_idx = rng.choice(sorted(occ.room_of))
+        room = values[row_idx][HEADER.index("Type of room")]
+        if values[row_idx][LAST]:
+            new_row = empty_row(room)
+        else:
+            new_row = guest_row(f"STEP{step}", rng.choice("MF"), room)
+        values[row_idx] = new_row
+
+        assert occ.set_row(row_idx, new_row)
+        assert _snapshot(occ) == _snapshot(RoomOccupancy(values, r0, r1))
+
+
+def test_set_row_reports_changed_room_layout():
+    rows = package_rows([("DBL", 2, []), ("DBL", 2, [])])
+    occ = _occ(rows)
+
+    assert not occ.set_row(4, empty_row("TRPL"))
+    assert not occ.set_row(1, empty_row())
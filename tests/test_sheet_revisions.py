@@ -0,0 +1,77 @@
+from bench.fixtures import synthetic_sheet
+
+from pligrim_bot.data import sheet_cache, sheet_revisions
+
+WS = "12.10 NIYET"
+
+
+def _expire(ws) -> None:
+    """Снимок протух по TTL, ревизию таблицы пора спросить заново."""
+    with sheet_cache._LOCK:
+        sheet_cache._CACHE[sheet_cache.ws_key(ws)]["fetched_at"] -= 10_000
+    sheet_revisions.forget()
+
+
+def test_unchanged_revision_extends_snapshot(backend, open_sheet):
+    _, sheets = open_sheet({WS: synthetic_sheet(2)})
+    ws = sheets[WS]
+    first = sheet_cache.get_values(ws)
+    assert backend.calls["values.get"] == 1
+
+    _expire(ws)
+    again = sheet_cache.get_values(ws)
+
+    assert again is first
+    assert backend.calls["values.get"] == 1
+    assert backend.calls["drive.files"] == 2
+
+
+def test_changed_revision_refetches(backend, open_sheet):
+    sid, sheets = open_sheet({WS: synthetic_sheet(2)})
+    ws = sheets[WS]
+    sheet_cache.get_values(ws)
+
+    backend.edit(sid, WS, 0, ["EDITED"])
+    _expire(ws)
+    values = sheet_cache.get_values(ws)
+
+    assert backend.calls["values.get"] == 2
+    assert values[0][0] == "EDITED"
+
+
+def test_max_age_forces_refetch(backend, open_sheet, monkeypatch):
+    _, sheets = open_sheet({WS: synthetic_sheet(2)})
+    ws = sheets[WS]
+    sheet_cache.get_values(ws)
+
+    monkeypatch.setattr(sheet_cache, "SHEET_CACHE_MAX_AGE", 0.0)
+    _expire(ws)
+    sheet_cache.get_values(ws)
+
+    assert backend.calls["values.get"] == 2
+
+
+def test_notify_changed_drops_only_that_sheet(backend, open_sheet):
+    sid, sheets = open_sheet({"A": synthetic_sheet(1), "B": synthetic_sheet(1, seed=2)})
+    sheet_cache.get_values(sheets["A"])
+    sheet_cache.get_values(sheets["B"])
+
+    sheet_revisions.notify_changed(sid, "A")
+
+    assert sheet_cache.peek(sheets["A"]) is None
+    assert sheet_cache.peek(sheets["B"]) is not None
+    sheet_cache.get_values(sheets["B"])
+    assert backend.calls["values.get"] == 2
+
+
+def test_notify_changed_without_sheet_drops_whole_spreadsheet(open_sheet):
+    sid, sheets = open_sheet({"A": synthetic_sheet(1), "B": synthetic_sheet(1, seed=2)})
+    other_sid, other = open_sheet({"A": synthetic_sheet(1)})
+    for ws in (*sheets.values(), other["A"]):
+        sheet_cache.get_values(ws)
+
+    sheet_revisions.notify_changed(sid)
+
+    assert sheet_cache.peek(sheets["A"]) is None
+    assert sheet_cache.peek(sheets["B"]) is None
+    assert sheet_cache.peek(other["A"]) is not None
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import date
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from pligrim_bot.data import state_storage
+from pligrim_bot.data.state_storage import SQLiteStorage, TTLMap
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(state_storage, "time", clock)
+    return clock
+
+
+def _key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+# ---------- TTLMap ----------
+
+def test_ttlmap_entry_expires(clock):
+    m = TTLMap(ttl=10, maxsize=10)
+    m["a"] = 1
+    clock.now += 9
+    assert m["a"] == 1
+
+    clock.now += 1
+    assert "a" not in m
+    assert len(m) == 0
+
+
+def test_ttlmap_rewrite_extends_life(clock):
+    m = TTLMap(ttl=10, maxsize=10)
+    m["a"] = 1
+    clock.now += 8
+    m["a"] = 2
+    clock.now += 8
+    assert m["a"] == 2
+
+
+def test_ttlmap_evicts_oldest_over_maxsize(clock):
+    m = TTLMap(ttl=100, maxsize=2)
+    m["a"] = 1
+    clock.now += 1
+    m["b"] = 2
+    clock.now += 1
+    m["a"] = 3          # перезапись делает «a» самой свежей
+    clock.now += 1
+    m["c"] = 4
+
+    assert sorted(m) == ["a", "c"]
+
+
+# ---------- SQLiteStorage ----------
+
+def test_state_and_data_survive_new_instance(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+    first = SQLiteStorage(path, ttl=3600, max_keys=100)
+    run(first.set_state(_key(1), "BookingStates:review"))
+    run(first.set_data(_key(1), {"pkg_row": 28, "bulk_payloads": [{"Gender": "F"}]}))
+    run(first.close())
+
+    second = SQLiteStorage(path, ttl=3600, max_keys=100)
+    assert run(second.get_state(_key(1))) == "BookingStates:review"
+    assert run(second.get_data(_key(1))) == {"pkg_row": 28, "bulk_payloads": [{"Gender": "F"}]}
+    run(second.close())
+
+
+def test_expired_record_reads_empty_and_does_not_resurrect(tmp_path, clock):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), ttl=60, max_keys=100)
+    run(storage.set_state(_key(1), "old_state"))
+    run(storage.set_data(_key(1), {"old": True}))
+
+    clock.now += 61
+    assert run(storage.get_state(_key(1))) is None
+    assert run(storage.get_data(_key(1))) == {}
+
+    # новое состояние — без данных брошенного диалога
+    run(storage.set_state(_key(1), "new_state"))
+    assert run(storage.get_state(_key(1))) == "new_state"
+    assert run(storage.get_data(_key(1))) == {}
+    run(storage.close())
+
+
+def test_prune_keeps_newest_max_keys(tmp_path, clock):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), ttl=3600, max_keys=3)
+    storage._PRUNE_EVERY = 1
+    for user_id in range(1, 6):
+        clock.now += 1
+        run(storage.set_state(_key(user_id), f"s{user_id}"))
+
+    assert [run(storage.get_state(_key(u))) for u in range(1, 6)] == [None, None, "s3", "s4", "s5"]
+    run(storage.close())
+
+
+def test_allowed_payload_round_trips(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), ttl=3600, max_keys=100)
+    data = {"s": "текст", "i": 3, "f": 1.5, "b": True, "n": None, "l": [1, "a", {"k": [None]}], "d": {"x": {}}}
+    run(storage.set_data(_key(1), data))
+    assert run(storage.get_data(_key(1))) == data
+    run(storage.close())
+
+
+@pytest.mark.parametrize("data", [
+    {"rows": (1, 2)},
+    {"by_row": {28: "pkg"}},
+    {"day": date(2025, 10, 12)},
+    {"nested": [{"tags": {"a"}}]},
+])
+def test_payload_that_json_would_change_is_rejected(tmp_path, data):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), ttl=3600, max_keys=100)
+    with pytest.raises(TypeError):
+        run(storage.set_data(_key(1), data))
+    assert run(storage.get_data(_key(1))) == {}
+    run(storage.close())